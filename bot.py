@@ -0,0 +1,321 @@
+import discord
+import asyncio
+import logging
+import signal
+
+from core import client
+from bot_cmd import bot_commands
+from main import bot_prefix
+from utils import (
+    fmt,
+    get,
+    guild_stats,
+    image,
+    paged_message,
+    recent_messages,
+    std_embed,
+    tasks,
+)
+
+log = logging.getLogger("bot")
+
+
+def starts_with_mention(content: str) -> bool:
+    """Returns whether or not the bot was mentioned at the start of the
+    message.
+    """
+    return content.startswith(client.user.mention) or content.startswith(
+        f"<@!{client.user.id}>"
+    )
+
+
+def remove_prefix(content: str) -> str:
+    """Removes the bot prefix or bot's mention string from the start of a
+    string.
+    """
+    if content.startswith(bot_prefix):
+        return content[len(bot_prefix) :].strip()
+    elif starts_with_mention(content):
+        return content[content.index(">") + 1 :].strip()
+    else:
+        raise ValueError(f"String '{content}' does not start with the bot's prefix.")
+
+
+def get_command_name(content: str) -> str:
+    """Returns the command name from a message's text.
+    Assumes that the bot prefix has been removed.
+    """
+    if " " in content:
+        return content.split(" ")[0].casefold()
+    else:
+        return content.casefold()
+
+
+def get_args(content: str, cmd_name: str) -> str:
+    """Returns the command arguments from a message's text.
+    Assumes that the bot prefix has been removed.
+    """
+    return content.strip()[len(cmd_name) :].strip()
+
+
+async def assign_roles(msg: discord.Message):
+    """Adds or removes specified roles from the message author.
+    Multiple roles can be added/removed in one message if they are separated by commas.
+
+    Parameters
+    -----------
+    msg: discord.Message
+    The message containing the roles the author wants to assign or remove from themself.
+    Roles are separated by commas.
+    Role names are preceded by a `+` or `-` to specify whether they should be
+    added or removed.
+    """
+
+    if not isinstance(msg.author, discord.Member):
+        raise TypeError("msg.author must be a member.")
+
+    # split the message into a list of individual roles
+    arr = msg.content.split(", ")
+    for role in arr:
+        # get role name
+        name = role.strip()[1:]
+
+        # determine whether the role should be assigned or removed
+        if role.startswith("+"):
+            try:
+                r = discord.utils.get(msg.author.guild.roles, name=name)
+                if r is not None:
+                    await msg.author.add_roles(r)
+                    return
+            except (discord.HTTPException, discord.Forbidden):
+                pass
+            print(f"no role called {role[1:]}")
+        elif role.startswith("-"):
+            try:
+                r = discord.utils.get(msg.author.guild.roles, name=name)
+                if r is not None:
+                    await msg.author.remove_roles(r)
+                    return
+            except (discord.HTTPException, discord.Forbidden):
+                pass
+            print(f"{msg.author} doesn't have the role {role[1:]}")
+
+
+@client.event
+async def on_connect():
+    print("------------\n Connected ")
+
+
+@client.event
+async def on_ready():
+    print("   Ready   \n------------\n")
+    # Runs the on_ready co-routine for every command in the background so
+    # that a slow or failing command doesn't hold up the others.
+    for c in bot_commands.get_all_commands():
+        tasks.spawn(c.on_ready(), f"{c.name} on_ready", group="on_ready")
+
+
+@client.event
+async def on_guild_remove(guild: discord.Guild):
+    recent_messages.remove_guild(guild.id)
+    guild_stats.remove_guild(guild.id)
+    image.emojis_update(guild)
+
+
+@client.event
+async def on_guild_emojis_update(guild: discord.Guild, before, after):
+    image.emojis_update(guild)
+
+
+# Keep the counts used by the info command up to date
+@client.event
+async def on_member_join(member: discord.Member):
+    guild_stats.member_join(member)
+
+
+@client.event
+async def on_member_remove(member: discord.Member):
+    guild_stats.member_remove(member)
+
+
+@client.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    guild_stats.member_update(before, after)
+
+
+@client.event
+async def on_guild_role_create(role: discord.Role):
+    guild_stats.role_create(role)
+
+
+@client.event
+async def on_guild_role_delete(role: discord.Role):
+    guild_stats.role_delete(role)
+
+
+@client.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    guild_stats.channel_create(channel)
+
+
+@client.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    guild_stats.channel_delete(channel)
+
+
+@client.event
+async def on_guild_channel_update(
+    before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+):
+    guild_stats.channel_update(before, after)
+
+
+@client.event
+async def on_message(msg: discord.Message):
+    # Keep recent messages in memory for commands like warn to look up
+    recent_messages.add(msg)
+    # Check to see if the message is not from a bot
+    if not msg.author.bot and msg.author != client.user:
+        # Check to see if the message is trying to run a command
+        if msg.content.startswith(bot_prefix) or starts_with_mention(msg.content):
+            # Get the command the member is trying to run
+            clean_content = remove_prefix(msg.content)
+            cmd_name = get_command_name(clean_content)
+
+            if not cmd_name:
+                # If the use did not specify a command, call the help command
+                # to show a list of all commands.
+                help_command = bot_commands.get_command("help", msg.guild)
+                if help_command is not None:
+                    await bot_commands.call(help_command, msg, "")
+                else:
+                    # If there is no help command, send an error message instead
+                    await std_embed.send_error(
+                        msg.channel,
+                        title="Error finding command",
+                        description="No command specified",
+                        author=msg.author,
+                    )
+            else:
+                command = bot_commands.get_command(cmd_name, msg.guild)
+                if command is not None:
+                    if await bot_commands.can_run(command, msg.channel, msg.author):
+                        # If the command exists and the member can run it, run the
+                        # command
+                        args = get_args(clean_content, cmd_name)
+                        await bot_commands.call(command, msg, args)
+                    else:
+                        # If the command exists but the member can not run it, send
+                        # an error message
+                        command.log.info(
+                            fmt.get_user_log(
+                                f'tried to call command "{command}" with message: {fmt.escape_newlines(msg.content)}',
+                                msg.author,
+                                msg.channel,
+                                msg.guild,
+                            )
+                        )
+                        await std_embed.send_error(
+                            msg.channel,
+                            title=fmt.format_maxlen(
+                                "Error executing {}", cmd_name.upper()
+                            ),
+                            description=fmt.format_maxlen(
+                                "You do not have permission to run `{}` here", cmd_name
+                            ),
+                            author=msg.author,
+                        )
+                else:
+                    # If the command does not exist, send an error message
+                    log.info(
+                        fmt.get_user_log(
+                            f'tried to call command "{cmd_name}" with message: {fmt.escape_newlines(msg.content)}',
+                            msg.author,
+                            msg.channel,
+                            msg.guild,
+                        )
+                    )
+                    await std_embed.send_error(
+                        msg.channel,
+                        title=fmt.format_maxlen("Error finding {}", cmd_name.upper()),
+                        description=fmt.format_maxlen(
+                            "Could not find command `{}`", cmd_name
+                        ),
+                        author=msg.author,
+                    )
+        else:
+            # Messages sent while choosing from a selection message with many
+            # options search the options
+            await get.on_message(msg)
+
+
+# Reactions are passed on to paged messages, which turn their pages with
+# reactions, and to the pin command, which lets members pin messages on their
+# own by reaching a reaction goal
+@client.event
+async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
+    await paged_message.on_raw_reaction(payload, added=True)
+    pin_command = bot_commands.get_command("pin", payload.guild_id)
+    if pin_command is not None:
+        await pin_command.on_reaction_add(payload)
+
+
+@client.event
+async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
+    await paged_message.on_raw_reaction(payload, added=False)
+    pin_command = bot_commands.get_command("pin", payload.guild_id)
+    if pin_command is not None:
+        pin_command.on_reaction_remove(payload)
+
+
+@client.event
+async def on_raw_reaction_clear(payload: discord.RawReactionClearEvent):
+    pin_command = bot_commands.get_command("pin", payload.guild_id)
+    if pin_command is not None:
+        pin_command.on_reaction_clear(payload.message_id)
+
+
+@client.event
+async def on_raw_reaction_clear_emoji(payload: discord.RawReactionClearEmojiEvent):
+    pin_command = bot_commands.get_command("pin", payload.guild_id)
+    if pin_command is not None and payload.emoji.name == pin_command.emoji:
+        pin_command.on_reaction_clear(payload.message_id)
+
+
+@client.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    paged_message.on_raw_message_delete(payload.message_id)
+
+
+@client.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    for message_id in payload.message_ids:
+        paged_message.on_raw_message_delete(message_id)
+
+def start_bot(token: str) -> None:
+    """Runs the bot until it logs out or is stopped, then shuts down its
+    background tasks.
+    """
+    loop = client.loop
+    # Shut down cleanly when asked to stop, like when `start_shards` stops its
+    # processes
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lambda: loop.create_task(client.close()))
+    except NotImplementedError:
+        pass
+    try:
+        loop.run_until_complete(client.start(token))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Give background tasks a chance to finish, then close everything
+        # down like `client.run` does
+        loop.run_until_complete(tasks.shutdown())
+        if not client.is_closed():
+            loop.run_until_complete(client.close())
+        remaining = asyncio.all_tasks(loop)
+        for task in remaining:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*remaining, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
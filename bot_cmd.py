@@ -3,10 +3,12 @@ from utils import fmt, std_embed
 from utils.errors import ReportableError, UserCancelError
 
 import discord
+import asyncio
 import logging
+import sys
 from pathlib import Path
 from enum import Enum
-from importlib import import_module
+from importlib import import_module, reload
 from abc import ABC, abstractmethod
 from typing import ClassVar, Optional, Union
 
@@ -109,6 +111,15 @@ class Bot_Command(ABC):
         """The function to be run when the bot is ready for operation."""
         pass
 
+    def on_reload(self, old_command: "Bot_Command"):
+        """The function to be run when this command replaces `old_command`
+        after the module defining them was reloaded. Can be used to take over
+        caches or background work from `old_command` instead of rebuilding
+        them like `on_ready` would. Commands that don't define it have their
+        `on_ready` run instead. Can be a co-routine.
+        """
+        pass
+
     def __str__(self):
         return self.name
 
@@ -142,6 +153,9 @@ class Bot_Commands:
     _unique_global_commands: dict[str, Bot_Command] = {}
     _unique_guild_commands: dict[int, dict[str, Bot_Command]] = {}
 
+    # The number of calls of each command that are currently running
+    _active_calls: dict[Bot_Command, int] = {}
+
     def _get_guild_id(self, guild: GuildRepr) -> int:
         if isinstance(guild, discord.Guild):
             return guild.id
@@ -181,6 +195,127 @@ class Bot_Commands:
 
         c = import_module(module_name)
 
+    def get_module_name(self, module: str) -> str:
+        """Converts a path to a command file or a module name relative to the
+        commands directory to a full module name.
+        """
+        if module.endswith(".py"):
+            module = module[: -len(".py")]
+        module = module.replace("/", ".")
+        if not module.startswith("commands."):
+            module = f"commands.{module}"
+        return module
+
+    def _get_registrations(
+        self, module_name: str
+    ) -> list[tuple[Bot_Command, Optional[int]]]:
+        """Returns every command defined in the module `module_name` paired
+        with the id of the guild it was added to, or `None` if it is global.
+        """
+        ret: list[tuple[Bot_Command, Optional[int]]] = [
+            (cmd, None)
+            for cmd in self._unique_global_commands.values()
+            if type(cmd).__module__ == module_name
+        ]
+        for g_id, cmds in self._unique_guild_commands.items():
+            ret += [
+                (cmd, g_id)
+                for cmd in cmds.values()
+                if type(cmd).__module__ == module_name
+            ]
+        return ret
+
+    def _get_command_dicts(self) -> list[dict[str, Bot_Command]]:
+        return [
+            self._global_commands,
+            self._unique_global_commands,
+            *self._guild_commands.values(),
+            *self._unique_guild_commands.values(),
+        ]
+
+    async def reload_module(
+        self, module: str, drain_timeout: Optional[float] = 60
+    ) -> tuple[list[Bot_Command], int]:
+        """Re-imports the command module `module` and swaps the commands it
+        registered for the newly created ones. Returns a list of the new
+        commands and the number of calls of the old commands that were still
+        running once `drain_timeout` seconds passed.
+
+        The old commands are all removed and the new ones are added without
+        yielding to the event loop, so no message can be handled while only
+        some of the commands were swapped. If the module fails to import, the
+        old commands are restored and the error is raised. Calls of the old
+        commands that were already running are allowed to finish, and each
+        new command's `on_reload` method is called with the command it
+        replaced once they have. New commands that don't define `on_reload`,
+        or that didn't replace a command, have their `on_ready` run instead so
+        that they start their background work again.
+
+        Modules that import from `module` keep using the old version until
+        they are reloaded too.
+
+        Parameters
+        -----------
+        module: str
+        The module to reload. Can be a full module name (ex. `commands.warn`)
+        or a module name relative to the commands directory (ex. `warn`). If
+        the module was never loaded, it is loaded for the first time.
+
+        drain_timeout: Optional[float]
+        How long in seconds to wait for running calls of the old commands to
+        finish, or `None` to wait until they all finish.
+        """
+        module_name = self.get_module_name(module)
+
+        old_module = sys.modules.get(module_name)
+        if old_module is None:
+            self._load_command(Path(*module_name.split(".")).with_suffix(".py"))
+            return [c for c, _ in self._get_registrations(module_name)], 0
+
+        old_commands = self._get_registrations(module_name)
+        old_command_set = {c for c, _ in old_commands}
+
+        # Copy every command dictionary so they can be restored if the module
+        # fails to import.
+        command_dicts = self._get_command_dicts()
+        backups = [d.copy() for d in command_dicts]
+        for d in command_dicts:
+            for key in [k for k, c in d.items() if c in old_command_set]:
+                del d[key]
+
+        try:
+            reload(old_module)
+        except BaseException:
+            for d, backup in zip(command_dicts, backups):
+                d.clear()
+                d.update(backup)
+            raise
+
+        new_commands = self._get_registrations(module_name)
+
+        # Wait for calls to the old commands to finish before handing their
+        # state to the new commands.
+        try:
+            await asyncio.wait_for(self._drain(old_command_set), drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        running_calls = sum(self._active_calls.get(c, 0) for c in old_command_set)
+
+        replaced = {(g_id, c.name.casefold()): c for c, g_id in old_commands}
+        for cmd, g_id in new_commands:
+            old_command = replaced.get((g_id, cmd.name.casefold()))
+            if old_command is not None and type(cmd).on_reload is not Bot_Command.on_reload:
+                await discord.utils.maybe_coroutine(cmd.on_reload, old_command)
+            else:
+                await cmd.on_ready()
+
+        return [c for c, _ in new_commands], running_calls
+
+    async def _drain(self, commands: set[Bot_Command]) -> None:
+        """Waits until none of `commands` are being run."""
+        while any(self._active_calls.get(c, 0) for c in commands):
+            await asyncio.sleep(0.5)
+
     def add_command(
         self, command: Bot_Command, guild: Optional[GuildRepr] = None
     ) -> None:
@@ -425,6 +560,7 @@ class Bot_Commands:
         """A wrapper function that calls a command and logs it, logging and
         sending an error message to a message's channel if it fails.
         """
+        self._active_calls[command] = self._active_calls.get(command, 0) + 1
         try:
             log_action = f'called command "{command}" '
             if args:
@@ -458,6 +594,10 @@ class Bot_Commands:
                 msg.author,
             )
             raise e
+        finally:
+            self._active_calls[command] -= 1
+            if not self._active_calls[command]:
+                del self._active_calls[command]
 
     async def send_error_message(
         self,
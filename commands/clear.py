@@ -1,7 +1,63 @@
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
-from utils import fmt
+from utils import find, fmt, parse, tasks
+from utils.errors import InvalidInputError
 
+import asyncio
+import datetime
 import discord
+import re
+from typing import Optional, Union
+
+
+class Purge_Filter:
+    """Decides which messages a purge deletes. A message must match every
+    filter that is set to be deleted.
+    """
+
+    def __init__(self):
+        self.author_ids: set[int] = set()
+        self.bots = False
+        self.contains: Optional[str] = None
+        self.pattern: Optional[re.Pattern] = None
+        self.attachments = False
+        # Messages that should never be deleted, like the purge's progress
+        # message
+        self.ignored_ids: set[int] = set()
+
+    def matches(self, m: discord.Message) -> bool:
+        if m.pinned or m.id in self.ignored_ids:
+            return False
+        if self.author_ids and m.author.id not in self.author_ids:
+            return False
+        if self.bots and not m.author.bot:
+            return False
+        if self.contains is not None and self.contains not in m.content.casefold():
+            return False
+        if self.pattern is not None and self.pattern.search(m.content) is None:
+            return False
+        if self.attachments and not m.attachments:
+            return False
+        return True
+
+
+class Purge_Progress:
+    """Counts of how far along a purge is, shared by every channel being
+    purged.
+    """
+
+    def __init__(self):
+        self.scanned = 0
+        self.deleted = 0
+        self.failed = 0
+        self.done = False
+
+    def __str__(self) -> str:
+        status = "Deleted" if self.done else "Deleting..."
+        s = f"{status} {self.deleted} message{'s' if self.deleted != 1 else ''}"
+        s += f" ({self.scanned} checked"
+        if self.failed:
+            s += f", {self.failed} could not be deleted"
+        return s + ")"
 
 
 class Clear_Command(Bot_Command):
@@ -12,29 +68,77 @@ class Clear_Command(Bot_Command):
     short_help = "Deletes messages from chat"
 
     long_help = """Clears specified number of messages from the channel
+    Filters can be added after the number to only delete some messages. The number is then how many matching messages are deleted.
+    Pinned messages are never deleted by filtered clears.
     __Usage:__
-    **clear** *number*
-    **c** *number*
+    **clear** *number* [filters]
+    **c** *number* [filters]
+    __Filters:__
+    **from** *member* - Messages sent by a member. Can be used more than once
+    **bots** - Messages sent by bots
+    **contains** *"text"* - Messages containing some text
+    **regex** *"pattern"* - Messages matching a regular expression
+    **attachments** - Messages with files or images
+    **before** *date|duration|message id* - Messages sent before a date, a duration ago or a message
+    **after** *date|duration|message id* - Messages sent after a date, a duration ago or a message
+    **in** *channels* - Clear one or more other channels instead of this one
+    ~Example: **clear** 50 **from** @User **after** 2h **in** #general #memes
     """
 
     category = Bot_Command_Category.MODERATION
 
+    # Messages older than this can not be bulk deleted by Discord. A minute
+    # is taken off in case messages get older while being deleted.
+    bulk_delete_max_age = datetime.timedelta(days=14) - datetime.timedelta(minutes=1)
+    # The most messages Discord lets be deleted in one request
+    bulk_delete_size = 100
+    # How many old messages are deleted one at a time at once for each channel
+    max_concurrent_deletes = 3
+    # How many messages filtered clears look through in each channel before
+    # giving up on finding enough matching messages
+    max_scanned_per_channel = 10000
+    # How often the progress message is updated, in seconds
+    progress_interval = 2
+
+    _filter_keywords = (
+        "from",
+        "bots",
+        "contains",
+        "regex",
+        "attachments",
+        "before",
+        "after",
+        "in",
+    )
+
     def can_run(self, location, member):
         # only admins can purge messages
         return member is not None and member.guild_permissions.administrator
 
     async def run(self, msg: discord.Message, args: str):
         if args:
-            parsed_args = args.strip()
-            if parsed_args.isdigit():
-                # delete the command message
+            split_args = parse.split_args(args, treat_comma_as_space=True)
+            if split_args[0].isdigit():
+                limit = int(split_args[0])
+                if len(split_args) == 1:
+                    # delete the command message
+                    await msg.delete()
+                    # delete the specified number of messages from this channel
+                    await msg.channel.purge(limit=limit)
+                    print(fmt.format_maxlen("Deleted {} messages.", split_args[0]))
+                    await msg.channel.send(
+                        fmt.format_maxlen("Deleted {} messages.", split_args[0]),
+                        delete_after=5,
+                    )
+                    return
+
+                purge_filter, channels, before, after = await self.parse_filters(
+                    msg, split_args[1:]
+                )
+                # delete the command message so it isn't one of the cleared messages
                 await msg.delete()
-                # delete the specified number of messages from this channel
-                await msg.channel.purge(limit=int(parsed_args))
-                print(fmt.format_maxlen("Deleted {} messages.", parsed_args))
-                await msg.channel.send(
-                    fmt.format_maxlen("Deleted {} messages.", parsed_args),
-                    delete_after=5,
+                await self.purge(
+                    msg.channel, channels, limit, purge_filter, before, after
                 )
             else:
                 print("Your message was either NaN, or contained too many arguments")
@@ -45,5 +149,241 @@ class Clear_Command(Bot_Command):
             print("Please specify a number of messages to clear.")
             await msg.channel.send("Please specify a number of messages to clear.")
 
+    async def parse_filters(
+        self, msg: discord.Message, split_args: list[str]
+    ) -> tuple[
+        Purge_Filter,
+        list[discord.TextChannel],
+        Optional[Union[datetime.datetime, discord.Object]],
+        Optional[Union[datetime.datetime, discord.Object]],
+    ]:
+        """Returns the filter, channels and time range to clear from the
+        filter arguments of a clear command.
+        """
+        purge_filter = Purge_Filter()
+        channels: list[discord.TextChannel] = []
+        before = None
+        after = None
+
+        i = 0
+        while i < len(split_args):
+            keyword = split_args[i].casefold()
+            if keyword not in self._filter_keywords:
+                raise InvalidInputError(
+                    fmt.format_maxlen("Unknown clear filter `{}`", split_args[i])
+                )
+            i += 1
+            if keyword == "bots":
+                purge_filter.bots = True
+                continue
+            elif keyword == "attachments":
+                purge_filter.attachments = True
+                continue
+            elif keyword == "in":
+                # Every argument up to the next filter is a channel
+                while (
+                    i < len(split_args)
+                    and split_args[i].casefold() not in self._filter_keywords
+                ):
+                    channel = await find.channel(
+                        msg.channel,
+                        split_args[i],
+                        msg.author,
+                        channel_types=discord.TextChannel,
+                    )
+                    if channel is None:
+                        raise InvalidInputError(
+                            fmt.format_maxlen(
+                                "Could not find the channel `{}`", split_args[i]
+                            )
+                        )
+                    if channel not in channels:
+                        channels.append(channel)
+                    i += 1
+                continue
+
+            if i >= len(split_args):
+                raise InvalidInputError(
+                    fmt.format_maxlen("The `{}` filter needs a value", keyword)
+                )
+            value = split_args[i]
+            i += 1
+            if keyword == "from":
+                member = await find.member(msg.channel, value, msg.author)
+                if member is None:
+                    raise InvalidInputError(
+                        fmt.format_maxlen("Could not find the member `{}`", value)
+                    )
+                purge_filter.author_ids.add(member.id)
+            elif keyword == "contains":
+                purge_filter.contains = value.casefold()
+            elif keyword == "regex":
+                try:
+                    purge_filter.pattern = re.compile(value)
+                except re.error as e:
+                    raise InvalidInputError(
+                        fmt.format_maxlen("Invalid regular expression: {}", e)
+                    )
+            elif keyword == "before":
+                before = self.parse_time(value)
+            elif keyword == "after":
+                after = self.parse_time(value)
+
+        if not channels:
+            channels.append(msg.channel)
+        for channel in channels:
+            permissions = channel.permissions_for(msg.author)
+            if not permissions.manage_messages or not permissions.read_messages:
+                raise InvalidInputError(
+                    fmt.format_maxlen(
+                        "You do not have permission to delete messages in {}",
+                        channel.mention,
+                    )
+                )
+        return purge_filter, channels, before, after
+
+    def parse_time(self, s: str) -> Union[datetime.datetime, discord.Object]:
+        """Returns the time or message to clear before or after from a date,
+        a duration ago, or a message id.
+        """
+        if s.isdigit() and len(s) >= 17:
+            return discord.Object(int(s))
+        try:
+            return datetime.datetime.utcnow() - parse.str_to_timedelta(s)
+        except ValueError:
+            pass
+        try:
+            date = parse.str_to_date(s, require_year=True)
+        except ValueError:
+            raise InvalidInputError(
+                fmt.format_maxlen(
+                    "Could not understand `{}` as a date, duration or message id", s
+                )
+            )
+        # Discord uses UTC times without a timezone
+        return (
+            datetime.datetime.combine(date, datetime.time())
+            .astimezone(datetime.timezone.utc)
+            .replace(tzinfo=None)
+        )
+
+    async def purge(
+        self,
+        status_channel: discord.TextChannel,
+        channels: list[discord.TextChannel],
+        limit: int,
+        purge_filter: Purge_Filter,
+        before: Optional[Union[datetime.datetime, discord.Object]] = None,
+        after: Optional[Union[datetime.datetime, discord.Object]] = None,
+    ) -> Purge_Progress:
+        """Deletes up to `limit` messages matching `purge_filter` from each of
+        `channels` while showing the progress in `status_channel`.
+        """
+        progress = Purge_Progress()
+        status = await status_channel.send(str(progress))
+        purge_filter.ignored_ids.add(status.id)
+
+        async def update_status():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                try:
+                    await status.edit(content=str(progress))
+                except discord.HTTPException:
+                    pass
+
+        updater = tasks.spawn(
+            update_status(),
+            f"Purge progress in {status_channel.id}",
+            group="clear",
+            cancel_on_shutdown=True,
+        )
+        try:
+            await asyncio.gather(
+                *(
+                    self.purge_channel(c, limit, purge_filter, progress, before, after)
+                    for c in channels
+                )
+            )
+        finally:
+            updater.cancel()
+            progress.done = True
+            print(str(progress))
+            try:
+                await status.edit(content=str(progress))
+                await status.delete(delay=5)
+            except discord.HTTPException:
+                pass
+        return progress
+
+    async def purge_channel(
+        self,
+        channel: discord.TextChannel,
+        limit: int,
+        purge_filter: Purge_Filter,
+        progress: Purge_Progress,
+        before: Optional[Union[datetime.datetime, discord.Object]] = None,
+        after: Optional[Union[datetime.datetime, discord.Object]] = None,
+    ):
+        """Deletes up to `limit` messages matching `purge_filter` from
+        `channel`. Messages are deleted while the channel's history is still
+        being read. Recent messages are deleted in bulk, and messages too old
+        to be bulk deleted are deleted a few at a time.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_deletes)
+        bulk: list[discord.Message] = []
+        single_deletes: list[asyncio.Future] = []
+
+        async def delete_bulk(messages: list[discord.Message]):
+            try:
+                await channel.delete_messages(messages)
+                progress.deleted += len(messages)
+            except discord.NotFound:
+                # Some messages were already deleted, so delete the rest alone
+                for m in messages:
+                    await delete_single(m)
+            except discord.HTTPException:
+                progress.failed += len(messages)
+
+        async def delete_single(m: discord.Message):
+            async with semaphore:
+                try:
+                    await m.delete()
+                    progress.deleted += 1
+                except discord.NotFound:
+                    pass
+                except discord.HTTPException:
+                    progress.failed += 1
+
+        matched = 0
+        scanned = 0
+        bulk_cutoff = datetime.datetime.utcnow() - self.bulk_delete_max_age
+        async for m in channel.history(
+            limit=None, before=before, after=after, oldest_first=False
+        ):
+            scanned += 1
+            progress.scanned += 1
+            if purge_filter.matches(m):
+                matched += 1
+                if m.created_at > bulk_cutoff:
+                    bulk.append(m)
+                    if len(bulk) == self.bulk_delete_size:
+                        await delete_bulk(bulk)
+                        bulk = []
+                else:
+                    single_deletes.append(
+                        tasks.spawn(
+                            delete_single(m),
+                            f"Purge message {m.id}",
+                            group="clear",
+                        )
+                    )
+            if matched >= limit or scanned >= self.max_scanned_per_channel:
+                break
+
+        if bulk:
+            await delete_bulk(bulk)
+        if single_deletes:
+            await asyncio.gather(*single_deletes)
+
 
 bot_commands.add_command(Clear_Command())
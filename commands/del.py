@@ -1,8 +1,11 @@
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
 from core import client
 from pathlib import Path
-from utils import find, fmt
+from typing import Union
+from utils import find, fmt, get, send_queue, std_embed
+from utils.paged_message import Paged_Message
 
+import asyncio
 import discord
 import json
 
@@ -23,10 +26,19 @@ class Del_Command(Bot_Command):
 
     To delete multiple objects of the same type, separate the names by commas.
     Cannot delete objects of different types in one command.
+
+    **Batch mode:**
+    `batch role|channel names` asks to confirm every object at once and then deletes them all together.
+    `batch dry role|channel names` only shows what would be deleted.
     """
 
     category = Bot_Command_Category.MODERATION
 
+    # How many objects batch mode deletes at the same time
+    max_concurrent_deletes = 5
+    # How long in seconds batch mode waits for its confirmation
+    batch_confirmation_timeout = 180
+
     def can_run(self, location, member):
         return member is not None and member.guild_permissions.administrator
 
@@ -37,6 +49,11 @@ class Del_Command(Bot_Command):
         channel = msg.channel
 
         if args:
+            # delete many objects with a single confirmation
+            if args.strip().lower().startswith("batch "):
+                await self.batch(msg, args.strip()[len("batch "):].strip())
+                return
+
             # split the object type from the object names
             parsed_args = args.strip().split(" ", 1)
             # delete roles
@@ -52,14 +69,16 @@ class Del_Command(Bot_Command):
                         ):
                             await role.delete()
                             print(f"Role {r} has been deleted")
-                            await channel.send(
+                            send_queue.post(
+                                channel,
                                 fmt.format_maxlen(
                                     "Role `{}` has been deleted.", r
                                 )
                             )
                     except AttributeError:
                         print(f"Could not find a role called {r}")
-                        await channel.send(
+                        send_queue.post(
+                            channel,
                             fmt.format_maxlen(
                                 "Could not find a role called `{}`", r
                             )
@@ -77,19 +96,153 @@ class Del_Command(Bot_Command):
                         ):
                             await del_channel.delete()
                             print(f"Channel {c} has been deleted")
-                            await msg.channel.send(
+                            send_queue.post(
+                                msg.channel,
                                 fmt.format_maxlen(
                                     "Channel `{}` has been deleted.", c
                                 )
                             )
                     except AttributeError:
                         print(f"Could not find a channel called {c}")
-                        await msg.channel.send(
+                        send_queue.post(
+                            msg.channel,
                             fmt.format_maxlen(
                                 "Could not find a channel called `{}`", c
                             )
                         )
 
+    # finds every object up front, confirms them all at once, then deletes them concurrently
+    async def batch(self, msg: discord.Message, args: str):
+        channel = msg.channel
+        dry_run = args.lower().startswith("dry ")
+        if dry_run:
+            args = args[len("dry "):].strip()
+
+        parsed_args = args.split(" ", 1)
+        object_type = parsed_args[0].lower()
+        if object_type not in ("role", "channel") or len(parsed_args) < 2:
+            await std_embed.send_error(
+                channel,
+                title="Batch Delete",
+                description="Usage: `batch [dry] role|channel names`",
+                author=msg.author,
+            )
+            return
+
+        # resolve every name before asking for confirmation
+        targets: list[Union[discord.Role, discord.abc.GuildChannel]] = []
+        not_found: list[str] = []
+        for name in (n.strip() for n in parsed_args[1].split(",")):
+            if not name:
+                continue
+            if object_type == "role":
+                target = await find.role(channel, name, responder=msg.author)
+            else:
+                target = await find.channel(channel, name, responder=msg.author)
+            if target is None:
+                not_found.append(name)
+            elif target not in targets:
+                targets.append(target)
+
+        not_found_text = (
+            fmt.format_maxlen(
+                "Could not find: {}",
+                ", ".join(f"`{n}`" for n in not_found),
+                max_total_len=1024,
+            )
+            if not_found
+            else None
+        )
+        if not targets:
+            await std_embed.send_error(
+                channel,
+                title="Batch Delete",
+                description=not_found_text or "Nothing to delete",
+                author=msg.author,
+            )
+            return
+
+        # show every object that will be deleted in one paged message
+        title = f"{'Would delete' if dry_run else 'Delete'} {len(targets)} {object_type}{'s' if len(targets) != 1 else ''}?"
+        pages = Paged_Message.embed_list_from_items(
+            targets,
+            lambda i: title,
+            lambda i: not_found_text,
+            lambda t: (fmt.bound_str(t.name, 256), self.describe(t), True),
+            msg.author,
+            color=discord.Color.red(),
+        )
+        preview = Paged_Message(pages, msg.author)
+        await preview.send(channel, timeout=self.batch_confirmation_timeout)
+        if dry_run:
+            return
+
+        confirmed = await get.confirmation(
+            msg.author,
+            channel,
+            msg=preview.msg,
+            timeout=self.batch_confirmation_timeout,
+        )
+        if not confirmed:
+            await std_embed.send_info(
+                channel,
+                title="Batch Delete",
+                description="Cancelled deleting",
+                author=msg.author,
+            )
+            return
+
+        # delete concurrently, a few at a time so that Discord's rate limits aren't hit all at once
+        semaphore = asyncio.Semaphore(self.max_concurrent_deletes)
+
+        async def delete(target):
+            async with semaphore:
+                await target.delete(reason=f"Batch deleted by {msg.author}")
+
+        results = await asyncio.gather(
+            *(delete(t) for t in targets), return_exceptions=True
+        )
+        failures = [
+            (t, r) for t, r in zip(targets, results) if isinstance(r, Exception)
+        ]
+        deleted = len(targets) - len(failures)
+        print(f"Batch deleted {deleted} of {len(targets)} {object_type}s")
+
+        description = f"Deleted {deleted} of {len(targets)} {object_type}{'s' if len(targets) != 1 else ''}."
+        if failures:
+            description += "\n**Failed:**\n" + "\n".join(
+                f"`{t.name}`: {self.describe_error(e)}" for t, e in failures
+            )
+        if not_found_text:
+            description += f"\n{not_found_text}"
+        # the summary can't be sent if this channel was one of the deleted channels
+        if channel in targets and channel not in (t for t, _ in failures):
+            return
+        send = std_embed.send_error if failures else std_embed.send_success
+        await send(
+            channel,
+            title="Batch Delete",
+            description=fmt.bound_str(description, 4096),
+            author=msg.author,
+        )
+
+    # returns a short description of a role or channel shown before deleting it
+    def describe(self, target: Union[discord.Role, discord.abc.GuildChannel]) -> str:
+        if isinstance(target, discord.Role):
+            return f"{target.mention}\n{len(target.members)} members"
+        category = getattr(target, "category", None)
+        return f"{target.mention}\n{category.name if category is not None else 'No category'}"
+
+    # returns why deleting an object failed
+    def describe_error(self, e: Exception) -> str:
+        if isinstance(e, discord.Forbidden):
+            return "Missing permissions"
+        elif isinstance(e, discord.NotFound):
+            return "Already deleted"
+        elif isinstance(e, discord.HTTPException):
+            return e.text or str(e)
+        return str(e)
+
     # requires verification before proceeding with deleting an object
     async def verify(
         self, channel: discord.channel, item: str, name: str, responder: discord.Member
@@ -99,12 +252,16 @@ class Del_Command(Bot_Command):
             raise AttributeError
 
         # ask for verification before deleting the object from the server
-        msg = await channel.send(
+        # after any deletions before it are reported. it's deleted later so it
+        # can't be merged with them
+        msg = await send_queue.send(
+            channel,
             fmt.format_maxlen(
                 "Are you sure you want to delete the `{}` named `{}`? This action cannot be undone.",
                 item,
                 name,
-            )
+            ),
+            merge=False,
         )
         response = None
         # wait 90 seconds for user to respond
@@ -118,8 +275,8 @@ class Del_Command(Bot_Command):
                 return True
         # if user fails to respond in time
         except:
-            await channel.send(
-                "Error: Timed out waiting for user input.", delete_after=10
+            send_queue.post(
+                channel, "Error: Timed out waiting for user input.", delete_after=10
             )
             await msg.delete()
             return False
@@ -1,8 +1,11 @@
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
-from utils import find
+from utils import find, fmt, image
+from utils.errors import InvalidInputError
 
 import discord
+import io
 import re
+from typing import Optional, Union
 
 
 class Image_Command(Bot_Command):
@@ -10,65 +13,166 @@ class Image_Command(Bot_Command):
 
     short_help = "Sends a profile picture or custom emoji."
 
-    long_help = """Sends the profile picture of a specified user or the image of a custom
+    long_help = f"""Sends the profile picture of a specified user or the image of a custom
     emoji in this guild. If nothing is specified, sends the message author's profile picture.
+    Several members or emojis separated by commas are sent side by side in one image.
     __Usage:__
     **img** [*member|custom emoji*]
+    **img** *member|custom emoji*, *member|custom emoji*...
+    Add **size** *pixels* to resize profile pictures and side by side images, where *pixels* is one of {", ".join(str(s) for s in image.cdn_sizes)}.
+    Add **format** *{"|".join(image.formats)}* to change the image's format.
     """
 
     category = Bot_Command_Category.TOOLS
 
+    #the most images that can be put side by side
+    max_combined_images = 10
+    #how tall side by side images are if no size is given
+    default_combined_height = 256
+
     #matches a custom emoji
-    re_emoji = re.compile(r"<:(?P<name>(.+)):(\d){18}>")
+    re_emoji = re.compile(r"<a?:(?P<name>\w+):(?P<id>\d+)>")
+    #matches a size or format option at the end of the arguments
+    re_option = re.compile(r"(?:^|\s+)(?P<option>size|format)\s+(?P<value>\S+)\s*$", re.IGNORECASE)
 
     async def run(self, msg: discord.Message, args: str):
+        #read the size and format options from the end of the arguments
+        size = None
+        image_format = None
+        option = self.re_option.search(args)
+        while option is not None:
+            value = option.group("value").casefold()
+            if option.group("option").casefold() == "size":
+                if not value.isdigit() or int(value) not in image.cdn_sizes:
+                    raise InvalidInputError(fmt.format_maxlen(
+                        "`{}` is not a valid size. Sizes can be {}",
+                        value,
+                        ", ".join(str(s) for s in image.cdn_sizes),
+                    ))
+                size = int(value)
+            else:
+                if value == "jpeg":
+                    value = "jpg"
+                if value not in image.formats:
+                    raise InvalidInputError(fmt.format_maxlen(
+                        "`{}` is not a valid format. Formats can be {}",
+                        value,
+                        ", ".join(image.formats),
+                    ))
+                image_format = value
+            args = args[:option.start()]
+            option = self.re_option.search(args)
+
+        items = [i.strip() for i in args.split(",") if i.strip()]
         #if no arguments are provided, send the avatar of the message author
-        if not args:
-            await self.get_image_embed(msg.author.name, msg.channel)
+        if not items:
+            await self.get_image_embed(msg.author.name, msg.channel, size, image_format)
         #try to send the image of an emoji or sepcified member's avatar
+        elif len(items) == 1:
+            await self.get_image_embed(items[0], msg.channel, size, image_format)
+        #send the images side by side
         else:
-            await self.get_image_embed(args, msg.channel)
-
-
+            await self.get_combined_image(items, msg.channel, size, image_format)
 
+    #find the member or emoji an argument names
+    async def find_item(
+        self, item: str, channel: discord.TextChannel
+    ) -> Optional[Union[discord.Member, discord.Emoji]]:
+        #try to parse the item as a member
+        member = await find.member(channel, item)
+        if member is not None:
+            return member
 
+        #try to parse the item as an emoji, either as the emoji itself or its name
+        guild = getattr(channel, "guild", None)
+        if guild is None:
+            return None
+        emoji = self.re_emoji.fullmatch(item)
+        name = emoji.group("name") if emoji is not None else item.strip(":")
+        return image.get_emoji(guild, name)
 
     #get the image/gif of an emoji or member avatar and create an embed
-    async def get_image_embed(self, item, channel: discord.TextChannel):
-        #try to parse the item as a member
-        member = await find.member(channel, item)
+    async def get_image_embed(
+        self,
+        item,
+        channel: discord.TextChannel,
+        size: Optional[int] = None,
+        image_format: Optional[str] = None,
+    ):
+        found = await self.find_item(item, channel)
         #get the avatar image of the member
-        if member is not None:
-            #determine how to format the avatar
-            if member.is_avatar_animated():
-                image = member.avatar_url_as(format="gif")
-            else:
-                image = member.avatar_url_as(format="png")
+        if isinstance(found, discord.Member):
+            #determine how to format the avatar. discord resizes and converts it,
+            #so nothing has to be downloaded
+            if image_format is None:
+                image_format = "gif" if found.is_avatar_animated() else "png"
+            url = found.avatar_url_as(format=image_format, size=size or 1024)
             #create the embed
-            embed = discord.Embed(title=f"**{member.display_name}**", color=discord.Color.blue())
-            embed.set_image(url=image)
+            embed = discord.Embed(title=f"**{found.display_name}**", color=discord.Color.blue())
+            embed.set_image(url=url)
             #send an embed of the member's avatar to the channel
             await channel.send(embed=embed)
             return
 
+        #get the emoji image
+        if isinstance(found, discord.Emoji):
+            #determine how to format the emoji
+            if image_format is not None:
+                url = found.url_as(format=image_format)
+            elif found.animated:
+                url = found.url_as(format="gif")
+            else:
+                url = found.url_as(format="png")
 
-        #try to parse the item as an emoji
-        emoji = self.re_emoji.fullmatch(item)
-        if emoji is not None:
-            image = discord.utils.get(channel.guild.emojis, name=emoji.group("name"))
-            #get the emoji image
-            if image is not None:
-                #determine how to format the emoji
-                if image.animated:
-                    image = image.url_as(static_format="gif")
-                else:
-                    image = image.url_as(static_format="png")
-
-                #create the embed
-                embed = discord.Embed(title=f"**{emoji.group('name')}**", color=discord.Color.blue())
-                embed.set_image(url=image)
-                await channel.send(embed=embed)
+            #create the embed
+            embed = discord.Embed(title=f"**{found.name}**", color=discord.Color.blue())
+            embed.set_image(url=url)
+            await channel.send(embed=embed)
+            return
+        await self.send_not_found(item, channel)
+
+    #put the images of several members or emojis side by side in one image
+    async def get_combined_image(
+        self,
+        items: list[str],
+        channel: discord.TextChannel,
+        size: Optional[int] = None,
+        image_format: Optional[str] = None,
+    ):
+        if not image.has_pillow:
+            raise InvalidInputError("Putting images side by side needs the Pillow package to be installed")
+        if len(items) > self.max_combined_images:
+            raise InvalidInputError(f"Only {self.max_combined_images} images can be put side by side")
+
+        height = size or self.default_combined_height
+        image_format = image_format or "png"
+        assets = []
+        names = []
+        for item in items:
+            found = await self.find_item(item, channel)
+            if found is None:
+                await self.send_not_found(item, channel)
                 return
+            if isinstance(found, discord.Member):
+                #download the smallest size that is at least as tall as the image
+                asset_size = next((s for s in image.cdn_sizes if s >= height), image.cdn_sizes[-1])
+                assets.append(found.avatar_url_as(format="png", size=asset_size))
+                names.append(found.display_name)
+            else:
+                assets.append(found.url_as(format="png"))
+                names.append(found.name)
+
+        async with channel.typing():
+            data = await image.combine(assets, height, image_format)
+        file_name = f"images.{image_format}"
+        embed = discord.Embed(
+            title=fmt.bound_str(", ".join(f"**{n}**" for n in names), 256),
+            color=discord.Color.blue(),
+        )
+        embed.set_image(url=f"attachment://{file_name}")
+        await channel.send(embed=embed, file=discord.File(io.BytesIO(data), file_name))
+
+    async def send_not_found(self, item: str, channel: discord.TextChannel):
         embed = discord.Embed(title=f"[{item}] Not Found", color=discord.Color.blue())
         await channel.send(embed=embed)
 
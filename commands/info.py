@@ -1,5 +1,6 @@
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
-from utils import find, std_embed
+from utils import find, fmt, guild_stats, std_embed
+from utils.paged_message import Paged_Message
 
 import discord
 
@@ -29,15 +30,40 @@ class Info_Command(Bot_Command):
             )
 
         elif args.strip().casefold() == "roles":
-            await std_embed.send_info(
-                channel,
-                title=f"{guild.name}'s Roles",
-                description = "\n".join(
-                    f"{role.mention} - {str(len(role.members))+' members' if len(role.members) != 1 else str(len(role.members))+' member'}" 
-                    for role in guild.roles 
-                    if (not role.is_default() and not role.is_bot_managed())
+            stats = guild_stats.get_stats(guild)
+            roles = [
+                role
+                for role in guild.roles
+                if (not role.is_default() and not role.is_bot_managed())
+            ]
+
+            #one field per role, split over as many pages as needed
+            def role_field(role):
+                count = stats.get_role_count(role)
+                return (
+                    fmt.bound_str(role.name, 256),
+                    f"{role.mention} - {count} {'member' if count == 1 else 'members'}",
+                    True,
                 )
+
+            #without every member cached, roles are only counted for the members the bot has seen
+            approximate_note = None if stats.chunked else "Member counts are approximate since not every member is cached."
+            pages = Paged_Message.embed_list_from_items(
+                roles,
+                lambda i: f"{guild.name}'s Roles",
+                lambda i: approximate_note,
+                role_field,
+                msg.author,
+                color=discord.Color.blue(),
             )
+            if pages:
+                await Paged_Message(pages, msg.author).send(channel)
+            else:
+                await std_embed.send_info(
+                    channel,
+                    title=f"{guild.name}'s Roles",
+                    description="This server has no roles",
+                )
 
         elif args.casefold().startswith("role "):
             #get the role name
@@ -55,15 +81,15 @@ class Info_Command(Bot_Command):
                 embed.add_field(name="Color", value=str(role.color), inline=True)
 
                 #add a field displaying up to the first 10 members with this role
-                value = ""
-                try:
-                    for i in range(10):
-                        value += f"{i+1}. {role.members[i].mention}\n"
-                except IndexError:
-                    pass
-                if len(role.members) > 0:
+                value = "".join(
+                    f"{i+1}. {member.mention}\n"
+                    for i, member in enumerate(role.members[:10])
+                )
+                stats = guild_stats.get_stats(guild)
+                member_count = stats.get_role_count(role)
+                if member_count > 0:
                     embed.add_field(
-                        name=f"Members: {len(role.members)}",
+                        name=f"Members: {member_count}" if stats.chunked else f"Members: ~{member_count}",
                         value=value,
                         inline=False
                     )
@@ -71,10 +97,12 @@ class Info_Command(Bot_Command):
 
         elif args.casefold().startswith("channels"):
             embed = std_embed.get_info(title=f"{guild.name}'s Channels")
+            stats = guild_stats.get_stats(guild)
+            channel_types = stats.channel_types
 
-            embed.add_field(name="Categories", value=f"{len(guild.categories)} channels")
-            embed.add_field(name="Voice Channels", value=f"{len(guild.voice_channels)} channels")
-            embed.add_field(name="Text Channels", value=f"{len(guild.text_channels)} channels")
+            embed.add_field(name="Categories", value=f"{channel_types[discord.ChannelType.category]} channels")
+            embed.add_field(name="Voice Channels", value=f"{channel_types[discord.ChannelType.voice]} channels")
+            embed.add_field(name="Text Channels", value=f"{stats.text_channel_count} channels")
 
             embed.add_field(name="Rules Channel", value=guild.rules_channel.mention if guild.rules_channel else "None")
             embed.add_field(name="AFK Channel", value=guild.afk_channel.mention if guild.afk_channel else "None")
@@ -112,12 +140,13 @@ class Info_Command(Bot_Command):
                 inline=True
             )
             #second row
-            text_channels = len(guild.text_channels)
-            voice_channels = len(guild.voice_channels)
-            categories = len(guild.categories)
+            stats = guild_stats.get_stats(guild)
+            text_channels = stats.text_channel_count
+            voice_channels = stats.channel_types[discord.ChannelType.voice]
+            categories = stats.channel_types[discord.ChannelType.category]
             embed.add_field(
                 name="Channels",
-                value=f"{len(guild.channels)}: {str(categories)+' categories' if categories != 1 else str(categories)+' category'},\n"
+                value=f"{stats.channel_count}: {str(categories)+' categories' if categories != 1 else str(categories)+' category'},\n"
                 f"{str(text_channels)+' text channels' if text_channels != 1 else str(text_channels)+' text channel'},\n"
                 f"{str(voice_channels)+' voice channels' if voice_channels != 1 else str(voice_channels)+' voice channel'}",
                 inline=True
@@ -131,7 +160,8 @@ class Info_Command(Bot_Command):
                 name="Members",
                 value=f"""
                 {guild.member_count} members
-                """,
+                {stats.humans} humans, {stats.bots} bots
+                """ if stats.chunked else f"{guild.member_count} members",
                 inline=True
             )
 
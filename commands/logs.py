@@ -1,8 +1,17 @@
 import discord
+import asyncio
+import datetime
+import gzip
+import io
+import logging
+import re
+from itertools import islice
 from pathlib import Path
+from typing import Optional
 from core import client
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
-from utils import errors, get, std_embed
+from utils import errors, fmt, get, log_index, parse, std_embed
+from utils.paged_message import Paged_Message
 
 _max_log_history = len(get.User_Selection_Message.default_selection_reactions)
 
@@ -10,14 +19,33 @@ _max_log_history = len(get.User_Selection_Message.default_selection_reactions)
 class Logs_Command(Bot_Command):
     name = "logs"
     aliases = ["log"]
-    short_help = "Downloads the bot's logs."
-    long_help = (
-        f"Downloads the bot's logs. Only the {_max_log_history} latest logs "
-        "are available for download."
-    )
+    short_help = "Downloads or searches the bot's logs."
+    long_help = f"""Downloads the bot's logs. Only the {_max_log_history} latest logs are available for download.
+    __Usage:__
+    **logs** - Choose log files to download
+    **logs query** *filters* - Shows the newest log records matching every filter
+    **logs query** *filters* **file** - Sends every matching record as a compressed file
+
+    __Filters:__
+    **since** *time* / **until** *time* - A date and time, or a duration like `2h` for that long ago
+    **guild**, **user** or **channel** *id or mention* - Records about a guild, user or channel
+    **command** *name* - Records logged by a command
+    **level** *level* - Records at or above a level, like `warning`
+    **text** *text* - Records containing some text
+    Values with spaces must be quoted, like `since "yesterday 5pm"`.
+    """
 
     category = Bot_Command_Category.BOT_META
 
+    log_path = Path("data/bot/logs")
+
+    # How many matching records are shown in pages
+    max_paged_records = 100
+    # How much of each record is shown in pages
+    max_record_len = 1000
+
+    _re_id = re.compile(r"<(?:@[!&]?|#)(\d+)>|(\d+)")
+
     async def can_run(self, location, member):
         if member is not None:
             appinfo = await client.application_info()
@@ -28,11 +56,13 @@ class Logs_Command(Bot_Command):
         return False
 
     async def run(self, msg: discord.Message, args: str):
-        log_path = Path("data/bot/logs")
-        if log_path.exists():
-            log_files = sorted(log_path.iterdir(), key=lambda f: f.name, reverse=True)[
-                :_max_log_history
-            ]
+        split_args = parse.split_args(args, treat_comma_as_space=True)
+        if split_args and split_args[0].casefold() == "query":
+            await self.query(msg, split_args[1:])
+            return
+
+        if self.log_path.exists():
+            log_files = log_index.get_log_files(self.log_path)[:_max_log_history]
             if log_files:
                 send_files = await get.selections(
                     msg.channel,
@@ -65,5 +95,170 @@ class Logs_Command(Bot_Command):
             author=msg.author,
         )
 
+    def parse_query(
+        self, args: list[str], guild: Optional[discord.Guild]
+    ) -> tuple[log_index.Log_Query, bool]:
+        """Returns the query described by `args` and whether or not the
+        results should be sent as a file.
+        """
+        query = log_index.Log_Query()
+        as_file = False
+        i = 0
+        while i < len(args):
+            key = args[i].casefold()
+            if key == "file":
+                as_file = True
+                i += 1
+                continue
+            if i + 1 >= len(args):
+                raise errors.InvalidInputError(
+                    fmt.format_maxlen("Missing a value for `{}`", args[i])
+                )
+            value = args[i + 1]
+            i += 2
+
+            if key in ("since", "until"):
+                time = self.parse_time(value)
+                if key == "since":
+                    query.since = time
+                else:
+                    query.until = time
+            elif key in ("guild", "user", "channel"):
+                m = self._re_id.fullmatch(value.strip())
+                if m is None:
+                    raise errors.InvalidInputError(
+                        fmt.format_maxlen("`{}` is not an id or mention", value)
+                    )
+                query.ids.append(int(m.group(1) or m.group(2)))
+            elif key == "command":
+                command = bot_commands.get_command(value.casefold(), guild)
+                query.command = (
+                    command.name if command is not None else value.casefold()
+                )
+            elif key == "level":
+                level = logging.getLevelName(value.upper())
+                if not isinstance(level, int):
+                    raise errors.InvalidInputError(
+                        fmt.format_maxlen("`{}` is not a log level", value)
+                    )
+                query.level = level
+            elif key == "text":
+                query.text = value
+            else:
+                raise errors.InvalidInputError(
+                    fmt.format_maxlen("Unknown filter `{}`", args[i - 2])
+                )
+        return query, as_file
+
+    def parse_time(self, s: str) -> datetime.datetime:
+        try:
+            # Durations are how long ago
+            duration = parse.str_to_timedelta(s)
+            if duration:
+                return datetime.datetime.now() - duration
+        except ValueError:
+            pass
+        try:
+            return parse.str_to_datetime(s)
+        except ValueError:
+            raise errors.InvalidInputError(
+                fmt.format_maxlen("Could not read `{}` as a time", s)
+            )
+
+    async def query(self, msg: discord.Message, args: list[str]):
+        query, as_file = self.parse_query(args, msg.guild)
+        loop = asyncio.get_event_loop()
+        # Indexing and reading logs is blocking file work, so it is kept off
+        # the event loop
+        if as_file:
+            size_limit = (
+                msg.guild.filesize_limit if msg.guild is not None else 8 * 1024 * 1024
+            )
+            data, count, complete = await loop.run_in_executor(
+                None, self.compress_records, query, size_limit
+            )
+            if not count:
+                await self.send_no_records(msg)
+                return
+            description = f"{count} matching records, newest first."
+            if not complete:
+                description += " Older records were left out to keep the file small enough to send."
+            await msg.channel.send(
+                embed=std_embed.get_success(
+                    title="Log Query", description=description, author=msg.author
+                ),
+                file=discord.File(io.BytesIO(data), "log_query.log.gz"),
+            )
+            return
+
+        records = await loop.run_in_executor(
+            None,
+            lambda: list(
+                islice(
+                    log_index.search(query, self.log_path), self.max_paged_records + 1
+                )
+            ),
+        )
+        if not records:
+            await self.send_no_records(msg)
+            return
+
+        description = (
+            f"Showing the newest {self.max_paged_records} matching records. Add `file` to get all of them."
+            if len(records) > self.max_paged_records
+            else None
+        )
+        pages = Paged_Message.embed_list_from_items(
+            records[: self.max_paged_records],
+            lambda i: "Log Query",
+            lambda i: description,
+            self.get_record_field,
+            msg.author,
+            color=std_embed.Colors.INFO,
+        )
+        await Paged_Message(pages, msg.author).send(msg.channel)
+
+    def get_record_field(
+        self, record: tuple[log_index.Index_Entry, str]
+    ) -> tuple[str, str, bool]:
+        entry, text = record
+        name = f"{datetime.datetime.fromtimestamp(entry.created):%Y-%m-%d %H:%M:%S} {logging.getLevelName(entry.level)}"
+        if entry.command:
+            name += f" {entry.command}"
+        # Leave out the time, level and logger at the start of the record
+        message = text.split(": ", 1)[1] if ": " in text else text
+        message = fmt.bound_str(message.strip(), self.max_record_len).replace(
+            "```", "`\u200b``"
+        )
+        return name, f"```{message}```", False
+
+    def compress_records(
+        self, query: log_index.Log_Query, size_limit: int
+    ) -> tuple[bytes, int, bool]:
+        """Returns every record matching `query` compressed with gzip, how
+        many records were compressed, and whether or not every matching
+        record fit within `size_limit` bytes.
+        """
+        buffer = io.BytesIO()
+        count = 0
+        complete = True
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as gzip_file:
+            for _, text in log_index.search(query, self.log_path):
+                # Leave room for what the compressor hasn't written yet
+                if buffer.tell() + len(text) > size_limit * 0.9:
+                    complete = False
+                    break
+                gzip_file.write(text.encode("utf-8"))
+                count += 1
+        return buffer.getvalue(), count, complete
+
+    async def send_no_records(self, msg: discord.Message):
+        await std_embed.send_info(
+            msg.channel,
+            title="Log Query",
+            description="No log records match the query",
+            author=msg.author,
+        )
+
 
 bot_commands.add_command(Logs_Command())
@@ -1,12 +1,13 @@
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
-from utils import find, std_embed
+from core import client, handles_guild
+from utils import find, std_embed, tasks
+from collections import Counter
 from commands.unmute import unmute
 from typing import Optional, Union
 from utils.parse import re_duration, str_to_timedelta
 from datetime import datetime, timezone
 
 import discord
-import asyncio
 import re
 import db
 
@@ -25,16 +26,89 @@ class Mute_Command(Bot_Command):
 
     category = Bot_Command_Category.TOOLS
 
-    #ensures log file exists and self.muted contains its contents
     def __init__(self):
-        db.execute("""CREATE TABLE IF NOT EXISTS mute (
-                Server bigint,
-                Member bigint,
-                UnmuteDT datetime,
-                Moderator bigint,
-                PRIMARY KEY (Server, Member)
-            );"""
-        )
+        #(guild id, member id) to how many unmutes are waiting for that mute to end
+        #server mutes use the guild id as the member id
+        self._waiting: Counter[tuple[int, int]] = Counter()
+
+
+
+
+
+    #the old command's unmutes keep running, so take over tracking them instead of resuming them again
+    def on_reload(self, old_command: "Mute_Command"):
+        self._waiting = old_command._waiting
+
+
+
+
+
+    #resumes waiting for mutes that were active when the bot restarted
+    async def on_ready(self):
+        operation = "SELECT Server, Member, UnmuteDT FROM mute;"
+        #mutes in guilds owned by other shards are resumed by the process running those shards
+        for guild_id, member_id, unmute_at in db.read_execute(operation):
+            #on_ready runs again after every reconnect, so skip mutes that are already being waited on
+            if handles_guild(guild_id) and not self._waiting[(guild_id, member_id)]:
+                self.wait_to_unmute(
+                    (guild_id, member_id),
+                    self.resume_unmute(guild_id, member_id, unmute_at),
+                    f"Unmute member {member_id} in {guild_id}"
+                )
+
+
+
+
+
+    #runs `unmute` in the background and keeps track of it until it finishes
+    def wait_to_unmute(self, key: tuple[int, int], unmute, name: str):
+        self._waiting[key] += 1
+
+        def done(_):
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+
+        #unmutes that are cut short by shutting down are resumed by on_ready when the bot starts again
+        tasks.spawn(unmute, name, group="mute", cancel_on_shutdown=True).add_done_callback(done)
+
+
+
+
+
+    #waits until a mute from before the bot restarted ends and silently removes it
+    async def resume_unmute(self, guild_id: int, member_id: int, unmute_at: datetime):
+        await discord.utils.sleep_until(unmute_at.astimezone())
+        guild = client.get_guild(guild_id)
+        if guild is None:
+            return
+        role = discord.utils.get(guild.roles, name="mute")
+        #server-wide mute
+        if member_id == guild_id:
+            if not self.compare_time(guild):
+                return
+            if role is not None:
+                for mem in await find.all_members(guild):
+                    if role not in mem.roles:
+                        continue
+                    #skip any members that have been muted outside of the server mute
+                    operation = "SELECT * FROM mute WHERE Server = %s AND Member = %s;"
+                    if not db.read_execute(operation, (guild_id, mem.id)):
+                        await mem.remove_roles(role)
+            print(f"Server [#{guild.id}: {guild.name}] is unmuted")
+        else:
+            #members aren't all cached under the minimal intents, so fetch them if needed
+            member = await find.member_by_id(guild, member_id)
+            if member is not None:
+                if not self.compare_time(guild, member):
+                    return
+                #members stay muted while a server mute is active
+                operation = "SELECT * FROM mute WHERE Server = %s AND Member = %s;"
+                if role is not None and not db.read_execute(operation, (guild_id, guild_id)):
+                    await member.remove_roles(role)
+                print(f"{member} was unmuted.")
+        operation = "DELETE FROM mute WHERE Server = %s AND Member = %s;"
+        db.execute(operation, (guild_id, member_id))
 
 
 
@@ -128,14 +202,16 @@ class Mute_Command(Bot_Command):
         if info:
             info = info[0]
             dt = info[2]
-            mod = guild.get_member(info[3])
+            mod = await find.member_by_id(guild, info[3])
+            #the moderator may have left the server since muting
+            mod_mention = mod.mention if mod is not None else f"<@{info[3]}>"
             await std_embed.send_info(
                 channel,
                 title="MUTE INFO",
                 description=f"""
                 {'**ACTIVE SERVER MUTE**' if member is None else f'**Member:** {member.mention}'}
                 **Until:** <t:{int(dt.timestamp())}>
-                **By:** {mod.mention}""",
+                **By:** {mod_mention}""",
                 author=member if not None else mod
             )
         else:
@@ -241,12 +317,10 @@ class Mute_Command(Bot_Command):
         if m is None:
             print(f"Muted server [#{channel.guild.id}: {channel.guild.name}] until: {unmute_at}")
             #assign the mute role to all members
-            for m in channel.guild.members:
+            for m in await find.all_members(channel.guild):
                 await m.add_roles(self.role)
             #log a server mute
-            operation = "REPLACE INTO mute VALUES (%s, %s, %s, %s);"
-            params = (channel.guild.id, channel.guild.id, unmute_at, author.id)
-            db.execute(operation, params)
+            db.write_buffer.replace("mute", (channel.guild.id, channel.guild.id, unmute_at, author.id))
 
             await std_embed.send_info(
                 channel,
@@ -254,11 +328,12 @@ class Mute_Command(Bot_Command):
                 description=f"Muted all members until <t:{int(unmute_at.timestamp())}>",
                 author=author
             )
-            #wait until the time to unmute the server
-            await discord.utils.sleep_until(unmute_at.astimezone())
-            if self.compare_time(channel.guild):
-                await unmute.unmute(channel, channel.guild, author)
-                print(f"Server [#{channel.guild.id}: {channel.guild.name}] is unmuted")
+            #unmute the server in the background once the mute ends
+            self.wait_to_unmute(
+                (channel.guild.id, channel.guild.id),
+                self.unmute_server_when_due(channel, unmute_at, author),
+                f"Unmute server {channel.guild.id}"
+            )
         #if trying to mute a single member, but could not be found
         else:
             #if m is a string try to get the Member object
@@ -277,9 +352,7 @@ class Mute_Command(Bot_Command):
             await m.add_roles(self.role)
 
             #log a member mute
-            operation = "REPLACE INTO mute VALUES (%s, %s, %s, %s);"
-            params = (channel.guild.id, m.id, unmute_at, author.id)
-            db.execute(operation, params)
+            db.write_buffer.replace("mute", (channel.guild.id, m.id, unmute_at, author.id))
 
             print(f"Muted @{m} until {unmute_at}")
             await std_embed.send_info(
@@ -289,25 +362,49 @@ class Mute_Command(Bot_Command):
                 author=m
             )
 
-            #wait until the time to unmute the member
-            await discord.utils.sleep_until(unmute_at.astimezone())
-            #check if member is logged and due to be unmuted
-            if self.compare_time(channel.guild, m):
-                operation = "SELECT * FROM mute WHERE Server = %s AND Member = %s;"
-                params = (channel.guild.id, channel.guild.id)
-                x = db.read_execute(operation, params)
-                print(x)
-                #if active server-mute, delete member from database but don't unmute them
-                #if db.read_execute(operation, params):
-                if x:
-                    print(f"Server mute active. {m} was not unmuted.")
-                    operation = "DELETE FROM mute WHERE Server = %s AND Member = %s;"
-                    params = (channel.guild.id, m.id)
-                    db.execute(operation, params)
-                    return
-                #calls unmute command from unmute.py
-                await unmute.unmute(channel, channel.guild, author, m)
-                print(f"{m} was unmuted.")
+            #unmute the member in the background once the mute ends
+            self.wait_to_unmute(
+                (channel.guild.id, m.id),
+                self.unmute_member_when_due(channel, unmute_at, author, m),
+                f"Unmute member {m.id} in {channel.guild.id}"
+            )
+
+
+
+
+
+    #waits until a server mute ends and unmutes the server
+    async def unmute_server_when_due(self, channel: discord.TextChannel, unmute_at: datetime, author: discord.Member):
+        await discord.utils.sleep_until(unmute_at.astimezone())
+        if self.compare_time(channel.guild):
+            await unmute.unmute(channel, channel.guild, author)
+            print(f"Server [#{channel.guild.id}: {channel.guild.name}] is unmuted")
+
+
+
+
+
+    #waits until a member's mute ends and unmutes the member
+    async def unmute_member_when_due(self, channel: discord.TextChannel, unmute_at: datetime, author: discord.Member, m: discord.Member):
+        #wait until the time to unmute the member
+        await discord.utils.sleep_until(unmute_at.astimezone())
+        #check if member is logged and due to be unmuted
+        if self.compare_time(channel.guild, m):
+            operation = "SELECT * FROM mute WHERE Server = %s AND Member = %s;"
+            params = (channel.guild.id, channel.guild.id)
+            x = db.read_execute(operation, params)
+            print(x)
+            #if active server-mute, delete member from database but don't unmute them
+            #if db.read_execute(operation, params):
+            if x:
+                print(f"Server mute active. {m} was not unmuted.")
+                operation = "DELETE FROM mute WHERE Server = %s AND Member = %s;"
+                params = (channel.guild.id, m.id)
+                db.execute(operation, params)
+                return
+            #calls unmute command from unmute.py
+            await unmute.unmute(channel, channel.guild, author, m)
+            print(f"{m} was unmuted.")
 
 
 
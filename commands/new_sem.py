@@ -1,6 +1,188 @@
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional
+from utils import find, fmt, get, send_queue, std_embed, tasks
+from utils.paged_message import Paged_Message
 
+import asyncio
 import discord
+import json
+import logging
+import time
+import db
+
+log = logging.getLogger("newsem")
+
+
+class Rollover:
+    """A semester rollover for a guild, planned as a list of operations that
+    are saved to a checkpoint file as they finish so that the rollover can be
+    resumed if the bot stops part way through.
+
+    Operations are dictionaries with a "kind", a "status" of "pending",
+    "done" or "failed", an "error" if they failed, and the ids they need:
+        archive: saves a course channel's history to a file.
+        reset_class: removes every assignment from a class in assignments.json.
+        clear_schedule: removes past events from the guild's schedule.
+        remove_role: removes a class role from a member.
+        divider: sends the new semester divider to a course channel.
+    """
+
+    checkpoint_dir = Path("data/newsem")
+    archive_dir = Path("data/newsem/archives")
+
+    # How many operations of each kind run at once. Archiving reads a lot of
+    # history, and role edits share the guild's rate limit.
+    concurrency = {
+        "archive": 2,
+        "reset_class": 1,
+        "clear_schedule": 1,
+        "remove_role": 5,
+        "divider": 3,
+    }
+    # Operations of earlier stages finish before later stages start, so that
+    # channels are archived before anything is sent to them
+    stages = (
+        ("archive", "reset_class", "clear_schedule", "remove_role"),
+        ("divider",),
+    )
+    # The least time in seconds between saves of the checkpoint file
+    checkpoint_interval = 1
+
+    def __init__(self, guild_id: int, operations: list[dict[str, Any]], created: Optional[str] = None):
+        self.guild_id = guild_id
+        self.operations = operations
+        self.created = created or datetime.now().isoformat(timespec="seconds")
+        self._last_save = 0.0
+
+    @property
+    def path(self) -> Path:
+        return self.checkpoint_dir / f"{self.guild_id}.json"
+
+    @classmethod
+    def load(cls, guild_id: int) -> Optional["Rollover"]:
+        """Returns the guild's saved rollover, or `None` if there isn't one."""
+        path = cls.checkpoint_dir / f"{guild_id}.json"
+        if not path.exists():
+            return None
+        with path.open("r") as file:
+            data = json.load(file)
+        return cls(guild_id, data["operations"], data["created"])
+
+    def save(self) -> None:
+        """Writes the rollover to its checkpoint file. The file is replaced
+        in one step so a crash while saving can't corrupt it.
+        """
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with temp_path.open("w") as file:
+            json.dump(
+                {"created": self.created, "operations": self.operations}, file, indent=1
+            )
+        temp_path.replace(self.path)
+        self._last_save = time.monotonic()
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def count(self, status: Optional[str] = None, kind: Optional[str] = None) -> int:
+        return sum(
+            1
+            for op in self.operations
+            if (status is None or op["status"] == status)
+            and (kind is None or op["kind"] == kind)
+        )
+
+    def summary(self) -> str:
+        """Returns how many operations of each kind are done, failed and
+        pending.
+        """
+        lines = []
+        for kind in self.concurrency:
+            total = self.count(kind=kind)
+            if total:
+                lines.append(
+                    f"**{kind}**: {self.count('done', kind)}/{total} done"
+                    + (f", {self.count('failed', kind)} failed" if self.count("failed", kind) else "")
+                )
+        return "\n".join(lines) or "Nothing to do"
+
+    async def execute(self, guild: discord.Guild, divider: str, on_progress: Optional[Callable[[], Any]] = None) -> None:
+        """Runs every pending operation, saving the checkpoint file as
+        operations finish. Failed operations are not retried.
+        """
+        for stage in self.stages:
+            semaphores = {kind: asyncio.Semaphore(self.concurrency[kind]) for kind in stage}
+
+            async def run(op):
+                async with semaphores[op["kind"]]:
+                    try:
+                        await self._run_operation(guild, op, divider)
+                        op["status"] = "done"
+                    except Exception as e:
+                        op["status"] = "failed"
+                        op["error"] = str(e)
+                        log.error(f"Rollover operation {op} failed: {fmt.format_error(e)}")
+                if time.monotonic() - self._last_save >= self.checkpoint_interval:
+                    self.save()
+                if on_progress is not None:
+                    on_progress()
+
+            await asyncio.gather(
+                *(run(op) for op in self.operations if op["kind"] in stage and op["status"] == "pending")
+            )
+            self.save()
+
+    async def _run_operation(self, guild: discord.Guild, op: dict[str, Any], divider: str) -> None:
+        kind = op["kind"]
+        if kind == "archive":
+            channel = guild.get_channel(op["channel_id"])
+            if channel is None:
+                raise ValueError("The channel no longer exists")
+            await self._archive(channel)
+        elif kind == "reset_class":
+            class_command = get_class_command(guild)
+            if class_command is None:
+                raise ValueError("The class command is not loaded")
+            for assignment_command in class_command.commands:
+                if assignment_command.guild_id == str(guild.id) and assignment_command.name == op["class_name"]:
+                    assignment_command.class_info["assignments"] = {}
+            class_command.save_assignments(str(guild.id))
+        elif kind == "clear_schedule":
+            operation = "DELETE FROM schedule WHERE Server = %s AND Datetime < %s;"
+            db.execute(operation, (guild.id, datetime.fromisoformat(self.created)))
+        elif kind == "remove_role":
+            role = guild.get_role(op["role_id"])
+            member = await find.member_by_id(guild, op["member_id"])
+            # Nothing to do if either is gone
+            if role is not None and member is not None and role in member.roles:
+                await member.remove_roles(role, reason="Semester rollover")
+        elif kind == "divider":
+            channel = guild.get_channel(op["channel_id"])
+            if channel is None:
+                raise ValueError("The channel no longer exists")
+            await send_queue.send(channel, divider)
+
+    async def _archive(self, channel: discord.TextChannel) -> None:
+        """Writes every message in `channel` to a text file, oldest first. An
+        archive that was interrupted is started over.
+        """
+        archive_path = self.archive_dir / str(self.guild_id) / f"{channel.name}-{channel.id}.txt"
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        with archive_path.open("w", encoding="utf-8") as file:
+            async for m in channel.history(limit=None, oldest_first=True):
+                line = f"[{m.created_at.replace(microsecond=0)}] {m.author}: {m.content}"
+                for attachment in m.attachments:
+                    line += f" {attachment.url}"
+                file.write(fmt.escape_newlines(line) + "\n")
+
+
+def get_class_command(guild: discord.Guild):
+    """Returns the command that manages the classes in assignments.json, or
+    `None` if it is not loaded.
+    """
+    return bot_commands.get_command("class", guild)
 
 
 class New_Semester_Command(Bot_Command):
@@ -11,23 +193,20 @@ class New_Semester_Command(Bot_Command):
     long_help = """Sends a divider message in chat denoting a new semester
     Arguments:
     `None`
+
+    **Rollover:**
+    `rollover plan` - Shows everything a semester rollover would do
+    `rollover run` - Archives course channels, resets class assignments, removes past schedule events, removes class roles and sends the divider. Resumes the last rollover if it didn't finish
+    `rollover status` - Shows how far along the last rollover is
+    `rollover cancel` - Forgets the last rollover so that the next one is planned again
+    Course channels are the text channels in the course categories. Class roles are roles named after a class.
     """
 
     category = Bot_Command_Category.MODERATION
 
     categories = ["random"]
 
-    def can_run(self, location, member):
-        return member is not None and member.guild_permissions.administrator
-
-    async def run(self, msg: discord.Message, args: str):
-        if not args:
-            for category in msg.guild.categories:
-                if category.name.lower() in self.categories:
-                    for channel in category.text_channels:
-                        print("A new semester has started!")
-                        await channel.send(
-                            """```
+    divider = """```
          |\     |
          | \    |
          |  \   |
@@ -107,10 +286,183 @@ class New_Semester_Command(Bot_Command):
         |    \\
         |     \\
         ``` """
-                        )
+
+    # How often the rollover progress message is updated, in seconds
+    progress_interval = 3
+
+    def can_run(self, location, member):
+        return member is not None and member.guild_permissions.administrator
+
+    async def run(self, msg: discord.Message, args: str):
+        if not args:
+            channels = [
+                channel
+                for category in msg.guild.categories
+                if category.name.lower() in self.categories
+                for channel in category.text_channels
+            ]
+            print("A new semester has started!")
+            # Queue every divider at once so they're sent to all channels together
+            await asyncio.gather(
+                *(send_queue.send(channel, self.divider) for channel in channels)
+            )
+        elif args.lower() == "rollover" or args.lower().startswith("rollover "):
+            await self.rollover(msg, args[len("rollover"):].strip().lower())
         else:
             print("This command doesn't have any arguments.")
             await msg.channel.send("This command doesn't have any arguments.")
 
+    async def rollover(self, msg: discord.Message, subcommand: str):
+        guild = msg.guild
+        saved = Rollover.load(guild.id)
+
+        if subcommand == "status":
+            await std_embed.send_info(
+                msg.channel,
+                title="Semester Rollover",
+                description=(
+                    f"Started {saved.created}\n{saved.summary()}"
+                    if saved is not None
+                    else "No rollover has been started"
+                ),
+                author=msg.author,
+            )
+        elif subcommand == "cancel":
+            if saved is not None:
+                saved.delete()
+            await std_embed.send_success(
+                msg.channel,
+                title="Semester Rollover",
+                description="The last rollover was forgotten",
+                author=msg.author,
+            )
+        elif subcommand in ("plan", "run"):
+            rollover = saved if saved is not None and saved.count("pending") else await self.plan(guild)
+            resuming = rollover is saved
+            await self.send_plan(msg, rollover, resuming)
+            if subcommand == "plan" or not rollover.count("pending"):
+                return
+            if not await get.confirmation(
+                msg.author,
+                msg.channel,
+                title="Start the rollover?" if not resuming else "Resume the rollover?",
+                description="This cannot be undone.",
+            ):
+                return
+            await self.execute(msg, rollover)
+        else:
+            await std_embed.send_error(
+                msg.channel,
+                title="Semester Rollover",
+                description="Usage: `rollover plan|run|status|cancel`",
+                author=msg.author,
+            )
+
+    async def plan(self, guild: discord.Guild) -> Rollover:
+        """Returns a new rollover of every operation needed for `guild`."""
+        operations: list[dict[str, Any]] = []
+        course_channels = [
+            channel
+            for category in guild.categories
+            if category.name.lower() in self.categories
+            for channel in category.text_channels
+        ]
+        for channel in course_channels:
+            operations.append({"kind": "archive", "channel_id": channel.id, "status": "pending"})
+
+        class_command = get_class_command(guild)
+        class_names = set()
+        if class_command is not None:
+            class_names = set(class_command.assignments_dict.get(str(guild.id), {}))
+        for class_name in sorted(class_names):
+            operations.append({"kind": "reset_class", "class_name": class_name, "status": "pending"})
+
+        operations.append({"kind": "clear_schedule", "status": "pending"})
+
+        class_roles = [r for r in guild.roles if r.name.casefold() in {c.casefold() for c in class_names}]
+        if class_roles:
+            for member in await find.all_members(guild):
+                for role in class_roles:
+                    if role in member.roles:
+                        operations.append(
+                            {"kind": "remove_role", "role_id": role.id, "member_id": member.id, "status": "pending"}
+                        )
+
+        for channel in course_channels:
+            operations.append({"kind": "divider", "channel_id": channel.id, "status": "pending"})
+        return Rollover(guild.id, operations)
+
+    async def send_plan(self, msg: discord.Message, rollover: Rollover, resuming: bool):
+        guild = msg.guild
+
+        def describe(op: dict[str, Any]) -> str:
+            if "channel_id" in op:
+                channel = guild.get_channel(op["channel_id"])
+                return channel.mention if channel is not None else "Deleted channel"
+            if "class_name" in op:
+                return op["class_name"]
+            return "Past events"
+
+        # List each kind of operation once with the objects it applies to, leaving role removals as counts
+        fields = []
+        for kind in Rollover.concurrency:
+            ops = [op for op in rollover.operations if op["kind"] == kind and op["status"] == "pending"]
+            if not ops:
+                continue
+            if kind == "remove_role":
+                roles = {}
+                for op in ops:
+                    roles[op["role_id"]] = roles.get(op["role_id"], 0) + 1
+                value = "\n".join(
+                    f"{guild.get_role(r).mention if guild.get_role(r) else 'Deleted role'}: {n} members"
+                    for r, n in roles.items()
+                )
+            else:
+                value = ", ".join(describe(op) for op in ops)
+            fields.append((f"{kind} ({len(ops)})", fmt.bound_str(value, 1024), False))
+
+        pages = Paged_Message.embed_list_from_items(
+            fields,
+            lambda i: "Resuming Semester Rollover" if resuming else "Semester Rollover Plan",
+            lambda i: rollover.summary() if resuming else None,
+            lambda f: f,
+            msg.author,
+        )
+        await Paged_Message(pages, msg.author).send(msg.channel)
+
+    async def execute(self, msg: discord.Message, rollover: Rollover):
+        rollover.save()
+        status = await msg.channel.send(embed=self.get_progress_embed(rollover, msg.author))
+        last_update = time.monotonic()
+
+        def on_progress():
+            nonlocal last_update
+            if time.monotonic() - last_update >= self.progress_interval:
+                last_update = time.monotonic()
+                tasks.spawn(
+                    self.update_progress(status, rollover, msg.author),
+                    f"Rollover progress in {msg.guild.id}",
+                    group="new_sem",
+                )
+
+        await rollover.execute(msg.guild, self.divider, on_progress)
+        await self.update_progress(status, rollover, msg.author, done=True)
+        if not rollover.count("failed"):
+            rollover.delete()
+
+    def get_progress_embed(self, rollover: Rollover, author: discord.Member, done: bool = False) -> discord.Embed:
+        get_embed = std_embed.get_success if done and not rollover.count("failed") else std_embed.get_info
+        return get_embed(
+            title="Semester Rollover " + ("Finished" if done else "Running..."),
+            description=fmt.bound_str(rollover.summary(), 4096),
+            author=author,
+        )
+
+    async def update_progress(self, status: discord.Message, rollover: Rollover, author: discord.Member, done: bool = False):
+        try:
+            await status.edit(embed=self.get_progress_embed(rollover, author, done))
+        except discord.HTTPException:
+            pass
+
 
 bot_commands.add_command(New_Semester_Command())
@@ -0,0 +1,240 @@
+from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
+from core import client
+from utils import fmt, std_embed
+from utils.errors import InvalidInputError
+
+import db
+
+import discord
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+
+class Pin_Command(Bot_Command):
+    name = "pin"
+
+    short_help = "Shows or changes how many 📌 reactions pin a message"
+
+    long_help = """Members can pin messages on their own by reacting to them with 📌.
+    Once a message has enough 📌 reactions it is pinned.
+    __Usage:__
+    **pin** - Shows how many reactions pin a message in this server
+    **pin threshold** *number* - Changes how many reactions pin a message. Admins only
+    **pin threshold off** - Stops members from pinning messages with reactions. Admins only
+    """
+
+    category = Bot_Command_Category.COMMUNITY
+
+    emoji = "📌"
+
+    default_threshold = 3
+
+    # How many messages' votes and pinned messages are remembered
+    max_tracked_messages = 10000
+
+    def __init__(self):
+        # Message id to how many 📌 reactions it has, least recently voted
+        # on first
+        self._votes: OrderedDict[int, int] = OrderedDict()
+        # Ids of messages that are known to be pinned
+        self._pinned: OrderedDict[int, None] = OrderedDict()
+        # Message id of each message being fetched to be pinned to how many
+        # 📌 reactions were added to it, less how many were removed, while
+        # it was being fetched
+        self._fetching: dict[int, int] = {}
+        # Ids of messages being fetched whose 📌 reactions were all removed
+        # while they were being fetched
+        self._cleared_while_fetching: set[int] = set()
+        # Guild id to the number of reactions that pin a message in the guild
+        self._thresholds: dict[int, int] = {}
+        # Votes are only counted from reaction events. Reactions on messages
+        # sent before this id may have been added while the bot was offline
+        # or after their votes were forgotten, so those messages are fetched
+        # once to get their real count.
+        self._complete_after_id = discord.utils.time_snowflake(datetime.utcnow())
+
+    def on_reload(self, old_command: "Pin_Command"):
+        self._votes = old_command._votes
+        self._pinned = old_command._pinned
+        self._complete_after_id = old_command._complete_after_id
+
+    async def run(self, msg: discord.Message, args: str):
+        if msg.guild is None:
+            raise InvalidInputError("Pin thresholds can only be used in servers")
+
+        split_args = args.split()
+        if not split_args:
+            threshold = self.get_threshold(msg.guild.id)
+            await std_embed.send_info(
+                msg.channel,
+                title="Pin threshold",
+                description=fmt.format_maxlen(
+                    "Messages with {} {} reactions are pinned",
+                    threshold,
+                    self.emoji,
+                )
+                if threshold
+                else "Pinning messages with reactions is turned off",
+                author=msg.author,
+            )
+            return
+
+        if split_args[0].casefold() != "threshold" or len(split_args) != 2:
+            raise InvalidInputError(
+                fmt.format_maxlen("Invalid arguments `{}` for `pin`", args)
+            )
+        if not msg.author.guild_permissions.administrator:
+            raise InvalidInputError("Only admins can change the pin threshold")
+
+        if split_args[1].casefold() == "off":
+            threshold = 0
+        elif split_args[1].isdigit() and int(split_args[1]) > 0:
+            threshold = int(split_args[1])
+        else:
+            raise InvalidInputError(
+                fmt.format_maxlen(
+                    "`{}` is not a positive number or `off`", split_args[1]
+                )
+            )
+
+        self._thresholds[msg.guild.id] = threshold
+        db.write_buffer.replace("pin_threshold", (msg.guild.id, threshold))
+        await std_embed.send_success(
+            msg.channel,
+            title="Pin threshold",
+            description=fmt.format_maxlen(
+                "Messages with {} {} reactions will now be pinned",
+                threshold,
+                self.emoji,
+            )
+            if threshold
+            else "Pinning messages with reactions was turned off",
+            author=msg.author,
+        )
+
+    def get_threshold(self, guild_id: Optional[int]) -> int:
+        """Returns how many reactions pin a message in the guild with the id
+        `guild_id`, or 0 if pinning with reactions is turned off.
+        """
+        if guild_id is None:
+            return self.default_threshold
+        threshold = self._thresholds.get(guild_id)
+        if threshold is None:
+            rows = db.read_execute(
+                "SELECT Threshold FROM pin_threshold WHERE Server = %s;", (guild_id,)
+            )
+            threshold = rows[0][0] if rows else self.default_threshold
+            self._thresholds[guild_id] = threshold
+        return threshold
+
+    def _set_votes(self, message_id: int, votes: int) -> None:
+        self._votes[message_id] = votes
+        self._votes.move_to_end(message_id)
+        while len(self._votes) > self.max_tracked_messages:
+            forgotten_id, _ = self._votes.popitem(last=False)
+            # Reactions to the forgotten message will not be counted anymore
+            self._complete_after_id = max(self._complete_after_id, forgotten_id)
+
+    def _set_pinned(self, message_id: int) -> None:
+        self._votes.pop(message_id, None)
+        self._pinned[message_id] = None
+        self._pinned.move_to_end(message_id)
+        while len(self._pinned) > self.max_tracked_messages:
+            self._pinned.popitem(last=False)
+
+    async def on_reaction_add(self, payload: discord.RawReactionActionEvent):
+        """Counts a 📌 reaction, pinning the message once it has enough.
+        Should be called for every reaction added.
+        """
+        if payload.emoji.name != self.emoji:
+            return
+        message_id = payload.message_id
+        if message_id in self._pinned:
+            return
+        threshold = self.get_threshold(payload.guild_id)
+        if not threshold:
+            return
+        if message_id in self._fetching:
+            # The fetched count may have been taken before this reaction
+            self._fetching[message_id] += 1
+            return
+
+        if message_id in self._votes or message_id > self._complete_after_id:
+            votes = self._votes.get(message_id, 0) + 1
+            self._set_votes(message_id, votes)
+            if votes < threshold:
+                return
+        # The message is only fetched when it may have reached the threshold,
+        # or when its votes aren't known
+        await self._fetch_and_pin(payload.channel_id, message_id, threshold)
+
+    def on_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        """Uncounts a 📌 reaction. Should be called for every reaction
+        removed.
+        """
+        if payload.emoji.name != self.emoji:
+            return
+        if payload.message_id in self._fetching:
+            self._fetching[payload.message_id] -= 1
+        elif payload.message_id in self._votes:
+            self._set_votes(
+                payload.message_id, max(self._votes[payload.message_id] - 1, 0)
+            )
+
+    def on_reaction_clear(self, message_id: int):
+        """Forgets the votes of a message whose 📌 reactions were all
+        removed.
+        """
+        if message_id in self._fetching:
+            self._fetching[message_id] = 0
+            self._cleared_while_fetching.add(message_id)
+        elif message_id in self._votes:
+            self._set_votes(message_id, 0)
+
+    def _add_fetching_votes(self, message_id: int, votes: int) -> int:
+        """Returns the `votes` fetched for a message with the reactions added
+        and removed while it was being fetched counted too.
+        """
+        if message_id in self._cleared_while_fetching:
+            votes = 0
+        return max(votes + self._fetching[message_id], 0)
+
+    async def _fetch_and_pin(self, channel_id: int, message_id: int, threshold: int):
+        channel = client.get_channel(channel_id)
+        if channel is None:
+            return
+        self._fetching[message_id] = 0
+        try:
+            try:
+                message = await channel.fetch_message(message_id)
+            except discord.HTTPException:
+                return
+            if message.pinned:
+                self._set_pinned(message_id)
+                return
+            pin_reactions = discord.utils.get(message.reactions, emoji=self.emoji)
+            votes = pin_reactions.count if pin_reactions is not None else 0
+            if self._add_fetching_votes(message_id, votes) >= threshold:
+                try:
+                    await message.pin()
+                except discord.HTTPException as e:
+                    # The channel may already have the most pins allowed
+                    self.log.warning(
+                        f"Could not pin message {message_id}: {fmt.format_error(e)}"
+                    )
+                    self._set_votes(
+                        message_id, self._add_fetching_votes(message_id, votes)
+                    )
+                    return
+                self._set_pinned(message_id)
+            else:
+                self._set_votes(
+                    message_id, self._add_fetching_votes(message_id, votes)
+                )
+        finally:
+            self._fetching.pop(message_id, None)
+            self._cleared_while_fetching.discard(message_id)
+
+
+bot_commands.add_command(Pin_Command())
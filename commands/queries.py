@@ -0,0 +1,101 @@
+import discord
+import db
+from core import client
+from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
+from utils import fmt, std_embed
+
+
+class Queries_Command(Bot_Command):
+    name = "queries"
+
+    short_help = "Shows which database queries the bot spends the most time on."
+
+    long_help = f"""Shows the database queries the bot has spent the most time running since it started.
+    Queries that only differ by their values are counted together.
+    Queries slower than {db.slow_query_threshold} seconds are also written to the logs.
+    __Usage:__
+    **queries**
+    **queries explain** - Shows how the database runs the slowest queries
+    """
+
+    category = Bot_Command_Category.BOT_META
+
+    _max_queries = 10
+    _max_explained_queries = 5
+
+    async def can_run(self, location, member):
+        if member is not None:
+            appinfo = await client.application_info()
+            if appinfo.owner.id == member.id:
+                return True
+            if appinfo.team is not None:
+                return any((member.id == m.id for m in appinfo.team.members))
+        return False
+
+    async def run(self, msg: discord.Message, args: str):
+        if args.strip().lower() == "explain":
+            await self._send_explanations(msg)
+            return
+
+        top_queries = db.get_top_queries(self._max_queries)
+        if not top_queries:
+            await std_embed.send_info(
+                msg.channel,
+                title="Queries",
+                description="No queries have been run yet",
+                author=msg.author,
+            )
+            return
+
+        queries_embed = std_embed.get_info(title="Queries", author=msg.author)
+        for shape, stats in top_queries:
+            queries_embed.add_field(
+                name=fmt.bound_str(shape, 256),
+                value=(
+                    f"Runs: {stats.count}\n"
+                    f"Total: {stats.total_time:.3f}s\n"
+                    f"Average: {stats.average_time() * 1000:.2f}ms\n"
+                    f"Max: {stats.max_time * 1000:.2f}ms"
+                ),
+                inline=False,
+            )
+        await msg.channel.send(embed=queries_embed)
+
+    async def _send_explanations(self, msg: discord.Message):
+        explanations = db.explain_top_queries(self._max_explained_queries)
+        if not explanations:
+            await std_embed.send_info(
+                msg.channel,
+                title="Query Plans",
+                description="No queries to explain yet",
+                author=msg.author,
+            )
+            return
+
+        explain_embed = std_embed.get_info(title="Query Plans", author=msg.author)
+        for shape, rows in explanations:
+            plan = "\n".join(self._format_plan_row(row) for row in rows)
+            explain_embed.add_field(
+                name=fmt.bound_str(shape, 256),
+                value=fmt.bound_str(plan, 1024) or "No plan",
+                inline=False,
+            )
+        await msg.channel.send(embed=explain_embed)
+
+    @staticmethod
+    def _format_plan_row(row: dict) -> str:
+        # SQLite describes each step of its plan in a single column
+        if "detail" in row:
+            return row["detail"]
+        return fmt.format_maxlen(
+            "{}: {} using {}, ~{} rows{}",
+            row.get("table"),
+            row.get("type"),
+            row.get("key") or "no index",
+            row.get("rows"),
+            f" ({row['Extra']})" if row.get("Extra") else "",
+            max_total_len=None,
+        )
+
+
+bot_commands.add_command(Queries_Command())
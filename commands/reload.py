@@ -0,0 +1,76 @@
+import discord
+from core import client
+from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
+from utils import errors, fmt, std_embed
+
+
+class Reload_Command(Bot_Command):
+    name = "reload"
+
+    short_help = "Reloads a command module without restarting the bot."
+
+    long_help = """Re-imports a command's module and replaces its commands without restarting the bot.
+    Calls of the old commands that are still running are allowed to finish.
+    Modules that import from the reloaded module keep using the old version until they are reloaded too.
+    __Usage:__
+    **reload** *command|module*
+    """
+
+    category = Bot_Command_Category.BOT_META
+
+    async def can_run(self, location, member):
+        if member is not None:
+            appinfo = await client.application_info()
+            if appinfo.owner.id == member.id:
+                return True
+            if appinfo.team is not None:
+                return any((member.id == m.id for m in appinfo.team.members))
+        return False
+
+    async def run(self, msg: discord.Message, args: str):
+        args = args.strip()
+        if not args:
+            raise errors.UserInputError("A command or module to reload is required")
+
+        # Reload the module that defines the command named `args` if there is
+        # one, otherwise treat `args` as a module name.
+        cmd = bot_commands.get_command(args, msg.guild)
+        module = type(cmd).__module__ if cmd is not None else args
+
+        try:
+            new_commands, running_calls = await bot_commands.reload_module(module)
+        except Exception as e:
+            # A module the reloaded module imports can be missing too, which
+            # is an error in the module rather than in the input
+            if (
+                isinstance(e, ModuleNotFoundError)
+                and e.name == bot_commands.get_module_name(module)
+            ):
+                raise errors.InvalidInputError(
+                    fmt.format_maxlen("Could not find the module `{}`", module)
+                )
+            self.log.error(fmt.format_error(e))
+            raise errors.ReportableError(
+                fmt.format_maxlen(
+                    "Error reloading `{}`, kept the old version: {}", module, e
+                )
+            )
+
+        description = fmt.format_maxlen(
+            "Reloaded commands: {}",
+            ", ".join(sorted({f"`{c}`" for c in new_commands})) or "None",
+        )
+        if running_calls:
+            description += (
+                f"\n{running_calls} call{'s' if running_calls != 1 else ''} "
+                "of the old version are still running."
+            )
+        await std_embed.send_success(
+            msg.channel,
+            title=fmt.format_maxlen("Reloaded {}", module),
+            description=description,
+            author=msg.author,
+        )
+
+
+bot_commands.add_command(Reload_Command())
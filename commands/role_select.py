@@ -5,10 +5,10 @@ import re
 
 from typing import Literal, Optional, Union
 
-from core import client
-from db import db
+from core import client, handles_guild
+from db import db, read_execute, write_buffer
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
-from utils import errors, find, fmt, get, paged_message, std_embed
+from utils import errors, find, fmt, get, paged_message, std_embed, tasks
 
 from main import bot_prefix
 from commands.cmd_help import help_cmd
@@ -31,35 +31,13 @@ class Role_Select_Command(Bot_Command):
 
     _re_custom_emoji = re.compile(r"<:(?P<name>[A-Za-z_\d~]{2,32}):(?P<id>\d{18})>")
 
+    # How many reactions to role selection messages are handled at the same
+    # time. A burst of reactions waits instead of all changing roles at once.
+    max_concurrent_reactions = 5
+
     def __init__(self):
         self._handling_messages = False
-
-        with db.cursor() as cursor:
-            cursor.execute(
-                """CREATE TABLE IF NOT EXISTS role_select_messages (
-                    message_id BIGINT NOT NULL,
-                    channel_id BIGINT NOT NULL,
-                    guild_id BIGINT NOT NULL,
-                    name VARCHAR(100) NOT NULL,
-                    description VARCHAR(2000),
-                    allow_multiple_selections BIT(1),
-                    creator_id BIGINT NOT NULL,
-                    created_on DATETIME NOT NULL,
-                    PRIMARY KEY (message_id)
-                );"""
-            )
-            # The largest emoji I could find is 🏴󠁧󠁢󠁷󠁬󠁳󠁿, which fits in a VARCHAR(7)
-            cursor.execute(
-                """CREATE TABLE IF NOT EXISTS role_select_reactions (
-                    message_id BIGINT NOT NULL,
-                    emoji VARCHAR(7) NOT NULL,
-                    role_id BIGINT NOT NULL,
-                    FOREIGN KEY (message_id)
-                        REFERENCES role_select_messages(message_id)
-                        ON DELETE CASCADE
-                );"""
-            )
-            db.commit()
+        tasks.set_limit("role_select_reactions", self.max_concurrent_reactions)
 
     def can_run(self, location, member):
         if not isinstance(location, (discord.Guild, discord.TextChannel)):
@@ -97,7 +75,21 @@ class Role_Select_Command(Bot_Command):
         await self._check_all_messages()
         if not self._handling_messages:
             self._handling_messages = True
-            await self._handle_reactions()
+            self._reaction_task = tasks.spawn_service(
+                self._handle_reactions, "Role selection reactions", group="role_select"
+            )
+
+    def on_reload(self, old_command: "Role_Select_Command"):
+        # The message ids were already checked when the old command became
+        # ready, so take them over instead of re-fetching every message.
+        self.message_ids = old_command.message_ids
+        if old_command._handling_messages:
+            old_command._handling_reactions = False
+            old_command._reaction_task.cancel()
+            self._handling_messages = True
+            self._reaction_task = tasks.spawn_service(
+                self._handle_reactions, "Role selection reactions", group="role_select"
+            )
 
     async def create_new_selector(
         self, channel: discord.TextChannel, creator: discord.Member
@@ -208,6 +200,9 @@ class Role_Select_Command(Bot_Command):
         for emoji in emojis_to_roles.keys():
             await selector_message.add_reaction(emoji)
 
+        # Write any buffered deletes of old selector messages first so that
+        # they can't be applied after this insert
+        write_buffer.flush()
         with db.cursor() as c:
             c.execute(
                 """INSERT INTO role_select_messages VALUES (
@@ -257,20 +252,19 @@ class Role_Select_Command(Bot_Command):
     ):
         await self._check_guild_messages(channel.guild.id)
         if list_channel_name is None:
-            with db.cursor() as c:
-                c.execute(
-                    """SELECT message_id, channel_id, name FROM role_select_messages
-                    WHERE guild_id = %s;""",
-                    (channel.guild.id,),
+            results = read_execute(
+                """SELECT message_id, channel_id, name FROM role_select_messages
+                WHERE guild_id = %s;""",
+                (channel.guild.id,),
+            )
+            links = [
+                (
+                    name,
+                    f"[Link]"
+                    f"({channel.guild.get_channel(c_id).get_partial_message(m_id).jump_url})",
                 )
-                links = [
-                    (
-                        name,
-                        f"[Link]"
-                        f"({channel.guild.get_channel(c_id).get_partial_message(m_id).jump_url})",
-                    )
-                    for m_id, c_id, name in c.fetchall()
-                ]
+                for m_id, c_id, name in results
+            ]
         else:
             list_channel = await find.channel(
                 channel, list_channel_name, requester, channel_types=discord.TextChannel
@@ -279,16 +273,15 @@ class Role_Select_Command(Bot_Command):
                 raise errors.InvalidInputError(
                     fmt.format_maxlen("No channel {} found", list_channel_name)
                 )
-            with db.cursor() as c:
-                c.execute(
-                    """SELECT message_id, name FROM role_select_messages
-                    WHERE channel_id = %s AND guild_id = %s;""",
-                    (list_channel.id, channel.guild.id),
-                )
-                links = [
-                    (name, f"[Link]({list_channel.get_partial_message(m_id).jump_url})")
-                    for m_id, name in c.fetchall()
-                ]
+            results = read_execute(
+                """SELECT message_id, name FROM role_select_messages
+                WHERE channel_id = %s AND guild_id = %s;""",
+                (list_channel.id, channel.guild.id),
+            )
+            links = [
+                (name, f"[Link]({list_channel.get_partial_message(m_id).jump_url})")
+                for m_id, name in results
+            ]
 
         title = "Role selection messages"
         if list_channel_name is not None:
@@ -323,36 +316,31 @@ class Role_Select_Command(Bot_Command):
             ).send(channel)
 
     async def _check_all_messages(self):
-        with db.cursor() as cursor:
-            cursor.execute(
-                "SELECT message_id, channel_id, guild_id FROM role_select_messages;"
-            )
-            results = cursor.fetchall()
+        results = read_execute(
+            "SELECT message_id, channel_id, guild_id FROM role_select_messages;"
+        )
 
         valid_message_ids: set[int] = set()
         invalid_message_ids: list[tuple[int]] = []
         for message_id, channel_id, guild_id in results:
+            # Messages in guilds owned by other shards are checked by the
+            # process running those shards.
+            if not handles_guild(guild_id):
+                continue
             if await self._check_message_exists(guild_id, channel_id, message_id):
                 valid_message_ids.add(message_id)
             else:
                 invalid_message_ids.append((message_id,))
         self.message_ids = valid_message_ids
-        if invalid_message_ids:
-            with db.cursor() as cursor:
-                cursor.executemany(
-                    "DELETE FROM role_select_messages WHERE message_id = %s;",
-                    invalid_message_ids,
-                )
-                db.commit()
+        for key in invalid_message_ids:
+            write_buffer.delete("role_select_messages", ("message_id",), key)
 
     async def _check_guild_messages(self, guild_id: int):
-        with db.cursor() as cursor:
-            cursor.execute(
-                """SELECT message_id, channel_id FROM role_select_messages
-                WHERE guild_id = %s;""",
-                (guild_id,),
-            )
-            results = cursor.fetchall()
+        results = read_execute(
+            """SELECT message_id, channel_id FROM role_select_messages
+            WHERE guild_id = %s;""",
+            (guild_id,),
+        )
         valid_message_ids = set()
         invalid_message_ids = set()
         for message_id, channel_id in results:
@@ -364,13 +352,8 @@ class Role_Select_Command(Bot_Command):
         self.message_ids.update(valid_message_ids)
         self.message_ids.difference_update(invalid_message_ids)
         # Remove messages that no longer exist from SQL tables
-        if invalid_message_ids:
-            with db.cursor() as cursor:
-                cursor.executemany(
-                    "DELETE FROM role_select_messages WHERE message_id = %s;",
-                    [(m_id,) for m_id in invalid_message_ids],
-                )
-                db.commit()
+        for m_id in invalid_message_ids:
+            write_buffer.delete("role_select_messages", ("message_id",), (m_id,))
 
     async def _check_message_exists(
         self, guild_id: int, channel_id: int, message_id: int
@@ -416,7 +399,11 @@ class Role_Select_Command(Bot_Command):
                         },
                     ]
                 )
-                asyncio.ensure_future(self._handle_reaction_event(result))
+                tasks.spawn(
+                    self._handle_reaction_event(result),
+                    f"Role selection reaction on {result.message_id}",
+                    group="role_select_reactions",
+                )
             except Exception as e:
                 Role_Select_Command.log.error(fmt.format_error(e))
 
@@ -437,19 +424,20 @@ class Role_Select_Command(Bot_Command):
 
         emoji = str(payload.emoji)
         # Try to get the role ids corresponding to the reaction
-        with db.cursor() as c:
-            c.execute(
+        reaction_role_ids = {
+            r[0]
+            for r in read_execute(
                 """SELECT role_id FROM role_select_reactions
                 WHERE message_id = %s AND emoji = %s;""",
                 (payload.message_id, emoji),
             )
-            reaction_role_ids = {r[0] for r in c.fetchall()}
-            c.execute(
-                """SELECT allow_multiple_selections FROM role_select_messages
-                WHERE message_id = %s;""",
-                (payload.message_id,),
-            )
-            allow_multiple_selections = c.fetchone()[0]
+        }
+        allow_multiple_selections = read_execute(
+            # Cast since prepared statements return BIT values as bytes
+            """SELECT CAST(allow_multiple_selections AS UNSIGNED)
+            FROM role_select_messages WHERE message_id = %s;""",
+            (payload.message_id,),
+        )[0][0]
 
         # Handle the reaction if there are no corresponding roles
         if not reaction_role_ids:
@@ -470,7 +458,7 @@ class Role_Select_Command(Bot_Command):
         if payload.member is not None:
             member = payload.member
         else:
-            member = guild.get_member(payload.user_id)
+            member = await find.member_by_id(guild, payload.user_id)
 
         try:
             # TODO: Add reasons
@@ -512,15 +500,16 @@ class Role_Select_Command(Bot_Command):
                 )
                 keep_role_ids = set()
                 if keep_emojis:
-                    with db.cursor() as c:
-                        # Try to get the role ids corresponding to the reaction
-                        for e in keep_emojis:
-                            c.execute(
+                    # Try to get the role ids corresponding to the reaction
+                    for e in keep_emojis:
+                        keep_role_ids.update(
+                            r[0]
+                            for r in read_execute(
                                 """SELECT role_id FROM role_select_reactions
                                 WHERE message_id = %s AND emoji = %s;""",
                                 (payload.message_id, e),
                             )
-                            keep_role_ids.update((r[0] for r in c.fetchall()))
+                        )
 
                 remove_roles = (
                     guild.get_role(r_id)
@@ -575,8 +564,9 @@ class Role_Select_Command(Bot_Command):
         roles = [r for r in roles if not r.is_bot_managed()]
         # Remove roles managed by other messages
         guild_id = channel.guild.id
-        with db.cursor() as c:
-            c.execute(
+        managed_role_ids = {
+            r[0]
+            for r in read_execute(
                 """SELECT role_select_reactions.role_id
                 FROM role_select_messages
                 JOIN role_select_reactions
@@ -584,7 +574,7 @@ class Role_Select_Command(Bot_Command):
                 WHERE role_select_messages.guild_id = %s;""",
                 (guild_id,),
             )
-            managed_role_ids = {r[0] for r in c.fetchall()}
+        }
         roles = [r for r in roles if r.id not in managed_role_ids]
         # List highest roles first
         roles.reverse()
@@ -595,6 +585,7 @@ class Role_Select_Command(Bot_Command):
             responder=responder,
             title=title,
             description=description,
+            search_text_generator=lambda r: r.name,
         )
         while not ret:
             # If no selections were made, keep asking for roles to be selected
@@ -605,6 +596,7 @@ class Role_Select_Command(Bot_Command):
                 responder=responder,
                 title=title,
                 description=f"You must select roles. {description}",
+                search_text_generator=lambda r: r.name,
             )
         return ret
 
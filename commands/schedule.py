@@ -1,8 +1,10 @@
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
+from core import client, handles_guild
 from utils import find, get
 from utils.paged_message import Paged_Message
-from utils import parse, std_embed, errors
+from utils import parse, std_embed, errors, tasks
 from typing import Optional, Union
+from collections import Counter
 from datetime import datetime, date, timedelta, timezone
 
 import discord
@@ -27,19 +29,48 @@ class Schedule_Command(Bot_Command):
 
     category = Bot_Command_Category.COMMUNITY
 
-    #create a table in the database to store events if it doesn't exist
     def __init__(self):
-        db.execute("""CREATE TABLE IF NOT EXISTS schedule (
-                Server BIGINT,
-                Title VARCHAR(100),
-                Datetime DATETIME NOT NULL,
-                MsgID BIGINT NOT NULL,
-                ChannelID BIGINT NOT NULL,
-                RoleID BIGINT NOT NULL,
-                AuthorID BIGINT NOT NULL,
-                PRIMARY KEY (Server, Title)
-            );"""
-        )
+        #(guild id, message id) to how many tasks are sending reminders for that event
+        #editing an event starts a new task while the old one is still waiting to notice the edit
+        self._running: Counter[tuple[int, int]] = Counter()
+
+
+
+
+
+    #the old command's events keep running, so take over tracking them instead of resuming them again
+    def on_reload(self, old_command: "Schedule_Command"):
+        self._running = old_command._running
+
+
+
+
+
+    #resumes reminders for events that were scheduled before the bot restarted
+    async def on_ready(self):
+        operation = "SELECT * FROM schedule WHERE Datetime > %s;"
+        params = (datetime.now(),)
+        #events in guilds owned by other shards are resumed by the process running those shards
+        for event in db.read_execute(operation, params):
+            if not handles_guild(event[0]):
+                continue
+            guild = client.get_guild(event[0])
+            if guild is None:
+                continue
+            #on_ready runs again after every reconnect, so skip events that are already running
+            if self._running[(guild.id, event[3])]:
+                continue
+            channel = guild.get_channel(event[4])
+            role = guild.get_role(event[5])
+            if channel is None or role is None:
+                continue
+            self.start_event(
+                channel.get_partial_message(event[3]), event[1], event[2], role
+            )
+
+
+
+
 
     async def run(self, msg: discord.Message, args: str):
         #gets current server
@@ -122,7 +153,7 @@ class Schedule_Command(Bot_Command):
             params = (guild.id, title, dt, message.id, message.channel.id, role.id, msg.author.id)
             db.execute(operation, params)
 
-            await self.schedule_event(message, title, dt, role)
+            self.start_event(message, title, dt, role)
 
         #edits a specified event
         elif args.casefold().startswith("edit"):
@@ -245,9 +276,9 @@ class Schedule_Command(Bot_Command):
         #assigns the role to all users who reacted
         for user in users:
             #convert User object into Member
-            member = msg.guild.get_member(user.id)
-            #ignore any bots that react
-            if member.bot:
+            member = await find.member_by_id(msg.guild, user.id)
+            #ignore any bots that react and members that left
+            if member is None or member.bot:
                 continue
             if role not in member.roles:
                 await member.add_roles(role)
@@ -256,6 +287,33 @@ class Schedule_Command(Bot_Command):
 
 
 
+    #sends the reminders for an event in the background until the event is over
+    def start_event(
+        self,
+        msg: Union[discord.Message, discord.PartialMessage],
+        title: str,
+        dt: datetime,
+        role: discord.Role
+    ):
+        key = (msg.channel.guild.id, msg.id)
+        self._running[key] += 1
+
+        def done(_):
+            self._running[key] -= 1
+            if not self._running[key]:
+                del self._running[key]
+
+        tasks.spawn(
+            self.schedule_event(msg, title, dt, role),
+            f"Event {title} in {msg.channel.guild.id}",
+            group="schedule",
+            cancel_on_shutdown=True
+        ).add_done_callback(done)
+
+
+
+
+
     async def schedule_event(
         self,
         msg: discord.Message,
@@ -570,7 +628,7 @@ class Schedule_Command(Bot_Command):
 
         await std_embed.send_success(channel, title="EDIT EVENT", description=edit_desc + f"\n\nJoin [here]({message.jump_url})")
         #schedule a new event with the edited information
-        await self.schedule_event(message, title, dt, role)
+        self.start_event(message, title, dt, role)
 
 
 
@@ -617,8 +675,9 @@ class Schedule_Command(Bot_Command):
 
         #if a year is specified check if it has events scheduled, otherwise get a tuple of all years with events scheduled
         if year is not None:
-            operation = "SELECT DISTINCT YEAR(Datetime) FROM schedule WHERE Server = %s AND YEAR(Datetime) = %s;"
-            params = (guild.id, year)
+            #filter by a range of datetimes instead of YEAR(Datetime) so the index on (Server, Datetime) can be used
+            operation = "SELECT DISTINCT YEAR(Datetime) FROM schedule WHERE Server = %s AND Datetime >= %s AND Datetime < %s;"
+            params = (guild.id, datetime(int(year), 1, 1), datetime(int(year) + 1, 1, 1))
             years = db.read_execute(operation, params)
             if not years:
                 await no_events()
@@ -633,8 +692,10 @@ class Schedule_Command(Bot_Command):
         embeds = []
         def field_generator(item):
             #get a list of tuples representing events in this month, ordered by datetime
-            operation = "SELECT * FROM schedule WHERE Server = %s AND YEAR(Datetime) = %s AND MONTH(Datetime) = %s ORDER BY Datetime;"
-            params = (guild.id, year, item)
+            operation = "SELECT * FROM schedule WHERE Server = %s AND Datetime >= %s AND Datetime < %s ORDER BY Datetime;"
+            month_start = datetime(year, item, 1)
+            month_end = datetime(year + 1, 1, 1) if item == 12 else datetime(year, item + 1, 1)
+            params = (guild.id, month_start, month_end)
             l = db.read_execute(operation, params)
             name = datetime.strptime(str(item), '%m').strftime('%B')
             value = "\n".join(f"[<t:{int(event[2].timestamp())}> - {event[1]}]"
@@ -645,8 +706,8 @@ class Schedule_Command(Bot_Command):
         #create a list of embeds per year
         for year in years:
             #get a unique list of months with events in ascending order
-            operation = "SELECT DISTINCT MONTH(Datetime) FROM schedule WHERE Server = %s AND YEAR(Datetime) = %s ORDER BY MONTH(Datetime) ASC;"
-            params = (guild.id, year)
+            operation = "SELECT DISTINCT MONTH(Datetime) FROM schedule WHERE Server = %s AND Datetime >= %s AND Datetime < %s ORDER BY MONTH(Datetime) ASC;"
+            params = (guild.id, datetime(year, 1, 1), datetime(year + 1, 1, 1))
             months = [item[0] for item in db.read_execute(operation, params)]
             embeds += (Paged_Message.embed_list_from_items(
                     months,
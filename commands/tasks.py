@@ -0,0 +1,110 @@
+import discord
+import asyncio
+from core import client
+from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
+from utils import fmt, std_embed, tasks
+from utils.paged_message import Paged_Message
+
+
+class Tasks_Command(Bot_Command):
+    name = "tasks"
+
+    short_help = "Shows the bot's background tasks and memory usage."
+
+    long_help = """Shows how many background tasks the bot is running in each group, how long the oldest has been running, and how many have failed or been restarted.
+    __Usage:__
+    **tasks**
+    **tasks list** - Lists every background task
+    """
+
+    category = Bot_Command_Category.BOT_META
+
+    async def can_run(self, location, member):
+        if member is not None:
+            appinfo = await client.application_info()
+            if appinfo.owner.id == member.id:
+                return True
+            if appinfo.team is not None:
+                return any((member.id == m.id for m in appinfo.team.members))
+        return False
+
+    async def run(self, msg: discord.Message, args: str):
+        running = tasks.get_tasks()
+        if args.strip().lower() == "list":
+            await self._send_list(msg, running)
+            return
+
+        groups: dict[str, list[tasks.Task_Info]] = {}
+        for info in running:
+            groups.setdefault(info.group, []).append(info)
+        for group in tasks.failures:
+            groups.setdefault(group, [])
+
+        # Tasks the supervisor doesn't own, like the ones discord.py runs
+        other_tasks = len(asyncio.all_tasks()) - len(running)
+        memory = tasks.get_memory_usage()
+        memory_text = (
+            f"{memory / 1024 / 1024:.1f} MB" if memory is not None else "Unknown"
+        )
+        description = (
+            f"Background tasks: {len(running)}\n"
+            f"Other tasks: {other_tasks}\n"
+            f"Memory: {memory_text}"
+        )
+        tasks_embed = std_embed.get_info(
+            title="Tasks", description=description, author=msg.author
+        )
+        for group, infos in sorted(groups.items())[:25]:
+            # `get_tasks` returns the oldest tasks first
+            oldest = self._format_age(infos[0].age) if infos else "None"
+            tasks_embed.add_field(
+                name=fmt.bound_str(group, 256),
+                value=(
+                    f"Running: {len(infos)}\n"
+                    f"Oldest: {oldest}\n"
+                    f"Failures: {tasks.failures[group]}\n"
+                    f"Restarts: {sum(i.restarts for i in infos)}"
+                ),
+            )
+        await msg.channel.send(embed=tasks_embed)
+
+    async def _send_list(self, msg: discord.Message, running: list[tasks.Task_Info]):
+        if not running:
+            await std_embed.send_info(
+                msg.channel,
+                title="Tasks",
+                description="No background tasks are running",
+                author=msg.author,
+            )
+            return
+
+        pages = Paged_Message.embed_list_from_items(
+            running,
+            lambda i: f"Tasks ({len(running)})",
+            None,
+            lambda t: (
+                fmt.bound_str(t.name, 256),
+                f"Group: {t.group}\n"
+                f"Age: {self._format_age(t.age)}\n"
+                f"Restarts: {t.restarts}",
+                True,
+            ),
+            msg.author,
+        )
+        await Paged_Message(pages, msg.author).send(msg.channel)
+
+    @staticmethod
+    def _format_age(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        days, hours = divmod(hours, 24)
+        if days:
+            return f"{days}d {hours}h {minutes}m"
+        if hours:
+            return f"{hours}h {minutes}m {seconds}s"
+        if minutes:
+            return f"{minutes}m {seconds}s"
+        return f"{seconds}s"
+
+
+bot_commands.add_command(Tasks_Command())
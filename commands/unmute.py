@@ -86,7 +86,9 @@ class Unmute_Command(Bot_Command):
                     description="A server mute is not active."
                 )
                 return
-            for mem in mute.members:
+            for mem in await find.all_members(guild):
+                if mute not in mem.roles:
+                    continue
                 #skip any members that have been muted outside of the server mute
                 operation = "SELECT * FROM mute WHERE Server = %s AND Member = %s;"
                 params = (guild.id, mem.id)
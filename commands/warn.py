@@ -1,16 +1,190 @@
 from logging import warn
 from commands.mute import mute
 from bot_cmd import Bot_Command, bot_commands, Bot_Command_Category
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from utils import find, fmt, std_embed
-from utils.errors import ReportableError
+from typing import Optional
+from utils import find, fmt, recent_messages, std_embed
+from utils.errors import InvalidInputError, ReportableError
+from utils.parse import str_to_timedelta
 from main import bot_prefix
 
+import asyncio
 import discord
 import random
 import db
 
 
+class Warn_Summary:
+    """Everything the warn command needs to know about the warns a member has
+    received in a guild.
+
+    Attributes
+    ------------
+    count: int
+    How many times the member has been warned.
+
+    last_warned: Optional[datetime]
+    When the member was last warned.
+
+    last_moderator: Optional[str]
+    Who last warned the member.
+
+    reasons: list[str]
+    The reasons for each warn, oldest first.
+
+    times: list[datetime]
+    When each warn was given, oldest first.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.last_warned: Optional[datetime] = None
+        self.last_moderator: Optional[str] = None
+        self.reasons: list[str] = []
+        self.times: list[datetime] = []
+
+
+def format_duration(duration: timedelta) -> str:
+    """Returns a duration as days, hours and minutes, such as "3 Days" or
+    "1 Day 12 Hours".
+    """
+    minutes = int(duration.total_seconds()) // 60
+    parts = []
+    for unit, unit_minutes in (("Day", 24 * 60), ("Hour", 60), ("Minute", 1)):
+        amount, minutes = divmod(minutes, unit_minutes)
+        if amount:
+            parts.append(f"{amount} {unit}{'s' if amount != 1 else ''}")
+    return " ".join(parts) or "0 Minutes"
+
+
+class Warn_Action:
+    """Something done to a member once they have been warned enough times.
+
+    Attributes
+    ------------
+    kind: str
+    One of `Warn_Action.kinds`.
+
+    duration: Optional[timedelta]
+    How long "mute" actions mute the member for.
+
+    role_id: Optional[int]
+    The role "role" actions give the member.
+    """
+
+    #mute: mutes the member, role: gives the member a role, kick and ban: removes the member from the server,
+    #notice: tells moderators in the channel that they should deal with the member
+    kinds = ("mute", "role", "kick", "ban", "notice")
+    #actions that remove the member from the server, so must happen after the member is sent a message
+    removal_kinds = ("kick", "ban")
+
+    def __init__(self, kind: str, duration: Optional[timedelta] = None, role_id: Optional[int] = None):
+        if kind not in self.kinds:
+            raise ValueError(f'Unknown warn action "{kind}".')
+        self.kind = kind
+        self.duration = duration
+        self.role_id = role_id
+
+    #returns the action as shown to warned members
+    def describe(self, guild: discord.Guild) -> str:
+        if self.kind == "mute":
+            return f"Server Muted for **{format_duration(self.duration)}**"
+        elif self.kind == "role":
+            role = guild.get_role(self.role_id)
+            return f"Given the **{role.name if role is not None else 'deleted'}** role"
+        elif self.kind == "kick":
+            return "Kicked from the server"
+        elif self.kind == "ban":
+            return "Banned from the server"
+        else:
+            return "A moderator will deal with you manually. This can result in a **permanent ban** or **permanent mute**"
+
+    #does the action to a member that has been warned at least `threshold` times
+    async def run(self, member: discord.Member, channel: discord.TextChannel, author: discord.Member, threshold: int):
+        if self.kind == "mute":
+            await mute.mute(
+                m=member,
+                unmute_at=datetime.now().replace(microsecond=0) + self.duration,
+                channel=channel,
+                author=author,
+            )
+        elif self.kind == "role":
+            role = member.guild.get_role(self.role_id)
+            if role is not None:
+                await member.add_roles(role, reason=f"Warned {threshold} times")
+        elif self.kind == "kick":
+            await member.kick(reason=f"Warned {threshold} times")
+        elif self.kind == "ban":
+            await member.guild.ban(member, reason=f"Warned {threshold} times", delete_message_days=0)
+        else:
+            await std_embed.send_info(
+                channel, title = f"Notice: This user has been warned over {threshold - 1} times on this server.", author = author
+            )
+
+
+class Warn_Policy:
+    """A guild's warn escalation policy, compiled so that the actions for a
+    number of warns can be found with a binary search.
+
+    Members are punished by the actions with the highest threshold that is
+    at most the number of warns they have. Warns older than `decay` do not
+    count towards the policy.
+    """
+
+    def __init__(self, rules: list[tuple[int, Warn_Action]], decay: Optional[timedelta] = None):
+        """Parameters
+        -----------
+        rules: list[tuple[int, Warn_Action]]
+        The number of warns needed for each action.
+
+        decay: Optional[timedelta]
+        How long warns count towards the policy for. If `None`, warns never
+        expire.
+        """
+        self.decay = decay
+        self.actions: dict[int, list[Warn_Action]] = {}
+        for threshold, action in rules:
+            self.actions.setdefault(threshold, []).append(action)
+        self.thresholds = sorted(self.actions)
+
+    #returns how many of a member's warns count towards the policy
+    def active_count(self, summary: Warn_Summary, now: Optional[datetime] = None) -> int:
+        if self.decay is None:
+            return summary.count
+        now = now or datetime.now()
+        return len(summary.times) - bisect_left(summary.times, now - self.decay)
+
+    #returns the highest threshold reached by `count` warns and its actions
+    def get_actions(self, count: int) -> tuple[int, list[Warn_Action]]:
+        i = bisect_right(self.thresholds, count)
+        if i == 0:
+            return 0, []
+        threshold = self.thresholds[i - 1]
+        return threshold, self.actions[threshold]
+
+    #returns the policy as shown to warned members
+    def describe(self, guild: discord.Guild) -> str:
+        lines = []
+        for i, threshold in enumerate(self.thresholds):
+            count = f"{threshold}+" if i == len(self.thresholds) - 1 else str(threshold)
+            actions = " + ".join(a.describe(guild) for a in self.actions[threshold])
+            lines.append(f"{count} Warning{'s' if threshold != 1 else ''}: {actions}")
+        if self.decay is not None:
+            lines.append(f"Warns expire after **{format_duration(self.decay)}**")
+        return "\n".join(lines)
+
+
+#the policy used by guilds that have not set their own
+default_policy_rules = [
+    (2, Warn_Action("mute", duration=timedelta(hours=6))),
+    (3, Warn_Action("mute", duration=timedelta(days=3))),
+    (4, Warn_Action("mute", duration=timedelta(days=7))),
+    (4, Warn_Action("notice")),
+]
+
+
 class Warn_Command(Bot_Command):
     name = "warn"
 
@@ -20,6 +194,12 @@ class Warn_Command(Bot_Command):
     Command Syntax:
     **{bot_prefix}warn [member] [Optional reason]**
     **{bot_prefix}warn count [member]**
+    **{bot_prefix}warn everywhere [member] [Optional reason]** - Logs the member's recent messages from every channel instead of just this one
+    **{bot_prefix}warn policy** - Shows the punishments for being warned multiple times
+    **{bot_prefix}warn policy set [warns] [mute|role|kick|ban|notice] [duration|role]** - Punishes members once they have this many warns
+    **{bot_prefix}warn policy remove [warns] [Optional action]**
+    **{bot_prefix}warn policy decay [XXwXXdXXhXXm|off]** - Stops warns older than this from counting towards punishments
+    **{bot_prefix}warn policy reset**
     
     `member`: *@User, User ID, Nickname* (Not Case Sensitive)
     `Optional reason`: *Text* (Can have spaces)
@@ -29,18 +209,102 @@ class Warn_Command(Bot_Command):
 
     category = Bot_Command_Category.MODERATION
 
+    #how many members' warn summaries are kept in memory
+    max_cached_summaries = 1000
+
     def __init__(self):
-        db.execute("""CREATE TABLE IF NOT EXISTS warn (
-                Server bigint,
-                Member bigint,
-                Count int,
-                DT datetime,
-                Moderator text,
-                Reason text,
-                MsgLog text,
-                PRIMARY KEY (Server, Member, Count)
-            );"""
-        )
+        #(guild id, member id) to the member's warn summary, least recently used first
+        self._summaries: OrderedDict[tuple[int, int], Warn_Summary] = OrderedDict()
+        #guild id to the guild's compiled warn policy
+        self._policies: dict[int, Warn_Policy] = {}
+
+
+
+
+
+    #keeps the cached summaries and policies instead of reading them from the database again
+    def on_reload(self, old_command: "Warn_Command"):
+        self._summaries = old_command._summaries
+        self._policies = old_command._policies
+
+
+
+
+
+    #returns a guild's warn policy, only reading the database if it isn't cached
+    def get_policy(self, guild_id: int) -> Warn_Policy:
+        policy = self._policies.get(guild_id)
+        if policy is not None:
+            return policy
+
+        operation = "SELECT Threshold, Action, Duration, RoleID FROM warn_policy WHERE Server = %s;"
+        rows = db.read_execute(operation, (guild_id,))
+        if rows:
+            rules = [
+                (threshold, Warn_Action(
+                    action,
+                    duration=timedelta(seconds=duration) if duration is not None else None,
+                    role_id=role_id,
+                ))
+                for threshold, action, duration, role_id in rows
+            ]
+        else:
+            rules = default_policy_rules
+
+        operation = "SELECT Decay FROM warn_decay WHERE Server = %s;"
+        decay = db.read_execute(operation, (guild_id,))
+        decay = timedelta(seconds=decay[0][0]) if decay else None
+
+        policy = self._policies[guild_id] = Warn_Policy(rules, decay)
+        return policy
+
+
+
+
+
+    #returns the summary of a member's warns, only reading the database if it isn't cached
+    def get_summary(self, guild_id: int, member_id: int) -> Warn_Summary:
+        key = (guild_id, member_id)
+        summary = self._summaries.get(key)
+        if summary is not None:
+            self._summaries.move_to_end(key)
+            return summary
+
+        summary = Warn_Summary()
+        operation = "SELECT Count, DT, Moderator, Reason FROM warn WHERE Server = %s AND Member = %s ORDER BY Count;"
+        params = (guild_id, member_id)
+        for count, dt, moderator, reason in db.read_execute(operation, params):
+            summary.count = count
+            summary.last_warned = dt
+            summary.last_moderator = moderator
+            summary.reasons.append(reason)
+            summary.times.append(dt)
+
+        self._summaries[key] = summary
+        if len(self._summaries) > self.max_cached_summaries:
+            self._summaries.popitem(last=False)
+        return summary
+
+
+
+
+
+    #logs a warn in the database and the member's cached summary, returning the updated summary
+    def add_warn(self, member: discord.Member, moderator: str, reason: str, message_logs: list[str]) -> Warn_Summary:
+        summary = self.get_summary(member.guild.id, member.id)
+        now = datetime.now().replace(microsecond=0)
+        row = (member.guild.id, member.id, summary.count + 1, now, moderator, reason, "\\n".join(message_logs))
+        db.write_buffer.insert("warn", row)
+
+        summary.count += 1
+        summary.last_warned = now
+        summary.last_moderator = moderator
+        summary.reasons.append(reason)
+        summary.times.append(now)
+        return summary
+
+
+
 
 
     # TODO command name "count"
@@ -60,11 +324,8 @@ class Warn_Command(Bot_Command):
                         random.randint(100000000000000000, 999999999999999999),
                     )
                 )
-            #get the member's most recent warn
-            operation = "SELECT Count, DT, Moderator FROM warn WHERE Count = (SELECT MAX(Count) FROM warn WHERE Server = %s AND Member = %s);"
-            params = (msg.guild.id, member.id)
-            result = db.read_execute(operation, params)
-            if not result:
+            summary = self.get_summary(msg.guild.id, member.id)
+            if not summary.count:
                 await std_embed.send_info(
                     msg.channel,
                     title="This user has not been warned yet on this server.",
@@ -75,17 +336,26 @@ class Warn_Command(Bot_Command):
                     msg.channel,
                     description=fmt.format_maxlen(
                         "**{}** has been warned {} "
-                        f"{'time' if result[0][0] == 1 else 'times'}."
+                        f"{'time' if summary.count == 1 else 'times'}."
                         "\nLast warned: **<t:{}>** by **{}**",
                         member,
-                        result[0][0],
-                        int(result[0][1].timestamp()),
-                        result[0][2],
+                        summary.count,
+                        int(summary.last_warned.timestamp()),
+                        summary.last_moderator,
                     ),
                     author=member
                 )
 
         elif msg.author.guild_permissions.administrator:
+            #view or change the server's warn policy
+            if args.casefold() == "policy" or args.casefold().startswith("policy "):
+                await self.run_policy(msg, args[len("policy"):].strip())
+                return
+
+            #check if evidence should be gathered from every channel
+            everywhere = args.casefold().startswith("everywhere ")
+            if everywhere:
+                args = args[len("everywhere "):].strip()
             #if a member is not provided to warn
             if not args:
                 raise ReportableError("No user entered")
@@ -120,33 +390,32 @@ class Warn_Command(Bot_Command):
                 raise ReportableError("You cannot warn bots.")
 
             red = 0xFF0000  # red
-            # run this 5 times
-            check_counter = 0
-            message_logs = []
-            async for m in msg.channel.history(limit=200):
-                if check_counter == 5:
-                    break
-                if m.author == member:
-                    check_counter += 1
-                    message_logs.insert(0, m.content)
-
-            punishments = """~These are the punishments for a warning beyond the first one:
-                Two Warnings: Server Muted for **6 Hours**
-                Three Warnings: Server Muted for **3 Days**
-                Four+ Warnings: Server Muted for **7 days** + A moderator will deal with you manually. This can result in a **permanent ban** or **permanent mute**.
+            #get the member's last 5 messages as evidence, from every channel if requested
+            if everywhere:
+                message_logs = [
+                    f"#{msg.guild.get_channel(m.channel_id)}: {m.content}"
+                    for m in recent_messages.member_messages_in_guild(msg.guild, member, 5)
+                ]
+            else:
+                message_logs = [m.content for m in await recent_messages.member_messages(msg.channel, member, 5)]
+
+            policy = self.get_policy(msg.guild.id)
+            punishments = f"""~These are the punishments for a warning beyond the first one:
+                {policy.describe(msg.guild)}
                 """
 
-            #try to get the members previous warnings
-            operation = "SELECT * FROM warn WHERE Server = %s AND Member = %s ORDER BY Count;"
-            params = (msg.guild.id, member.id)
-            warnings = db.read_execute(operation, params)
+            #log the warn, updating the member's cached warn summary
+            summary = self.add_warn(member, str(msg.author), reason, message_logs)
+            warning_count = summary.count
+
+            # https://stackoverflow.com/questions/9647202/ordinal-numbers-replacement
+            ordinal = lambda n: "%d%s" % (
+                n,
+                "tsnrhtdd"[(n // 10 % 10 != 1) * (n % 10 < 4) * n % 10 :: 4],
+            )
 
             #the user's first warning
-            if not warnings:
-                #log the warn in the table
-                operation = "INSERT INTO warn VALUES (%s, %s, %s, %s, %s, %s, %s);"
-                params = (msg.guild.id, member.id, 1, datetime.now().replace(microsecond=0), str(msg.author), reason, "\\n".join(message_logs))
-                db.execute(operation, params)
+            if warning_count == 1:
                 #send the user a private message explaining the warn
                 warning_message = discord.Embed(
                     title="You have been warned!",
@@ -160,33 +429,11 @@ class Warn_Command(Bot_Command):
                         """,
                     color=red,
                 )
-                await member.send(embed=warning_message)
-                await std_embed.send_info(msg.channel,
-                    title = f"{member} has been warned. This is their first warning.",
-                    author = msg.author
-                )
+                notice_title = f"{member} has been warned. This is their first warning."
 
             #the user's successive warning
             else:
-                #get how many times this member has been muted
-                operation = "SELECT MAX(Count) FROM  warn WHERE Server = %s AND Member = %s;"
-                warning_count = db.read_execute(operation, params)[0][0] + 1
-
-                #log the warning
-                operation = "INSERT INTO warn VALUES (%s, %s, %s, %s, %s, %s, %s);"
-                params = (msg.guild.id, member.id, warning_count, datetime.now().replace(microsecond=0), str(msg.author), reason, "\\n".join(message_logs))
-                db.execute(operation, params)
-
-                operation = "SELECT Reason FROM warn WHERE Server = %s AND Member = %s ORDER BY Count;"
-                params = (msg.guild.id, member.id)
-                previous_reasons = db.read_execute(operation, params)
-                previous_reasons = "\n".join(reason[0] for reason in previous_reasons)
-
-                # https://stackoverflow.com/questions/9647202/ordinal-numbers-replacement
-                ordinal = lambda n: "%d%s" % (
-                    n,
-                    "tsnrhtdd"[(n // 10 % 10 != 1) * (n % 10 < 4) * n % 10 :: 4],
-                )
+                previous_reasons = "\n".join(summary.reasons)
 
                 warning_message = discord.Embed(
                     title="You have been warned!",
@@ -201,47 +448,173 @@ class Warn_Command(Bot_Command):
                         """,
                     color=red,  # TODO color
                 )
+                notice_title = f"{member} has been warned. This is their {ordinal(warning_count)} warning."
 
-                #handle the member appropriately depending on how many times they've been warned
-                if warning_count == 2:
-                    await member.send(embed=warning_message)
-                    await std_embed.send_info(msg.channel,
-                        title = f"{member} has been warned. This is their {ordinal(warning_count)} warning.", 
-                        author = msg.author
-                    )
-                    await mute.mute(
-                        m=member,
-                        unmute_at=datetime.now() + timedelta(hours = 6),
-                        channel=msg.channel,
-                        author=msg.author,
-                    )
-                elif warning_count == 3:
-                    await member.send(embed=warning_message)
-                    await std_embed.send_info(msg.channel,
-                        title = f"{member} has been warned. This is their {ordinal(warning_count)} warning.",
-                        author = msg.author
-                    )
-                    await mute.mute(
-                        m=member,
-                        unmute_at=datetime.now() + timedelta(days = 3),
-                        channel=msg.channel,
-                        author=msg.author,
-                    )
-                elif warning_count > 3:  # TODO welcome back, you're still muted
-                    await member.send(embed=warning_message)
-                    await std_embed.send_info(msg.channel,
-                        title = f"{member} has been warned. This is their {ordinal(warning_count)} warning.", 
-                        author = msg.author
-                    )
-                    await std_embed.send_info(
-                        msg.channel, title = "Notice: This user has been warned over 3 times on this server.", author = msg.author
-                    )
-                    await mute.mute(
-                        m=member,
-                        unmute_at=datetime.now() + timedelta(days = 7),
-                        channel=msg.channel,
-                        author=msg.author,
-                    )
+            #handle the member appropriately depending on how many of their warns count towards the policy
+            threshold, actions = policy.get_actions(policy.active_count(summary))
+            await self.dispatch(member, msg.channel, msg.author, warning_message, notice_title, threshold, actions)
+
+
+
+
+
+    #handles the warn policy subcommands
+    async def run_policy(self, msg: discord.Message, args: str):
+        split_args = args.split()
+        subcommand = split_args[0].casefold() if split_args else ""
+        guild = msg.guild
+
+        if not subcommand:
+            await self.send_policy(msg.channel, msg.author)
+            return
+
+        elif subcommand == "set":
+            if len(split_args) < 3:
+                raise InvalidInputError(f"Usage: {bot_prefix}warn policy set [warns] [{'|'.join(Warn_Action.kinds)}] [duration|role]")
+            threshold = self.parse_threshold(split_args[1])
+            kind = split_args[2].casefold()
+            if kind not in Warn_Action.kinds:
+                raise InvalidInputError(fmt.format_maxlen("Unknown action **{}**. Actions are: {}", kind, ", ".join(Warn_Action.kinds)))
+            duration = None
+            role_id = None
+            if kind == "mute":
+                if len(split_args) < 4:
+                    raise InvalidInputError("Mute actions need a duration formatted as [XXwXXdXXhXXm]")
+                try:
+                    duration = str_to_timedelta("".join(split_args[3:]))
+                except ValueError:
+                    raise InvalidInputError("Mute durations must be formatted as [XXwXXdXXhXXm]")
+                if not duration:
+                    raise InvalidInputError("Mute durations must be longer than 0 minutes")
+            elif kind == "role":
+                if len(split_args) < 4:
+                    raise InvalidInputError("Role actions need a role")
+                role = await find.role(msg.channel, " ".join(split_args[3:]), msg.author)
+                if role is None:
+                    raise InvalidInputError(fmt.format_maxlen("Could not find the role **{}**", " ".join(split_args[3:])))
+                role_id = role.id
+
+            self.copy_default_policy(guild.id)
+            operation = "REPLACE INTO warn_policy VALUES (%s, %s, %s, %s, %s);"
+            params = (guild.id, threshold, kind, int(duration.total_seconds()) if duration else None, role_id)
+            db.execute(operation, params)
+
+        elif subcommand == "remove":
+            if len(split_args) < 2:
+                raise InvalidInputError(f"Usage: {bot_prefix}warn policy remove [warns] [Optional action]")
+            threshold = self.parse_threshold(split_args[1])
+            self.copy_default_policy(guild.id)
+            if len(split_args) > 2:
+                operation = "DELETE FROM warn_policy WHERE Server = %s AND Threshold = %s AND Action = %s;"
+                params = (guild.id, threshold, split_args[2].casefold())
+            else:
+                operation = "DELETE FROM warn_policy WHERE Server = %s AND Threshold = %s;"
+                params = (guild.id, threshold)
+            db.execute(operation, params)
+
+        elif subcommand == "decay":
+            if len(split_args) < 2:
+                raise InvalidInputError(f"Usage: {bot_prefix}warn policy decay [XXwXXdXXhXXm|off]")
+            if split_args[1].casefold() == "off":
+                operation = "DELETE FROM warn_decay WHERE Server = %s;"
+                db.execute(operation, (guild.id,))
+            else:
+                try:
+                    decay = str_to_timedelta("".join(split_args[1:]))
+                except ValueError:
+                    raise InvalidInputError("Decay windows must be formatted as [XXwXXdXXhXXm]")
+                if not decay:
+                    raise InvalidInputError("Decay windows must be longer than 0 minutes")
+                operation = "REPLACE INTO warn_decay VALUES (%s, %s);"
+                db.execute(operation, (guild.id, int(decay.total_seconds())))
+
+        elif subcommand == "reset":
+            db.execute("DELETE FROM warn_policy WHERE Server = %s;", (guild.id,))
+            db.execute("DELETE FROM warn_decay WHERE Server = %s;", (guild.id,))
+
+        else:
+            raise InvalidInputError(fmt.format_maxlen("Unknown policy command **{}**", subcommand))
+
+        #recompile the policy the next time it's used
+        self._policies.pop(guild.id, None)
+        await self.send_policy(msg.channel, msg.author)
+
+
+
+
+
+    #sends an embed showing the server's warn policy
+    async def send_policy(self, channel: discord.TextChannel, author: discord.Member):
+        policy = self.get_policy(channel.guild.id)
+        await std_embed.send_info(
+            channel,
+            title = f"{channel.guild.name}'s Warn Policy",
+            description = fmt.format_maxlen("{}", policy.describe(channel.guild) or "Warns have no punishments"),
+            author = author
+        )
+
+
+
+
+
+    #returns the number of warns a policy rule applies at
+    def parse_threshold(self, s: str) -> int:
+        if not s.isdecimal() or int(s) < 1:
+            raise InvalidInputError(fmt.format_maxlen("**{}** is not a valid number of warns", s))
+        return int(s)
+
+
+
+
+
+    #stores the default policy as the server's own policy so that it can be changed
+    def copy_default_policy(self, guild_id: int):
+        operation = "SELECT 1 FROM warn_policy WHERE Server = %s LIMIT 1;"
+        if db.read_execute(operation, (guild_id,)):
+            return
+        for threshold, action in default_policy_rules:
+            operation = "INSERT INTO warn_policy VALUES (%s, %s, %s, %s, %s);"
+            duration = int(action.duration.total_seconds()) if action.duration else None
+            db.execute(operation, (guild_id, threshold, action.kind, duration, action.role_id))
+
+
+
+
+
+    #messages the warned member, notifies the channel and runs the policy's actions all at once.
+    #actions that remove the member from the server run last so that the member can still be messaged
+    async def dispatch(
+        self,
+        member: discord.Member,
+        channel: discord.TextChannel,
+        author: discord.Member,
+        warning_message: discord.Embed,
+        notice_title: str,
+        threshold: int,
+        actions: list[Warn_Action],
+    ):
+        results = await asyncio.gather(
+            member.send(embed=warning_message),
+            std_embed.send_info(channel, title = notice_title, author = author),
+            *(a.run(member, channel, author, threshold) for a in actions if a.kind not in Warn_Action.removal_kinds),
+            return_exceptions=True,
+        )
+        removals = [a for a in actions if a.kind in Warn_Action.removal_kinds]
+        if removals:
+            results += await asyncio.gather(
+                *(a.run(member, channel, author, threshold) for a in removals),
+                return_exceptions=True,
+            )
 
+        errors = [r for r in results if isinstance(r, Exception)]
+        for e in errors:
+            self.log.error(fmt.format_error(e))
+        if errors:
+            await std_embed.send_error(
+                channel,
+                title = f"{len(errors)} warn action{'s' if len(errors) != 1 else ''} failed for {member}",
+                description = fmt.format_maxlen("{}", "\n".join(str(e) for e in errors)),
+                author = author
+            )
 
 bot_commands.add_command(Warn_Command())
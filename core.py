@@ -1,19 +1,139 @@
 import discord
 import logging
 import datetime
+import json
+import os
 from pathlib import Path
+from typing import Optional
+
+from utils.log_index import Indexed_File_Handler
 
 log_dir = Path(f"data/bot/logs/")
-log_dir.mkdir(parents=True, exist_ok=True)
+# The log of this process, set by `start_log`
+log_path: Optional[Path] = None
+
+config_path = Path("data/config.json")
+
+
+def _get_config() -> dict:
+    """Returns the optional bot settings in `config_path`, or an empty
+    dictionary if there are none.
+    """
+    if not config_path.exists():
+        return {}
+    with config_path.open("r") as config_file:
+        return json.load(config_file)
+
+
+config = _get_config()
+
+# Sharding is enabled by setting "shard_count" in the config file to a number
+# of shards, or to "auto" to use the number of shards Discord recommends.
+# When the bot is launched as multiple processes with main.start_shards, the
+# launcher tells each process which shards it owns through environment
+# variables.
+shard_count: Optional[int]
+shard_ids: Optional[list[int]]
+
+if "UTILIS_SHARD_COUNT" in os.environ:
+    shard_count = int(os.environ["UTILIS_SHARD_COUNT"])
+    shard_ids = [int(s) for s in os.environ["UTILIS_SHARD_IDS"].split(",")]
+elif config.get("shard_count") is not None:
+    shard_count = (
+        None if config["shard_count"] == "auto" else int(config["shard_count"])
+    )
+    shard_ids = config.get("shard_ids")
+else:
+    shard_count = None
+    shard_ids = None
+
+
+def start_log() -> Path:
+    """Starts writing this process's log and returns its path. Only called
+    by the process running the bot, so that the sharding launcher and image
+    worker processes don't start logs of their own.
+    """
+    global log_path
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_name = str(datetime.datetime.now().replace(microsecond=0)).replace(":", ".")
+    # Processes started by main.start_shards all start in the same second, so
+    # their logs are told apart by the shards they run
+    if "UTILIS_SHARD_IDS" in os.environ and shard_ids:
+        log_name += f" shards {shard_ids[0]}-{shard_ids[-1]}"
+    log_path = log_dir / f"{log_name}.log"
+
+    # The log is indexed as it is written so that the logs command can search it
+    logging.basicConfig(
+        handlers=[Indexed_File_Handler(log_path, "w")],
+        level=logging.INFO,
+        format="%(asctime)s:%(levelname)s:%(name)s: %(message)s",
+    )
+    return log_path
+
+
+def _get_minimal_intents() -> discord.Intents:
+    """Returns the intents the loaded commands need. Presences, typing and
+    voice states are left out since no command uses them and they make up
+    most of the gateway traffic in large guilds.
+    """
+    intents = discord.Intents.none()
+    intents.guilds = True
+    # Needed to look up members with `find.member` and to keep role members
+    # up to date
+    intents.members = True
+    intents.emojis = True
+    intents.messages = True
+    # Needed for role selection, pinning, paged messages and prompts
+    intents.reactions = True
+    return intents
+
+
+# "intents" in the config file picks how much the bot receives and caches.
+# "all" receives every event and caches every member of every guild at
+# startup. "minimal" only receives the events commands need and caches
+# members as they are seen, leaving other members to be fetched on demand by
+# `find.member` and kept in a cache bounded by "member_cache_size".
+intents_profile = config.get("intents", "all")
+member_cache_size = int(config.get("member_cache_size", 1000))
+
+client_options: dict
+if intents_profile == "all":
+    client_options = {"intents": discord.Intents.all()}
+elif intents_profile == "minimal":
+    minimal_intents = _get_minimal_intents()
+    client_options = {
+        "intents": minimal_intents,
+        "member_cache_flags": discord.MemberCacheFlags.from_intents(minimal_intents),
+        "chunk_guilds_at_startup": False,
+    }
+else:
+    raise ValueError(
+        f'Unknown intents profile "{intents_profile}" in {config_path}. '
+        'Must be "all" or "minimal".'
+    )
+
+client: discord.Client
+if shard_count is not None or config.get("shard_count") == "auto":
+    client = discord.AutoShardedClient(
+        shard_count=shard_count, shard_ids=shard_ids, **client_options
+    )
+else:
+    client = discord.Client(**client_options)
+
 
-_datetime_str = str(datetime.datetime.now().replace(microsecond=0)).replace(":", ".")
-log_path = log_dir / f"{_datetime_str}.log"
+def shard_id_for(guild_id: int) -> int:
+    """Returns the id of the shard that receives events for the guild with
+    the id `guild_id`.
+    """
+    return (guild_id >> 22) % (shard_count or 1)
 
-logging.basicConfig(
-    filename=log_path,
-    filemode="w",
-    level=logging.INFO,
-    format="%(asctime)s:%(levelname)s:%(name)s: %(message)s",
-)
 
-client = discord.Client(intents=discord.Intents.all())
+def handles_guild(guild_id: int) -> bool:
+    """Returns whether or not the guild with the id `guild_id` belongs to one
+    of the shards run by this process. Background work over every guild, like
+    checking the database, should skip guilds this returns `False` for since
+    another process handles them.
+    """
+    if shard_ids is None:
+        return True
+    return shard_id_for(guild_id) in shard_ids
@@ -1,10 +1,17 @@
+import asyncio
 import json
-import mysql.connector
+import logging
+import re
+import time
+from core import config
 from pathlib import Path
+from typing import Optional
 
 
 sql_login_path = Path("data/sql_login.json")
 
+log = logging.getLogger("db")
+
 
 def _get_login_info() -> dict:
     placeholder_login_info = {
@@ -30,26 +37,667 @@ def _get_login_info() -> dict:
             raise ValueError(missing_login_info_message)
 
 
-db = mysql.connector.connect(**_get_login_info())
+# "database" in the config file picks where data is stored. "mysql" connects
+# to the MySQL server in `sql_login_path`. "sqlite" stores everything in a
+# local file at "sqlite_path" and needs no database server, which is useful
+# for small deployments and testing.
+backend = config.get("database", "mysql")
+
+if backend == "mysql":
+    import mysql.connector
+
+    Error = mysql.connector.Error
+    db = mysql.connector.connect(**_get_login_info())
+
+    # If no database was provided in the login info file, default to utilis
+    if db.database is None:
+        with db.cursor() as c:
+            c.execute("CREATE DATABASE IF NOT EXISTS utilis;")
+            c.execute("USE utilis;")
+            db.commit()
+elif backend == "sqlite":
+    import db_sqlite
+    import sqlite3
+
+    Error = sqlite3.Error
+    db = db_sqlite.Connection(Path(config.get("sqlite_path", "data/utilis.db")))
+else:
+    raise ValueError(
+        f'Unknown database "{backend}" in config. Must be "mysql" or "sqlite".'
+    )
+
+# Queries that take longer than this many seconds are logged
+slow_query_threshold = float(config.get("slow_query_threshold", 0.5))
+# Whether to explain every new query shape that filters rows and log the
+# ones that have to scan a whole table
+check_query_plans = bool(config.get("check_query_plans", False))
+
+
+class Query_Stats:
+    """Timing information for every query with the same shape. Queries have
+    the same shape if they only differ by whitespace, by how many values are
+    in their `IN (...)` lists and by how many rows they insert.
+
+    Attributes
+    ------------
+    count: int
+    How many times a query with this shape was run.
+
+    total_time: float
+    The total time in seconds spent running queries with this shape.
+
+    max_time: float
+    The longest time in seconds a query with this shape took.
+    """
+
+    count: int
+    total_time: float
+    max_time: float
+
+    def __init__(self, query: str, params: Optional[tuple] = None):
+        self.count = 0
+        self.total_time = 0
+        self.max_time = 0
+        # The last query and parameters run with this shape, kept in memory
+        # so that the query can be explained. Never logged.
+        self._last_query = query
+        self._last_params = params
+
+    def average_time(self) -> float:
+        """Returns the average time in seconds a query with this shape takes."""
+        if not self.count:
+            return 0
+        return self.total_time / self.count
+
+
+# Query shape to Query_Stats
+query_stats: dict[str, Query_Stats] = {}
+
+# Connection to query to the prepared statement cursor for the query
+_prepared_cursors: dict = {}
+
+_whitespace_pattern = re.compile(r"\s+")
+_in_list_pattern = re.compile(
+    r"IN \((?:%s|\((?:%s, )*%s\))(?:, (?:%s|\((?:%s, )*%s\)))*\)"
+)
+_values_pattern = re.compile(r"VALUES \((?:%s, )*%s\)(?:, \((?:%s, )*%s\))*")
+
+
+def get_query_shape(query: str) -> str:
+    """Returns `query` with its whitespace collapsed and its `IN (...)` and
+    multi-row `VALUES` lists shortened so that queries that only differ by
+    how many values they are given have the same shape.
+    """
+    shape = _whitespace_pattern.sub(" ", query).strip()
+    shape = _in_list_pattern.sub("IN (...)", shape)
+    return _values_pattern.sub("VALUES (...)", shape)
+
+
+def _redact(params: Optional[tuple]) -> str:
+    """Returns a description of the types of `params` that does not include
+    their values, which could be user data.
+    """
+    if params is None:
+        return "()"
+    return f"({', '.join(f'<{type(p).__name__}>' for p in params)})"
+
+
+def _record_query(query: str, params: Optional[tuple], elapsed: float) -> None:
+    shape = get_query_shape(query)
+    stats = query_stats.get(shape)
+    if stats is None:
+        stats = query_stats[shape] = Query_Stats(query, params)
+        if check_query_plans:
+            _check_query_plan(shape, query, params)
+    else:
+        stats._last_query = query
+        stats._last_params = params
+    stats.count += 1
+    stats.total_time += elapsed
+    stats.max_time = max(stats.max_time, elapsed)
+    if elapsed >= slow_query_threshold:
+        log.warning(
+            f"Slow query took {elapsed:.3f} seconds: {shape} "
+            f"with parameters {_redact(params)}"
+        )
+
+
+def get_full_scans(
+    query: str, params: Optional[tuple] = None, connection = db
+) -> list[str]:
+    """Returns the names of the tables that `query` has to read every row of
+    according to `EXPLAIN`.
+    """
+    with connection.cursor(dictionary=True) as c:
+        if backend == "sqlite":
+            c.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            # Full scans are described as "SCAN [TABLE] name" without an index
+            return [
+                row["detail"].split()[-1]
+                for row in c.fetchall()
+                if row["detail"].startswith("SCAN ") and " USING " not in row["detail"]
+            ]
+        c.execute(f"EXPLAIN {query}", params)
+        return [row["table"] for row in c.fetchall() if row["type"] == "ALL"]
+
+
+def _check_query_plan(shape: str, query: str, params: Optional[tuple]) -> None:
+    # Queries without a WHERE clause read the whole table on purpose, and
+    # only queries MySQL can explain are checked
+    if " WHERE " not in shape.upper() or not shape.upper().startswith(
+        ("SELECT", "UPDATE", "DELETE")
+    ):
+        return
+    try:
+        tables = get_full_scans(query, params)
+    except Error as e:
+        log.warning(f"Could not explain query {shape}: {e}")
+        return
+    if tables:
+        log.warning(
+            f"Query scans every row of {', '.join(tables)} instead of using an "
+            f"index: {shape}"
+        )
+
+
+def _get_prepared_cursor(connection, query: str):
+    """Returns a cursor that has `query` prepared on the server for
+    `connection`, creating it the first time `query` is run.
+    """
+    cursors = _prepared_cursors.setdefault(connection, {})
+    cursor = cursors.get(query)
+    if cursor is None:
+        cursor = cursors[query] = connection.cursor(prepared=True)
+    return cursor
+
+
+def _discard_prepared_cursor(connection, query: str) -> None:
+    cursor = _prepared_cursors.get(connection, {}).pop(query, None)
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+
+def _run(connection, query, params: Optional[tuple], multi: bool, size: int = -1):
+    """Runs `query` and returns its rows, or `None` if `size` is negative.
+    Queries with parameters reuse a prepared statement cached for
+    `connection`. Queries without parameters, and multi statement queries,
+    can not be prepared and use a new cursor.
+    """
+    start = time.perf_counter()
+    try:
+        if params is not None and not multi:
+            c = _get_prepared_cursor(connection, query)
+            try:
+                c.execute(query, params)
+                if size < 0:
+                    rows = None
+                    if c.with_rows:
+                        c.fetchall()
+                elif size > 0:
+                    rows = c.fetchmany(size=size)
+                    # Prepared cursors must read every row before being reused
+                    c.fetchall()
+                else:
+                    rows = c.fetchall()
+            except Error:
+                # The statement may no longer exist on the server, for
+                # example after reconnecting, so prepare it again next time
+                _discard_prepared_cursor(connection, query)
+                raise
+        else:
+            with connection.cursor() as c:
+                c.execute(query, params, multi)
+                if size < 0:
+                    rows = None
+                elif size > 0:
+                    rows = c.fetchmany(size=size)
+                else:
+                    rows = c.fetchall()
+    finally:
+        _record_query(query, params, time.perf_counter() - start)
+    return rows
 
-# If no database was provided in the login info file, default to utilis
-if db.database is None:
-    with db.cursor() as c:
-        c.execute("CREATE DATABASE IF NOT EXISTS utilis;")
-        c.execute("USE utilis;")
-        db.commit()
 
 #execute query and commit changes to database
 def execute(query, params: tuple = None, multi: bool = False, connection = db):
-    with connection.cursor() as c:
-        c.execute(query, params, multi)
-        connection.commit()
+    # Keep writes in order with buffered writes
+    if connection is db and write_buffer.depth():
+        write_buffer.flush()
+    _run(connection, query, params, multi)
+    connection.commit()
 
 
 #execute query and returns all or a specified amount of rows of the query result
 def read_execute(query, params: tuple = None, multi: bool = False, size: int = 0, connection = db):
+    # Make sure buffered writes are visible to the query
+    if connection is db and write_buffer.depth():
+        write_buffer.flush()
+    return _run(connection, query, params, multi, size)
+
+
+def get_top_queries(count: int = 10) -> list[tuple[str, Query_Stats]]:
+    """Returns the shapes and stats of the `count` query shapes that the most
+    total time was spent running.
+    """
+    return sorted(
+        query_stats.items(), key=lambda item: item[1].total_time, reverse=True
+    )[:count]
+
+
+def explain_top_queries(
+    count: int = 5, connection = db
+) -> list[tuple[str, list[dict]]]:
+    """Returns the shapes and `EXPLAIN` rows of the `count` query shapes that
+    the most total time was spent running. Each `EXPLAIN` row is a dictionary
+    of column names to values. Only queries that can be explained are
+    included.
+    """
+    explanations = []
+    for shape, stats in get_top_queries(len(query_stats)):
+        if len(explanations) >= count:
+            break
+        if not shape.upper().startswith(
+            ("SELECT", "INSERT", "REPLACE", "UPDATE", "DELETE")
+        ):
+            continue
+        with connection.cursor() as c:
+            explain = "EXPLAIN QUERY PLAN" if backend == "sqlite" else "EXPLAIN"
+            c.execute(f"{explain} {stats._last_query}", stats._last_params)
+            explanations.append(
+                (shape, [dict(zip(c.column_names, row)) for row in c.fetchall()])
+            )
+    return explanations
+
+
+class Write_Buffer:
+    """Collects inserts, upserts and deletes so that they can be written to
+    the database later in as few statements as possible. Consecutive writes
+    of the same kind to the same table are combined into one multi-row
+    statement, and every statement in a flush is run in a single transaction.
+    If the transaction fails, each statement is retried on its own, and each
+    row of a statement that still fails is retried on its own, so only the
+    rows that can't be written are dropped.
+    Writes are flushed in the order they were made once `max_rows` rows are
+    buffered or `max_delay` seconds after the first buffered write, whichever
+    comes first.
+
+    Reads done with `read_execute` flush the buffer first so that they always
+    see buffered writes.
+
+    Attributes
+    ------------
+    flush_count: int
+    The number of times the buffer was flushed.
+
+    total_flush_time: float
+    The total time in seconds spent flushing.
+
+    max_flush_time: float
+    The longest time in seconds a single flush took.
+
+    last_flush_time: float
+    The time in seconds the most recent flush took.
+
+    dropped_rows: int
+    The number of rows that could not be written and were dropped.
+    """
+
+    flush_count: int
+    total_flush_time: float
+    max_flush_time: float
+    last_flush_time: float
+    dropped_rows: int
+
+    def __init__(self, max_rows: int = 100, max_delay: float = 2, connection=db):
+        """Parameters
+        -----------
+        max_rows: int
+        How many rows can be buffered before the buffer is flushed.
+
+        max_delay: float
+        How long in seconds a write can be buffered before the buffer is
+        flushed.
+
+        connection
+        The database connection to write to.
+        """
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.connection = connection
+        # Each batch is a list of the statement kind, the table, the key
+        # columns for deletes, and the rows to write.
+        self._batches: list[list] = []
+        self._depth = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.flush_count = 0
+        self.total_flush_time = 0
+        self.max_flush_time = 0
+        self.last_flush_time = 0
+        self.dropped_rows = 0
+
+    def insert(self, table: str, row: tuple) -> None:
+        """Buffers inserting `row` into `table`. `row` must contain a value
+        for every column in `table`.
+        """
+        self._add("INSERT", table, None, row)
+
+    def replace(self, table: str, row: tuple) -> None:
+        """Buffers inserting `row` into `table`, replacing any row with the
+        same primary key. `row` must contain a value for every column in
+        `table`.
+        """
+        self._add("REPLACE", table, None, row)
+
+    def delete(self, table: str, columns: tuple[str, ...], key: tuple) -> None:
+        """Buffers deleting the rows of `table` whose `columns` equal `key`."""
+        if len(columns) != len(key):
+            raise ValueError("columns and key must be the same length.")
+        self._add("DELETE", table, columns, key)
+
+    def depth(self) -> int:
+        """Returns the number of buffered rows."""
+        return self._depth
+
+    def average_flush_time(self) -> float:
+        """Returns the average time in seconds a flush takes."""
+        if not self.flush_count:
+            return 0
+        return self.total_flush_time / self.flush_count
+
+    def _add(
+        self, kind: str, table: str, columns: Optional[tuple[str, ...]], row: tuple
+    ) -> None:
+        if self._batches:
+            last_kind, last_table, last_columns, rows = self._batches[-1]
+            if (
+                last_kind == kind
+                and last_table == table
+                and last_columns == columns
+                and len(rows[0]) == len(row)
+            ):
+                rows.append(row)
+            else:
+                self._batches.append([kind, table, columns, [row]])
+        else:
+            self._batches.append([kind, table, columns, [row]])
+        self._depth += 1
+
+        if self._depth >= self.max_rows:
+            self.flush()
+        elif self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # Writes made outside of the event loop, such as while
+                # loading commands, can not be flushed later.
+                self.flush()
+            else:
+                self._flush_handle = loop.call_later(self.max_delay, self._timed_flush)
+
+    def _timed_flush(self) -> None:
+        self._flush_handle = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Writes every buffered row to the database in a single transaction.
+        If writing fails, the transaction is rolled back and the rows are
+        written again in smaller transactions. Rows that still can't be
+        written are logged and dropped. Never raises, since flushes are
+        triggered by unrelated reads and writes whose callers can't handle a
+        failed buffered write.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._batches:
+            return
+
+        batches = self._batches
+        self._batches = []
+        self._depth = 0
+
+        start = time.perf_counter()
+        try:
+            try:
+                self._write(batches)
+            except Exception as e:
+                log.warning(f"Failed to flush buffered writes, retrying them separately: {e}")
+                for batch in batches:
+                    self._write_batch(batch)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.flush_count += 1
+            self.total_flush_time += elapsed
+            self.max_flush_time = max(self.max_flush_time, elapsed)
+            self.last_flush_time = elapsed
+
+    def _write(self, batches: list[list]) -> None:
+        """Runs the statements for `batches` in a single transaction, rolling
+        it back if any of them fail.
+        """
+        try:
+            with self.connection.cursor() as c:
+                for kind, table, columns, rows in batches:
+                    query, params = self._get_statement(kind, table, columns, rows)
+                    query_start = time.perf_counter()
+                    c.execute(query, params)
+                    _record_query(query, params, time.perf_counter() - query_start)
+            self.connection.commit()
+        except Exception:
+            try:
+                self.connection.rollback()
+            except Error:
+                pass
+            raise
+
+    def _write_batch(self, batch: list) -> None:
+        """Writes `batch` in its own transaction, or each of its rows in
+        their own transactions if that fails, dropping the rows that can't be
+        written.
+        """
+        kind, table, columns, rows = batch
+        try:
+            self._write([batch])
+            return
+        except Exception as e:
+            if len(rows) == 1:
+                self.dropped_rows += 1
+                log.error(f"Dropped buffered {kind} of {rows[0]} in {table}: {e}")
+                return
+        for row in rows:
+            self._write_batch([kind, table, columns, [row]])
+
+    @staticmethod
+    def _get_statement(
+        kind: str, table: str, columns: Optional[tuple[str, ...]], rows: list[tuple]
+    ) -> tuple[str, tuple]:
+        row_placeholder = f"({', '.join(['%s'] * len(rows[0]))})"
+        params = tuple(value for row in rows for value in row)
+        if kind == "DELETE":
+            if len(columns) == 1:  # type: ignore
+                query = (
+                    f"DELETE FROM {table} WHERE {columns[0]} IN "  # type: ignore
+                    f"({', '.join(['%s'] * len(rows))});"
+                )
+            else:
+                query = (
+                    f"DELETE FROM {table} WHERE ({', '.join(columns)}) IN "  # type: ignore
+                    f"({', '.join([row_placeholder] * len(rows))});"
+                )
+        else:
+            query = (
+                f"{kind} INTO {table} VALUES "
+                f"{', '.join([row_placeholder] * len(rows))};"
+            )
+        return query, params
+
+
+write_buffer = Write_Buffer()
+
+# Every schema change made to the database, in order. The database stores
+# how many of these have been applied and applies the rest when the bot
+# starts. Released migrations must never be changed, only added to.
+migrations: list[tuple[str, ...]] = [
+    # 1: The tables that used to be created by the commands using them
+    (
+        """CREATE TABLE IF NOT EXISTS mute (
+            Server bigint,
+            Member bigint,
+            UnmuteDT datetime,
+            Moderator bigint,
+            PRIMARY KEY (Server, Member)
+        );""",
+        """CREATE TABLE IF NOT EXISTS warn (
+            Server bigint,
+            Member bigint,
+            Count int,
+            DT datetime,
+            Moderator text,
+            Reason text,
+            MsgLog text,
+            PRIMARY KEY (Server, Member, Count)
+        );""",
+        """CREATE TABLE IF NOT EXISTS schedule (
+            Server BIGINT,
+            Title VARCHAR(100),
+            Datetime DATETIME NOT NULL,
+            MsgID BIGINT NOT NULL,
+            ChannelID BIGINT NOT NULL,
+            RoleID BIGINT NOT NULL,
+            AuthorID BIGINT NOT NULL,
+            PRIMARY KEY (Server, Title)
+        );""",
+        """CREATE TABLE IF NOT EXISTS role_select_messages (
+            message_id BIGINT NOT NULL,
+            channel_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            description VARCHAR(2000),
+            allow_multiple_selections BIT(1),
+            creator_id BIGINT NOT NULL,
+            created_on DATETIME NOT NULL,
+            PRIMARY KEY (message_id)
+        );""",
+        # The largest emoji I could find is 🏴󠁧󠁢󠁷󠁬󠁳󠁿, which fits in a VARCHAR(7)
+        """CREATE TABLE IF NOT EXISTS role_select_reactions (
+            message_id BIGINT NOT NULL,
+            emoji VARCHAR(7) NOT NULL,
+            role_id BIGINT NOT NULL,
+            FOREIGN KEY (message_id)
+                REFERENCES role_select_messages(message_id)
+                ON DELETE CASCADE
+        );""",
+    ),
+    # 2: Indexes for the queries commands run
+    (
+        # Every reaction on a role selection message looks up its roles
+        """CREATE INDEX role_select_reactions_message_emoji
+        ON role_select_reactions (message_id, emoji, role_id);""",
+        # Listing role selection messages by guild and channel
+        """CREATE INDEX role_select_messages_guild_channel
+        ON role_select_messages (guild_id, channel_id);""",
+        # Showing a guild's schedule by year and month
+        """CREATE INDEX schedule_server_datetime
+        ON schedule (Server, Datetime);""",
+        # Resuming reminders for upcoming events on startup
+        "CREATE INDEX schedule_datetime ON schedule (Datetime);",
+    ),
+    # 3: Per guild warn escalation policies
+    (
+        # Duration is in seconds for mutes and RoleID is the role given by
+        # role actions
+        """CREATE TABLE IF NOT EXISTS warn_policy (
+            Server BIGINT NOT NULL,
+            Threshold INT NOT NULL,
+            Action VARCHAR(10) NOT NULL,
+            Duration INT,
+            RoleID BIGINT,
+            PRIMARY KEY (Server, Threshold, Action)
+        );""",
+        # How many seconds a warn counts towards the policy for
+        """CREATE TABLE IF NOT EXISTS warn_decay (
+            Server BIGINT NOT NULL,
+            Decay INT NOT NULL,
+            PRIMARY KEY (Server)
+        );""",
+    ),
+    # 4: Per guild number of reactions that pin a message
+    (
+        """CREATE TABLE IF NOT EXISTS pin_threshold (
+            Server BIGINT NOT NULL,
+            Threshold INT NOT NULL,
+            PRIMARY KEY (Server)
+        );""",
+    ),
+]
+
+# MySQL error for creating an index with a name that is already used
+_duplicate_key_name_errno = 1061
+
+
+def migrate(connection = db) -> int:
+    """Applies every migration in `migrations` that has not been applied to
+    the database yet and returns the resulting schema version. Other
+    processes connected to the same database wait for the migrations to
+    finish.
+    """
     with connection.cursor() as c:
-        c.execute(query, params, multi)
-        if size > 0:
-            return c.fetchmany(size=size)
-        return c.fetchall()
+        # SQLite databases are only used by one process
+        if backend == "mysql":
+            c.execute("SELECT GET_LOCK('utilis_migrations', 60);")
+            if c.fetchone()[0] != 1:
+                raise TimeoutError("Timed out waiting for another process to migrate.")
+        try:
+            c.execute(
+                """CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT NOT NULL
+                );"""
+            )
+            c.execute("SELECT version FROM schema_version;")
+            row = c.fetchone()
+            if row is None:
+                version = 0
+                c.execute("INSERT INTO schema_version VALUES (0);")
+            else:
+                version = row[0]
+            connection.commit()
+
+            for new_version in range(version + 1, len(migrations) + 1):
+                log.info(f"Migrating database to version {new_version}")
+                for statement in migrations[new_version - 1]:
+                    try:
+                        c.execute(statement)
+                    except Error as e:
+                        # Schema changes can not be rolled back in MySQL, so
+                        # a migration that failed part way through may have
+                        # already created some of its indexes
+                        if getattr(e, "errno", None) != _duplicate_key_name_errno:
+                            raise
+                c.execute("UPDATE schema_version SET version = %s;", (new_version,))
+                connection.commit()
+                version = new_version
+        finally:
+            if backend == "mysql":
+                c.execute("SELECT RELEASE_LOCK('utilis_migrations');")
+                c.fetchall()
+    return version
+
+
+schema_version = migrate()
+
+
+#flush any buffered writes and close the database connection
+def close():
+    try:
+        write_buffer.flush()
+    finally:
+        for cursor in _prepared_cursors.pop(db, {}).values():
+            try:
+                cursor.close()
+            except Error:
+                pass
+        db.close()
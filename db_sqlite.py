@@ -0,0 +1,145 @@
+import re
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+
+# Queries are written for MySQL, so they are translated to SQLite's dialect
+# before they are run.
+_placeholder_pattern = re.compile(r"%s")
+_create_index_pattern = re.compile(
+    r"^\s*CREATE INDEX (?!IF NOT EXISTS)", re.IGNORECASE
+)
+
+
+def translate(query: str) -> str:
+    """Returns `query` translated from MySQL to SQLite. `%s` placeholders are
+    replaced with `?`, and `CREATE INDEX` is made to skip indexes that already
+    exist. `REPLACE INTO` works in both, and `YEAR()`, `MONTH()` and `BIT(1)`
+    columns are handled by the connection.
+    """
+    query = _placeholder_pattern.sub("?", query)
+    return _create_index_pattern.sub("CREATE INDEX IF NOT EXISTS ", query)
+
+
+def _year(value: Optional[str]) -> Optional[int]:
+    return None if value is None else int(value[:4])
+
+
+def _month(value: Optional[str]) -> Optional[int]:
+    return None if value is None else int(value[5:7])
+
+
+def _convert_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+def _convert_date(value: bytes) -> date:
+    return date.fromisoformat(value.decode())
+
+
+# Store dates the same way MySQL formats them so that YEAR(), MONTH() and
+# comparisons between them work
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("DATE", _convert_date)
+# BIT(1) columns are stored as integers, the same as MySQL returns them
+sqlite3.register_converter("BIT", int)
+
+
+class Cursor:
+    """A SQLite cursor that can be used like a MySQL connector cursor."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def with_rows(self) -> bool:
+        return self._cursor.description is not None
+
+    @property
+    def column_names(self) -> tuple[str, ...]:
+        if self._cursor.description is None:
+            return ()
+        return tuple(d[0] for d in self._cursor.description)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def execute(
+        self, query: str, params: Optional[tuple] = None, multi: bool = False
+    ):
+        if multi:
+            if params:
+                raise ValueError("Multi statement queries can not have parameters.")
+            self._cursor.executescript(translate(query))
+        else:
+            self._cursor.execute(translate(query), params or ())
+
+    def executemany(self, query: str, seq_params):
+        self._cursor.executemany(translate(query), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """A SQLite database that can be used like a MySQL connector connection.
+    The database is opened in WAL mode so that reads do not wait for writes.
+    """
+
+    def __init__(self, path: Path):
+        """Parameters
+        -----------
+        path: Path
+        The file the database is stored in. It is created if it does not
+        exist.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.database = str(path)
+        self._connection = sqlite3.connect(
+            path, detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=256
+        )
+        self._connection.create_function("YEAR", 1, _year, deterministic=True)
+        self._connection.create_function("MONTH", 1, _month, deterministic=True)
+        self._connection.execute("PRAGMA journal_mode = WAL;")
+        # Safe with WAL, only the last commits can be lost on power failure
+        self._connection.execute("PRAGMA synchronous = NORMAL;")
+        self._connection.execute("PRAGMA foreign_keys = ON;")
+
+    def cursor(self, prepared: bool = False, dictionary: bool = False) -> Cursor:
+        """Returns a new cursor. SQLite caches prepared statements itself, so
+        `prepared` is ignored.
+        """
+        cursor = self._connection.cursor()
+        if dictionary:
+            cursor.row_factory = lambda c, row: {
+                d[0]: value for d, value in zip(c.description, row)
+            }
+        return Cursor(cursor)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
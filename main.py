@@ -4,203 +4,25 @@ abspath = os.path.abspath(__file__)
 dname = os.path.dirname(abspath)
 os.chdir(dname)
 
-
 import discord
+import argparse
 import asyncio
-import logging
+import subprocess
+import sys
 from pathlib import Path
+from typing import Optional
 
-from core import client
-from db import db
-from bot_cmd import bot_commands
-from utils import fmt, std_embed
-
+# Commands import the prefix from here. Everything else the bot runs is in
+# `bot`, which is only imported by the process running the bot so that the
+# sharding launcher and image worker processes, which import this file too,
+# don't open logs, connect to the database or load commands.
 bot_prefix = "!"
 
-log = logging.getLogger("main")
-
-
-def starts_with_mention(content: str) -> bool:
-    """Returns whether or not the bot was mentioned at the start of the
-    message.
-    """
-    return content.startswith(client.user.mention) or content.startswith(
-        f"<@!{client.user.id}>"
-    )
-
-
-def remove_prefix(content: str) -> str:
-    """Removes the bot prefix or bot's mention string from the start of a
-    string.
-    """
-    if content.startswith(bot_prefix):
-        return content[len(bot_prefix) :].strip()
-    elif starts_with_mention(content):
-        return content[content.index(">") + 1 :].strip()
-    else:
-        raise ValueError(f"String '{content}' does not start with the bot's prefix.")
-
-
-def get_command_name(content: str) -> str:
-    """Returns the command name from a message's text.
-    Assumes that the bot prefix has been removed.
-    """
-    if " " in content:
-        return content.split(" ")[0].casefold()
-    else:
-        return content.casefold()
-
 
-def get_args(content: str, cmd_name: str) -> str:
-    """Returns the command arguments from a message's text.
-    Assumes that the bot prefix has been removed.
-    """
-    return content.strip()[len(cmd_name) :].strip()
-
-
-async def assign_roles(msg: discord.Message):
-    """Adds or removes specified roles from the message author.
-    Multiple roles can be added/removed in one message if they are separated by commas.
-
-    Parameters
-    -----------
-    msg: discord.Message
-    The message containing the roles the author wants to assign or remove from themself.
-    Roles are separated by commas.
-    Role names are preceded by a `+` or `-` to specify whether they should be
-    added or removed.
+def _get_token() -> Optional[str]:
+    """Returns the bot token from the token file, or prints an error and
+    returns `None` if it is missing.
     """
-
-    if not isinstance(msg.author, discord.Member):
-        raise TypeError("msg.author must be a member.")
-
-    # split the message into a list of individual roles
-    arr = msg.content.split(", ")
-    for role in arr:
-        # get role name
-        name = role.strip()[1:]
-
-        # determine whether the role should be assigned or removed
-        if role.startswith("+"):
-            try:
-                r = discord.utils.get(msg.author.guild.roles, name=name)
-                if r is not None:
-                    await msg.author.add_roles(r)
-                    return
-            except (discord.HTTPException, discord.Forbidden):
-                pass
-            print(f"no role called {role[1:]}")
-        elif role.startswith("-"):
-            try:
-                r = discord.utils.get(msg.author.guild.roles, name=name)
-                if r is not None:
-                    await msg.author.remove_roles(r)
-                    return
-            except (discord.HTTPException, discord.Forbidden):
-                pass
-            print(f"{msg.author} doesn't have the role {role[1:]}")
-
-
-@client.event
-async def on_connect():
-    print("------------\n Connected ")
-
-
-@client.event
-async def on_ready():
-    print("   Ready   \n------------\n")
-    # Runs the on_ready co-routine for every command.
-    await asyncio.gather(*(c.on_ready() for c in bot_commands.get_all_commands()))
-
-
-@client.event
-async def on_message(msg: discord.Message):
-    # Check to see if the message is not from a bot
-    if not msg.author.bot and msg.author != client.user:
-        # Check to see if the message is trying to run a command
-        if msg.content.startswith(bot_prefix) or starts_with_mention(msg.content):
-            # Get the command the member is trying to run
-            clean_content = remove_prefix(msg.content)
-            cmd_name = get_command_name(clean_content)
-
-            if not cmd_name:
-                # If the use did not specify a command, call the help command
-                # to show a list of all commands.
-                help_command = bot_commands.get_command("help", msg.guild)
-                if help_command is not None:
-                    await bot_commands.call(help_command, msg, "")
-                else:
-                    # If there is no help command, send an error message instead
-                    await std_embed.send_error(
-                        msg.channel,
-                        title="Error finding command",
-                        description="No command specified",
-                        author=msg.author,
-                    )
-            else:
-                command = bot_commands.get_command(cmd_name, msg.guild)
-                if command is not None:
-                    if await bot_commands.can_run(command, msg.channel, msg.author):
-                        # If the command exists and the member can run it, run the
-                        # command
-                        args = get_args(clean_content, cmd_name)
-                        await bot_commands.call(command, msg, args)
-                    else:
-                        # If the command exists but the member can not run it, send
-                        # an error message
-                        command.log.info(
-                            fmt.get_user_log(
-                                f'tried to call command "{command}" with message: {fmt.escape_newlines(msg.content)}',
-                                msg.author,
-                                msg.channel,
-                                msg.guild,
-                            )
-                        )
-                        await std_embed.send_error(
-                            msg.channel,
-                            title=fmt.format_maxlen(
-                                "Error executing {}", cmd_name.upper()
-                            ),
-                            description=fmt.format_maxlen(
-                                "You do not have permission to run `{}` here", cmd_name
-                            ),
-                            author=msg.author,
-                        )
-                else:
-                    # If the command does not exist, send an error message
-                    log.info(
-                        fmt.get_user_log(
-                            f'tried to call command "{cmd_name}" with message: {fmt.escape_newlines(msg.content)}',
-                            msg.author,
-                            msg.channel,
-                            msg.guild,
-                        )
-                    )
-                    await std_embed.send_error(
-                        msg.channel,
-                        title=fmt.format_maxlen("Error finding {}", cmd_name.upper()),
-                        description=fmt.format_maxlen(
-                            "Could not find command `{}`", cmd_name
-                        ),
-                        author=msg.author,
-                    )
-
-
-# allows members to pin messages on their own by reaching a reaction goal
-_pin = "📌"
-@client.event
-async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
-    if payload.emoji.name == _pin:
-        channel = client.get_channel(payload.channel_id)
-        if channel is not None:
-            message = await channel.fetch_message(payload.message_id)
-            if not message.pinned:
-                pin_reactions = discord.utils.get(message.reactions, emoji=_pin)
-                if pin_reactions is not None and pin_reactions.count >= 3:
-                    await message.pin()
-
-
-def start_bot() -> None:
     token_path = Path("data/token.txt")
     placeholder_token = "Bot token goes here"
     missing_token_message = (
@@ -212,17 +34,104 @@ def start_bot() -> None:
         with token_path.open("w") as token_file:
             token_file.write(placeholder_token)
         print(missing_token_message)
-        return
+        return None
 
     with token_path.open("r") as token_file:
         token = token_file.read()
         if token != placeholder_token:
-            client.run(token)
+            return token
         else:
             print(missing_token_message)
+            return None
+
+async def _get_recommended_shard_count(token: str) -> int:
+    http = discord.http.HTTPClient()
+    try:
+        await http.static_login(token.strip(), bot=True)
+        shards, _ = await http.get_bot_gateway()
+        return shards
+    finally:
+        await http.close()
+
+
+def start_shards(processes: int, total_shards: Optional[int] = None) -> None:
+    """Runs the bot as `processes` processes that each connect to a range of
+    the bot's shards. Every process loads all commands, but only receives
+    events for and runs background work for the guilds in its own shards.
+
+    Parameters
+    -----------
+    processes: int
+    The number of processes to start.
+
+    total_shards: Optional[int]
+    The total number of shards to split between the processes. If `None`,
+    the "shard_count" from the config file is used if it is a number,
+    otherwise the number of shards Discord recommends is used.
+    """
+    # Only reads the config, so it doesn't start a log for the launcher
+    from core import config
 
+    token = _get_token()
+    if token is None:
+        return
+
+    if total_shards is None:
+        if isinstance(config.get("shard_count"), int):
+            total_shards = config["shard_count"]
+        else:
+            total_shards = asyncio.run(_get_recommended_shard_count(token))
+    # Every process must own at least one shard
+    total_shards = max(total_shards, processes)
+
+    children = []
+    for i in range(processes):
+        # Split the shards into contiguous ranges, giving the last processes
+        # an extra shard if they can not be split evenly.
+        start = i * total_shards // processes
+        end = (i + 1) * total_shards // processes
+        env = os.environ.copy()
+        env["UTILIS_SHARD_COUNT"] = str(total_shards)
+        env["UTILIS_SHARD_IDS"] = ",".join(str(s) for s in range(start, end))
+        print(f"Starting shards {start}-{end - 1} of {total_shards}.")
+        children.append(subprocess.Popen([sys.executable, abspath], env=env))
+
+    try:
+        for child in children:
+            child.wait()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait()
 
 if "__main__" == __name__:
-    start_bot()
-    print("------------\nDisconnected\n------------")
-    db.close()
+    arg_parser = argparse.ArgumentParser(description="Runs Utilis.")
+    arg_parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Run the bot's shards split between this many processes.",
+    )
+    arg_parser.add_argument(
+        "--shards",
+        type=int,
+        default=None,
+        help="The total number of shards to use with --processes.",
+    )
+    launch_args = arg_parser.parse_args()
+
+    if launch_args.processes is not None:
+        start_shards(launch_args.processes, launch_args.shards)
+    else:
+        token = _get_token()
+        if token is not None:
+            import core
+
+            core.start_log()
+            import bot
+            import db
+
+            bot.start_bot(token)
+            print("------------\nDisconnected\n------------")
+            db.close()
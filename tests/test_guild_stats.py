@@ -0,0 +1,90 @@
+import importlib.util
+import unittest
+from types import SimpleNamespace
+
+has_discord = importlib.util.find_spec("discord") is not None
+
+if has_discord:
+    import discord
+    from utils import guild_stats
+
+
+class _Role:
+    def __init__(self, role_id: int, guild_id: int):
+        self.id = role_id
+        self.guild_id = guild_id
+
+    def is_default(self) -> bool:
+        return self.id == self.guild_id
+
+
+def _get_member(member_id: int, guild, roles: list, bot: bool = False):
+    return SimpleNamespace(id=member_id, guild=guild, roles=roles, bot=bot)
+
+
+@unittest.skipUnless(has_discord, "guild stats require discord.py")
+class Guild_Stats_Test(unittest.TestCase):
+    def setUp(self):
+        self.guild = SimpleNamespace(
+            id=1,
+            chunked=False,
+            members=[],
+            channels=[SimpleNamespace(type=discord.ChannelType.text)],
+        )
+        self.default_role = _Role(1, 1)
+        self.role = _Role(2, 1)
+        self.guild.roles = [self.default_role, self.role]
+        self.guild.members = [
+            _get_member(10, self.guild, [self.default_role, self.role]),
+            _get_member(11, self.guild, [self.default_role], bot=True),
+        ]
+        guild_stats.remove_guild(self.guild.id)
+        self.stats = guild_stats.get_stats(self.guild)
+
+    def tearDown(self):
+        guild_stats.remove_guild(self.guild.id)
+
+    def test_counts_cached_members(self):
+        self.assertEqual(self.stats.humans, 1)
+        self.assertEqual(self.stats.bots, 1)
+        self.assertEqual(self.stats.get_role_count(self.role), 1)
+        self.assertEqual(self.stats.get_role_count(self.default_role), 2)
+
+    def test_removing_an_uncounted_member_is_ignored(self):
+        # discord.py caches members from GUILD_MEMBER_UPDATE without
+        # dispatching on_member_update when the guild isn't chunked
+        uncounted = _get_member(12, self.guild, [self.default_role, self.role])
+        guild_stats.member_remove(uncounted)
+        self.assertEqual(self.stats.humans, 1)
+        self.assertEqual(self.stats.get_role_count(self.role), 1)
+
+    def test_updating_an_uncounted_member_counts_them(self):
+        before = _get_member(12, self.guild, [self.default_role])
+        after = _get_member(12, self.guild, [self.default_role, self.role])
+        guild_stats.member_update(before, after)
+        self.assertEqual(self.stats.humans, 2)
+        self.assertEqual(self.stats.get_role_count(self.role), 2)
+
+        guild_stats.member_remove(after)
+        self.assertEqual(self.stats.humans, 1)
+        self.assertEqual(self.stats.get_role_count(self.role), 1)
+
+    def test_members_are_only_counted_once(self):
+        member = self.guild.members[0]
+        guild_stats.member_join(member)
+        guild_stats.member_remove(member)
+        guild_stats.member_remove(member)
+        self.assertEqual(self.stats.humans, 0)
+        self.assertEqual(self.stats.bots, 1)
+        self.assertEqual(self.stats.get_role_count(self.role), 0)
+
+    def test_role_changes_of_counted_members(self):
+        before = self.guild.members[0]
+        after = _get_member(before.id, self.guild, [self.default_role])
+        guild_stats.member_update(before, after)
+        self.assertEqual(self.stats.get_role_count(self.role), 0)
+        self.assertEqual(self.stats.member_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
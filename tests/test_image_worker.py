@@ -0,0 +1,46 @@
+import io
+import unittest
+
+from utils import image_worker
+
+if image_worker.has_pillow:
+    from PIL import Image
+
+
+def _get_image(width: int, height: int, color: tuple, image_format: str = "png") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGBA", (width, height), color).save(output, format=image_format)
+    return output.getvalue()
+
+
+@unittest.skipUnless(image_worker.has_pillow, "combining images requires Pillow")
+class Combine_Test(unittest.TestCase):
+    def test_images_are_resized_and_placed_side_by_side(self):
+        images = [
+            _get_image(10, 10, (255, 0, 0, 255)),
+            _get_image(40, 20, (0, 0, 255, 255)),
+        ]
+        combined = image_worker.combine(images, 30, "png")
+        with Image.open(io.BytesIO(combined)) as result:
+            self.assertEqual(result.format, "PNG")
+            # 10x10 becomes 30x30 and 40x20 becomes 60x30
+            self.assertEqual(result.size, (90, 30))
+            self.assertEqual(result.getpixel((15, 15)), (255, 0, 0, 255))
+            self.assertEqual(result.getpixel((60, 15)), (0, 0, 255, 255))
+
+    def test_jpg_has_a_white_background(self):
+        combined = image_worker.combine([_get_image(8, 8, (0, 0, 0, 0))], 8, "jpg")
+        with Image.open(io.BytesIO(combined)) as result:
+            self.assertEqual(result.format, "JPEG")
+            self.assertEqual(result.mode, "RGB")
+            self.assertTrue(all(c > 245 for c in result.getpixel((4, 4))))
+
+    def test_webp(self):
+        combined = image_worker.combine([_get_image(4, 8, (0, 255, 0, 255))], 16, "webp")
+        with Image.open(io.BytesIO(combined)) as result:
+            self.assertEqual(result.format, "WEBP")
+            self.assertEqual(result.size, (8, 16))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+
+from utils import log_index
+
+_user_id = 123456789012345678
+
+# Records with characters that take more than one byte and records that
+# span more than one line, which are where byte offsets and text positions
+# differ
+_records = [
+    ("commands.warn", logging.WARNING, f"Warned Zoë [{_user_id}] for spam"),
+    ("bot", logging.INFO, "Ready\nshards: 0-3\nguilds: 12"),
+    ("commands.echo", logging.INFO, f"[{_user_id}] said 日本語のテキスト 🎉🎉"),
+    ("commands.echo", logging.ERROR, "Traceback:\n  ünïcödé line\n  ValueError: ❌"),
+    ("db", logging.INFO, "written on windows\r\nnot translated"),
+]
+
+# The log format set in `core`
+_formatter = logging.Formatter("%(asctime)s:%(levelname)s:%(name)s: %(message)s")
+
+
+class Log_Index_Test(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_dir = Path(self.temp_dir.name)
+        self.log_path = self.log_dir / "2026-10-19 06.00.00.log"
+        self.handler = log_index.Indexed_File_Handler(self.log_path, "w")
+        self.handler.setFormatter(_formatter)
+        self.expected = []
+        for name, level, message in _records:
+            record = logging.LogRecord(name, level, __file__, 0, message, None, None)
+            self.handler.handle(record)
+            self.expected.append(self.handler.format(record) + "\n")
+        # The newest records are found first
+        self.expected.reverse()
+
+    def tearDown(self):
+        self.handler.close()
+        log_index._cache.clear()
+        self.temp_dir.cleanup()
+
+    def _search(self, query: log_index.Log_Query) -> list[str]:
+        return [text for _, text in log_index.search(query, self.log_dir)]
+
+    def test_written_index_matches_records(self):
+        self.assertEqual(self._search(log_index.Log_Query()), self.expected)
+
+    def test_rescanned_index_matches_written_index(self):
+        query = log_index.Log_Query()
+        written = list(log_index.search(query, self.log_dir))
+        self.handler.close()
+        log_index.get_index_path(self.log_path).unlink()
+
+        rescanned = list(log_index.search(query, self.log_dir))
+        self.assertEqual([text for _, text in rescanned], self.expected)
+        self.assertEqual(
+            [(e.offset, e.length) for e, _ in rescanned],
+            [(e.offset, e.length) for e, _ in written],
+        )
+        self.assertEqual(
+            [(e.level, e.command, e.ids) for e, _ in rescanned],
+            [(e.level, e.command, e.ids) for e, _ in written],
+        )
+        # The rescanned index was saved
+        self.assertTrue(log_index.get_index_path(self.log_path).exists())
+
+    def test_appending_continues_offsets(self):
+        self.handler.close()
+        self.handler = log_index.Indexed_File_Handler(self.log_path, "a")
+        self.handler.setFormatter(_formatter)
+        record = logging.LogRecord("bot", logging.INFO, __file__, 0, "añadido", None, None)
+        self.handler.handle(record)
+        expected = [self.handler.format(record) + "\n"] + self.expected
+        self.assertEqual(self._search(log_index.Log_Query()), expected)
+
+    def test_filters(self):
+        query = log_index.Log_Query()
+        query.ids = [_user_id]
+        query.command = "echo"
+        self.assertEqual(self._search(query), [self.expected[2]])
+
+        query = log_index.Log_Query()
+        query.level = logging.ERROR
+        query.text = "ÜNÏCÖDÉ"
+        self.assertEqual(self._search(query), [self.expected[1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
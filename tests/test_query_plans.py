@@ -0,0 +1,78 @@
+import ast
+import importlib
+import importlib.util
+import re
+import sys
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+
+has_discord = importlib.util.find_spec("discord") is not None
+
+commands_dir = Path(__file__).parent.parent / "commands"
+
+# Queries that read every row on purpose, like resuming all mutes on startup,
+# have no WHERE clause and are not checked
+_query_pattern = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b.*\bWHERE\b", re.IGNORECASE | re.DOTALL)
+
+
+def get_command_queries() -> list[tuple[str, str]]:
+    """Returns every query written in the commands that filters rows, with
+    the name of the file it is written in.
+    """
+    queries = []
+    for path in sorted(commands_dir.glob("*.py")):
+        # Some commands have invalid escape sequences in strings that aren't queries
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if (
+                isinstance(node, ast.Constant)
+                and isinstance(node.value, str)
+                and _query_pattern.match(node.value)
+            ):
+                queries.append((path.name, node.value))
+    return queries
+
+
+@unittest.skipUnless(has_discord, "the database module requires discord.py")
+class Query_Plan_Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        if "db" in sys.modules:
+            raise unittest.SkipTest("the database was already opened")
+        import core
+
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.old_config = dict(core.config)
+        core.config["database"] = "sqlite"
+        core.config["sqlite_path"] = str(Path(cls.temp_dir.name) / "utilis.db")
+        # Importing db runs every migration
+        cls.db = importlib.import_module("db")
+
+    @classmethod
+    def tearDownClass(cls):
+        import core
+
+        cls.db.close()
+        del sys.modules["db"]
+        core.config.clear()
+        core.config.update(cls.old_config)
+        cls.temp_dir.cleanup()
+
+    def test_migrations_are_applied(self):
+        self.assertEqual(self.db.schema_version, len(self.db.migrations))
+
+    def test_command_queries_use_indexes(self):
+        queries = get_command_queries()
+        self.assertTrue(queries)
+        for file_name, query in queries:
+            with self.subTest(file=file_name, query=" ".join(query.split())):
+                params = (0,) * query.count("%s")
+                self.assertEqual(self.db.get_full_scans(query, params), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import random
+import re
+import time
+import unittest
+
+from utils import parse
+
+# The regex based splitter that `parse.split_args` replaced, kept to check
+# that the tokenizer splits arguments the same way
+_re_arg_splitter = re.compile(
+    r'\s*(?:(?:\"(?P<quoted_text>(?:(?:(?:\\\\)*)|(?:\\\")|(?:[^"]))*)\")|(?:(?P<text>[^\s,，]+)))(?P<tail>$|(?:\s*[,，]\s*)|(?:\s+))'
+)
+_re_remove_escaped_quote = re.compile(r'((?:[^\\]|^)(?:\\\\)*)\\"')
+
+
+def reference_split_args(args: str, treat_comma_as_space: bool = False) -> list[str]:
+    comma_separated = False
+    matches = []
+    for m in _re_arg_splitter.finditer(args):
+        matches.append(m)
+        comma_separated = comma_separated or (
+            not treat_comma_as_space
+            and m.group("tail") != ""
+            and not m.group("tail").isspace()
+        )
+
+    if not comma_separated:
+        ret = [
+            m.group("text") if m.group("text") is not None else m.group("quoted_text")
+            for m in matches
+        ]
+    else:
+        ret = []
+        combine: list[re.Match] = []
+        for match in matches:
+            if match.group("tail") and not match.group("tail").isspace():
+                if match.group("text"):
+                    ret.append(
+                        "".join(m.group(0) for m in combine) + match.group("text")
+                    )
+                elif not combine:
+                    ret.append(match.group("quoted_text"))
+                else:
+                    ret.append(
+                        "".join(m.group(0) for m in combine)
+                        + match.group("quoted_text")
+                    )
+                combine = []
+            else:
+                combine.append(match)
+        if combine:
+            if len(combine) == 1 and combine[0].group("quoted_text") is not None:
+                last_arg = combine[0].group("quoted_text")
+            else:
+                last_arg = "".join(m.group(0) for m in combine[:-1])
+                last_match = combine[-1]
+                last_arg += (
+                    last_match.group("text")
+                    if last_match.group("text") is not None
+                    else last_match.group("quoted_text")
+                )
+            ret.append(last_arg)
+
+    return [_re_remove_escaped_quote.sub(r'\1"', s).replace("\\\\", "\\") for s in ret]
+
+
+# Quotes, backslashes and separators are repeated so that random strings
+# are mostly made of the characters the splitter treats specially
+_alphabet = 'ab"""\\\\\\   ,,，\n\t'
+
+
+class Split_Args_Test(unittest.TestCase):
+    def test_docstring_examples(self):
+        self.assertEqual(parse.split_args("A B C D"), ["A", "B", "C", "D"])
+        self.assertEqual(parse.split_args("A B, C D", False), ["A B", "C D"])
+        self.assertEqual(parse.split_args("A B, C D", True), ["A", "B", "C", "D"])
+        self.assertEqual(parse.split_args('A "B C" D', False), ["A", "B C", "D"])
+        self.assertEqual(parse.split_args('A "B\\"C" D', False), ["A", 'B"C', "D"])
+
+    def test_same_as_regex_splitter(self):
+        rand = random.Random(0)
+        for _ in range(20000):
+            args = "".join(rand.choices(_alphabet, k=rand.randint(0, 16)))
+            for treat_comma_as_space in (False, True):
+                self.assertEqual(
+                    parse.split_args(args, treat_comma_as_space),
+                    reference_split_args(args, treat_comma_as_space),
+                    f"split_args({args!r}, {treat_comma_as_space})",
+                )
+
+    def test_linear_time(self):
+        # Long runs of quotes and backslashes that the tokenizer has to search
+        # for closing quotes in. The regex splitter backtracked exponentially
+        # on the first one.
+        adversarial = [
+            lambda n: '"' + "\\" * n,
+            lambda n: '"' + '\\"' * n,
+            lambda n: '"a\\" ' * n,
+            lambda n: '"\\\\" ' * n,
+            lambda n: "\\" * n + '"',
+            lambda n: '" ,' * n,
+        ]
+        for make_args in adversarial:
+            with self.subTest(args=make_args(2)):
+                small = self._time_split(make_args(2000))
+                large = self._time_split(make_args(16000))
+                # 8 times as much input takes about 8 times as long, where a
+                # quadratic splitter would take 64 times as long
+                self.assertLess(large, small * 24)
+
+    @staticmethod
+    def _time_split(args: str) -> float:
+        times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            parse.split_args(args)
+            parse.split_args(args, True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+
+if __name__ == "__main__":
+    unittest.main()
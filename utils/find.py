@@ -1,8 +1,11 @@
 import discord
 import asyncio
 import re
+import time
+from collections import OrderedDict
 from typing import Optional, Union
 
+from core import member_cache_size
 from . import get
 
 
@@ -11,6 +14,78 @@ re_user_mention = re.compile(r"<@!?(\d{18})>")
 re_role_mention = re.compile(r"<@&(\d{18})>")
 re_username_and_discriminator = re.compile(r"(.+)#(\d{4})")
 
+# Members fetched on demand from guilds whose members are not all cached,
+# mapped from (guild id, member id) to when they were fetched and the member.
+# Fetched members are kept here instead of in the guild's member cache so
+# that they stay bounded by `member_cache_size` and expire once they may be
+# out of date.
+_fetched_members: OrderedDict[
+    tuple[int, int], tuple[float, discord.Member]
+] = OrderedDict()
+_fetched_member_ttl = 300
+
+
+def _cache_member(member: discord.Member) -> None:
+    key = (member.guild.id, member.id)
+    _fetched_members[key] = (time.monotonic(), member)
+    _fetched_members.move_to_end(key)
+    while len(_fetched_members) > member_cache_size:
+        _fetched_members.popitem(last=False)
+
+
+def _get_cached_member(
+    guild: discord.Guild, member_id: int
+) -> Optional[discord.Member]:
+    member = guild.get_member(member_id)
+    if member is not None:
+        return member
+    key = (guild.id, member_id)
+    if key in _fetched_members:
+        fetched_at, member = _fetched_members[key]
+        if time.monotonic() - fetched_at < _fetched_member_ttl:
+            _fetched_members.move_to_end(key)
+            return member
+        del _fetched_members[key]
+    return None
+
+
+async def member_by_id(
+    guild: discord.Guild, member_id: int
+) -> Optional[discord.Member]:
+    """Gets a member from the cache, or fetches them from Discord if the
+    guild's members are not all cached.
+    """
+    member = _get_cached_member(guild, member_id)
+    if member is None and not guild.chunked:
+        try:
+            member = await guild.fetch_member(member_id)
+        except discord.HTTPException:
+            return None
+        _cache_member(member)
+    return member
+
+
+async def _get_members_named(guild: discord.Guild, name: str) -> list[discord.Member]:
+    """Returns the members that could be named `name`. If the guild's members
+    are all cached, this is every member. Otherwise, members whose name starts
+    with `name` are requested from Discord.
+    """
+    if guild.chunked:
+        return guild.members
+    members = await guild.query_members(query=name, limit=100, cache=False)
+    for member in members:
+        _cache_member(member)
+    return members
+
+
+async def all_members(guild: discord.Guild) -> list[discord.Member]:
+    """Returns every member of `guild`, requesting them from Discord if they
+    are not all cached. Requested members are not added to the cache.
+    """
+    if guild.chunked:
+        return guild.members
+    return await guild.chunk(cache=False)
+
 
 # TODO: Split into member and all_members
 async def member(
@@ -61,14 +136,14 @@ async def member(
     """
     # Try to parse `m` as a user id
     if m.isdigit():
-        out = channel.guild.get_member(int(m))
+        out = await member_by_id(channel.guild, int(m))
         if out is not None:
             return out
 
     # Try to parse `m` as a member mention
     user_ping = re_user_mention.fullmatch(m)
     if user_ping:
-        out = channel.guild.get_member(int(user_ping.group(1)))
+        out = await member_by_id(channel.guild, int(user_ping.group(1)))
         if out is not None:
             return out
 
@@ -78,7 +153,9 @@ async def member(
         out = channel.guild.get_member_named(m)
         if out is not None:
             return out
-        for member in channel.guild.members:
+        for member in await _get_members_named(
+            channel.guild, username_discriminator.group(1)
+        ):
             if member.name.casefold() == username_discriminator.group(
                 1
             ).casefold() and member.discriminator == username_discriminator.group(2):
@@ -87,7 +164,7 @@ async def member(
     # Try to find members with the username or nickname `m` (case insensitive)
     m_lower = m.casefold()
     members = []
-    for member in channel.guild.members:
+    for member in await _get_members_named(channel.guild, m):
         if member.name.casefold() == m_lower:
             members.append(member)
         elif member.nick:
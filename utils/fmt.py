@@ -1,4 +1,5 @@
 import discord
+import functools
 import re
 import string
 import traceback
@@ -103,12 +104,90 @@ def format_maxlen(
     kwargs to insert into replacement fields. There can not be any kwargs
     unused by `format_string`.
     """
+    return _get_formatter(max_total_len, max_field_len, add_ellipsis).format(
+        format_string, *args, **kwargs
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_formatter(
+    max_total_len: Optional[int], max_field_len: Optional[int], add_ellipsis: bool
+) -> "Maxlen_Formatter":
+    # Formatters keep no state between calls, so one is shared for every
+    # combination of options
     return Maxlen_Formatter(
         max_total_len=max_total_len,
         max_field_len=max_field_len,
         add_ellipsis=add_ellipsis,
         allow_unused_args=False,
-    ).format(format_string, *args, **kwargs)
+    )
+
+
+class _Template:
+    """A format string parsed once by `_compile_template`.
+
+    Attributes
+    ------------
+    parsed: tuple[tuple[str, Optional[str], Optional[str], Optional[str]], ...]
+    The format string split by `string.Formatter.parse`.
+
+    simple: bool
+    Whether or not the format string can be formatted with `str.format`. This
+    is `False` if any format spec has replacement fields in it, or if
+    automatic and manual field numbering are mixed.
+
+    auto_fields: int
+    How many fields use automatic numbering.
+
+    indexes: frozenset[int]
+    The positional args used by manually numbered fields.
+
+    names: frozenset[str]
+    The kwargs used by fields.
+    """
+
+    __slots__ = ("parsed", "simple", "auto_fields", "indexes", "names")
+
+    def __init__(self, format_string: str):
+        self.parsed = tuple(string.Formatter().parse(format_string))
+        self.simple = True
+        self.auto_fields = 0
+        indexes = set()
+        names = set()
+        for _, field_name, format_spec, _ in self.parsed:
+            if field_name is None:
+                continue
+            if format_spec and "{" in format_spec:
+                self.simple = False
+            # Only the part before any attribute or index lookup names an arg
+            arg_name = _re_arg_name.match(field_name).group(0)
+            if arg_name == "":
+                self.auto_fields += 1
+            elif arg_name.isdigit():
+                indexes.add(int(arg_name))
+            else:
+                names.add(arg_name)
+        if self.auto_fields and indexes:
+            self.simple = False
+        self.indexes = frozenset(indexes)
+        self.names = frozenset(names)
+
+    def uses_all(self, args: Sequence[Any], kwargs: Mapping[str, Any]) -> bool:
+        """Returns whether or not every arg and kwarg is used by a field."""
+        if self.auto_fields:
+            if len(args) > self.auto_fields:
+                return False
+        elif any(i not in self.indexes for i in range(len(args))):
+            return False
+        return all(key in self.names for key in kwargs)
+
+
+_re_arg_name = re.compile(r"[^.\[]*")
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_template(format_string: str) -> _Template:
+    return _Template(format_string)
 
 
 class Maxlen_Formatter(string.Formatter):
@@ -149,6 +228,18 @@ class Maxlen_Formatter(string.Formatter):
     def vformat(
         self, format_string: str, args: Sequence[Any], kwargs: Mapping[str, Any]
     ) -> str:
+        template = _compile_template(format_string)
+        # Most strings already fit, so try formatting them normally before
+        # measuring and shortening every field
+        if (
+            template.simple
+            and self.max_field_len is None
+            and (self.allow_unused_args or template.uses_all(args, kwargs))
+        ):
+            result = format_string.format(*args, **kwargs)
+            if self.max_total_len is None or len(result) <= self.max_total_len:
+                return result
+
         used_args: set[str] = set()
         result, _ = self._vformat(format_string, args, kwargs, used_args, 2)
         self.check_unused_args(list(used_args), args, kwargs)
@@ -170,11 +261,15 @@ class Maxlen_Formatter(string.Formatter):
         literals = []
         formatted_fields = []
         ends_with_field = False
-        for literal_text, field_name, format_spec, conversion in self.parse(
+        for literal_text, field_name, format_spec, conversion in _compile_template(
             format_string
-        ):
-            # output the literal text
-            literals.append(literal_text)
+        ).parsed:
+            # output the literal text. Escaped braces split the literal text
+            # into chunks without a field, so join them back together.
+            if literals and not ends_with_field:
+                literals[-1] += literal_text
+            else:
+                literals.append(literal_text)
             # store whether or not the parser returned a field
             ends_with_field = field_name is not None
 
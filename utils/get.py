@@ -1,11 +1,10 @@
 import discord
 import asyncio
+import logging
 from typing import (
     Any,
     Callable,
     Generic,
-    Iterable,
-    Iterator,
     Mapping,
     Optional,
     Sequence,
@@ -14,8 +13,10 @@ from typing import (
 )
 
 from core import client
-from .paged_message import Paged_Message
-from . import errors, std_embed
+from .paged_message import get_paged_footer, Paged_Message
+from . import errors, fmt, std_embed
+
+log = logging.getLogger("get")
 
 
 _T = TypeVar("_T")
@@ -191,20 +192,64 @@ async def confirmation(
                 raise errors.UserTimeoutError()
 
 
+# Channel id to the selection messages in the channel whose options can be
+# searched by sending a message
+_searchable: dict[int, list["User_Selection_Message"]] = {}
+
+
 class User_Selection_Message(Paged_Message, Generic[_T]):
     """Represents an message that can be used to prompt a user `responder` to
     select options from a list.
+
+    Options are shown `options_per_page` at a time. The same reactions are
+    used to choose options on every page, unless emojis were given for the
+    options, in which case the reactions are changed to the emojis of the
+    options on the current page. If there are more options than
+    fit on one page, `responder` can send a message to only show the options
+    that contain its text.
     """
 
     default_selection_reactions: tuple[str, ...] = ("1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟", "🇦", "🇧", "🇨", "🇩", "🇪", "🇫", "🇬", "🇭", "🇮", "🇯", "🇰", "🇱", "🇲", "🇳", "🇴", "🇵", "🇶", "🇷", "🇸", "🇹", "🇺", "🇻", "🇼", "🇽", "🇾", "🇿")  # fmt: skip
 
+    # How many options are shown on each page. Also how many reactions are
+    # added for choosing options.
+    options_per_page = 10
+    # The longest an option's text can be, which keeps every page within
+    # Discord's embed length limit
+    max_option_len = 400
+
     auto_delete_msg: bool
     get_multiple_selections: bool
 
-    _reaction_mapping: Mapping[str, _T]
+    _options: list[_T]
+    # The emoji of every option when emojis were given for the options, or
+    # `None` if the emojis are the same on every page
+    _option_emojis: Optional[list[str]]
+    # Emoji to the index of the option or page position it stands for
+    _emoji_indexes: dict[str, int]
+    _option_texts: list[str]
+    # The casefolded text of every option that searches are matched against
+    _search_texts: list[str]
+    # The indexes of the options matching the current search
+    _shown: list[int]
+    _search: Optional[str]
     _selections: list[_T]
+    # The indexes of the options that are chosen
+    _chosen: set[int]
+    # Whether or not the responder confirmed their selections with a check
+    _confirmed: bool
+    # The option emojis the bot reacted with, in order, when emojis were
+    # given for the options
+    _option_reactions: list[str]
+    # Whether or not the option reactions are being changed to the ones of
+    # the current page
+    _updating_reactions: bool = False
+    # Whether or not the option reactions need to be changed to the ones of
+    # the current page
+    _reactions_stale: bool = False
 
     _check = "✅"
+    _show_all = "*"
 
     def __init__(
         self,
@@ -216,6 +261,7 @@ class User_Selection_Message(Paged_Message, Generic[_T]):
         get_multiple_selections: bool = False,
         auto_delete_msg: bool = True,
         color: Optional[Union[discord.Color, int]] = std_embed.Colors.INPUT,
+        search_text_generator: Optional[Callable[[_T], str]] = None,
     ):
         """Parameters
         -----------
@@ -252,19 +298,48 @@ class User_Selection_Message(Paged_Message, Generic[_T]):
         auto_delete_msg: bool
         Whether or not the message should be removed from `channel` once
         `responder` makes their selection(s).
-        """
-        self._selections = []
 
+        search_text_generator: Optional[Callable[[_T], str]]
+        A function to convert an option to the text searches are matched
+        against. If `None`, `option_text_generator` is used. Useful when the
+        option's text is a mention.
+        """
         # Make sure options list is valid.
         if not options:
             raise ValueError(f"options can not be empty.")
-        if isinstance(options, Sequence):
-            if len(options) > len(self.default_selection_reactions):
-                raise ValueError(
-                    "options list may have a maximum of "
-                    f"{len(self.default_selection_reactions)}"
-                    " elements."
+        if isinstance(options, Mapping):
+            self._options = list(options.values())
+            self._option_emojis = list(options.keys())
+            self._emoji_indexes = {e: i for i, e in enumerate(self._option_emojis)}
+        elif isinstance(options, Sequence):
+            self._options = list(options)
+            self._option_emojis = None
+            self._emoji_indexes = {
+                e: i
+                for i, e in enumerate(
+                    self.default_selection_reactions[: self.options_per_page]
                 )
+            }
+        else:
+            raise ValueError(
+                "options must be a sequence of items or a mapping of emojis to items."
+            )
+
+        if search_text_generator is None:
+            search_text_generator = option_text_generator
+        self._option_texts = [
+            fmt.bound_str(option_text_generator(o), self.max_option_len)
+            for o in self._options
+        ]
+        self._search_texts = [
+            search_text_generator(o).casefold() for o in self._options
+        ]
+        self._shown = list(range(len(self._options)))
+        self._search = None
+        self._selections = []
+        self._chosen = set()
+        self._confirmed = False
+        self._option_reactions = []
 
         # If no description provided, use a default description.
         if description is None:
@@ -274,49 +349,113 @@ class User_Selection_Message(Paged_Message, Generic[_T]):
                 description = "React to choose an item."
         elif not description:
             description = None
+        self._title = title
+        self._description = description
+        self._color = color
 
-        options_list: Iterable[_T]
-        if isinstance(options, Sequence):
-            options_list = options
-            # Use a generator to create option embeds.
-            def sequence_field_generator() -> Iterator[tuple[str, str, bool]]:
-                for option, emoji in zip(options, self.default_selection_reactions):
-                    yield emoji, option_text_generator(option), True
-
-            fg = sequence_field_generator()
-        elif isinstance(options, Mapping):
-            options_list = options.values()
-            # Use a generator to create option embeds.
-            def mapping_field_generator() -> Iterator[tuple[str, str, bool]]:
-                for emoji, option in options.items():
-                    yield emoji, option_text_generator(option), True
-
-            fg = mapping_field_generator()
-        else:
-            raise ValueError(
-                "options must be a sequence of items or a mapping of emojis to items."
-            )
+        super().__init__([], responder, embed_editor=None)
+        self.auto_delete_msg = auto_delete_msg
+        self.get_multiple_selections = get_multiple_selections
+        self.pages = self._get_pages()
 
-        embeds = self.embed_list_from_items(
-            options_list,
-            lambda pg: title,
-            lambda i: description,
-            lambda option: next(fg),
-            responder,
-            color=color,
+    @property
+    def searchable(self) -> bool:
+        """Whether or not the options can be searched, which is only allowed
+        if there is a responder and more options than fit on one page.
+        """
+        return (
+            self.responder is not None and len(self._options) > self.options_per_page
         )
 
-        super().__init__(embeds, responder, embed_editor=None)
+    def _get_option_emoji(self, position: int, index: int) -> str:
+        """Returns the emoji for choosing the option at index `index` in
+        `_options` shown at `position` on its page.
+        """
+        if self._option_emojis is not None:
+            return self._option_emojis[index]
+        return self.default_selection_reactions[position]
 
-        self.auto_delete_msg = auto_delete_msg
-        self.get_multiple_selections = get_multiple_selections
-        if isinstance(options, Mapping):
-            self._reaction_mapping = options
-        else:
-            self._reaction_mapping = {
-                emoji: opt
-                for emoji, opt in zip(self.default_selection_reactions, options)
-            }
+    def _get_description(self) -> Optional[str]:
+        lines = [self._description] if self._description is not None else []
+        if self.get_multiple_selections:
+            lines.append(
+                "Adding or removing a reaction picks or unpicks the option next to it."
+            )
+        if self.searchable:
+            if self._search is None:
+                lines.append("Send a message to search the options.")
+            else:
+                lines.append(
+                    fmt.format_maxlen(
+                        "Showing options containing `{}`. Send `{}` to show every option.",
+                        self._search,
+                        self._show_all,
+                        max_total_len=1024,
+                    )
+                )
+            if not self._shown:
+                lines.append("**No options match the search.**")
+        return "\n".join(lines) if lines else None
+
+    def _get_page(self, page: int, description: Optional[str]) -> discord.Embed:
+        """Creates the page at index `page` of the options that match the
+        current search.
+        """
+        embed = discord.Embed(description=description or discord.Embed.Empty)
+        if self._color is not None:
+            embed.color = self._color
+        if self.responder is not None:
+            # Keep the title next to the responder's icon
+            embed.set_author(
+                name=self._title if self._title is not None else self.responder.name,
+                icon_url=self.responder.avatar_url_as(format="png"),
+            )
+        elif self._title is not None:
+            embed.title = self._title
+
+        for position, index in enumerate(self._get_page_indexes(page)):
+            text = self._option_texts[index]
+            if index in self._chosen:
+                text = f"{self._check} {text}"
+            embed.add_field(
+                name=self._get_option_emoji(position, index), value=text, inline=True
+            )
+
+        footer = get_paged_footer(page + 1, self._page_count(), self.responder)
+        if footer is not None:
+            embed.set_footer(text=footer)
+        return embed
+
+    def _page_count(self) -> int:
+        return max(-(-len(self._shown) // self.options_per_page), 1)
+
+    def _get_pages(self) -> list[discord.Embed]:
+        """Creates the pages showing the options that match the current
+        search.
+        """
+        description = self._get_description()
+        return [self._get_page(pg, description) for pg in range(self._page_count())]
+
+    def _get_page_indexes(self, page: int) -> list[int]:
+        """Returns the indexes in `_options` of the options shown on the page
+        at index `page`.
+        """
+        start = page * self.options_per_page
+        return self._shown[start : start + self.options_per_page]
+
+    def _get_option_index(self, emoji: str) -> Optional[int]:
+        """Returns the index in `_options` of the option `emoji` chooses on
+        the current page, or `None` if it doesn't choose one.
+        """
+        if emoji not in self._emoji_indexes:
+            return None
+        page_indexes = self._get_page_indexes(self.page or 0)
+        if self._option_emojis is not None:
+            index = self._emoji_indexes[emoji]
+            # Options on other pages can't be chosen until they are shown
+            return index if index in page_indexes else None
+        position = self._emoji_indexes[emoji]
+        return page_indexes[position] if position < len(page_indexes) else None
 
     async def send(
         self,
@@ -355,88 +494,59 @@ class User_Selection_Message(Paged_Message, Generic[_T]):
         """Return a list of the selections made by `responder`."""
         return self._selections
 
-    async def _find_all_selections(self) -> None:
-        if self.msg is None:
-            return
-
-        async def check_reaction(reaction) -> bool:
-            # Adds valid selections to `self._selections` and returns whether
-            # or not the reaction was a checkmark from `responder`.
-
-            # Check to see if emoji is valid
-            if (
-                reaction.emoji != self._check
-                and reaction.emoji not in self._reaction_mapping.keys()
-            ):
-                return False
-
-            # Check to see if reactor is valid
-            if self.responder is not None:
-                if await reaction.users().get(id=self.responder.id) is None:
-                    return False
-            else:
-                if await reaction.users().find(lambda u: u != client.user) is not None:
-                    return False
-
-            # Handle reaction
-            if reaction.emoji == self._check:
-                return True
-            else:
-                self._selections.append(self._reaction_mapping[reaction.emoji])
-                return False
-
-        has_check = any(
-            await asyncio.gather(*(check_reaction(r) for r in self.msg.reactions))
-        )
-        if self.get_multiple_selections:
-            # If `responder` made valid selections but timed out without
-            # confirming their choices with a check, raise an error
-            if not has_check:
-                await self.delete()
-                raise errors.UserTimeoutError()
+    async def search(self, text: str) -> None:
+        """Only shows the options whose search text contains `text`, or every
+        option if `text` is empty or `_show_all`.
+        """
+        text = text.strip()
+        if not text or text == self._show_all:
+            self._search = None
+            self._shown = list(range(len(self._options)))
         else:
-            if not self._selections:
-                # If no selections were made, raise an error
-                await self.delete()
-                raise errors.UserTimeoutError()
-
-    def _reaction_check(
-        self,
-        reaction: discord.Reaction,
-        reactor: Union[discord.User, discord.Member],
-    ) -> bool:
-        return (
-            reaction.message == self.msg
-            and reactor != client.user
-            and (
-                reaction.emoji in (self._larrow, self._rarrow, self._check)
-                or reaction.emoji in self._reaction_mapping.keys()
-            )
-        )
-
-    async def _handle_reaction(
-        self,
-        reaction: discord.Reaction,
-        reactor: Union[discord.User, discord.Member],
-    ) -> None:
+            self._search = text
+            needle = text.casefold()
+            self._shown = [
+                i for i, option in enumerate(self._search_texts) if needle in option
+            ]
+        self._refresh_timeout()
+        self.pages = self._get_pages()
+        self.page = 0
+        await self._show_page()
+
+    async def _handle_reaction(self, emoji: str, user_id: int, added: bool) -> None:
         # Handle page turns
-        if len(self.pages) > 1 and super()._reaction_check(reaction, reactor):
-            await super()._handle_reaction(reaction, reactor)
+        if len(self.pages) > 1 and emoji in (self._larrow, self._rarrow):
+            await super()._handle_reaction(emoji, user_id, added)
+            return
+        if emoji != self._check and emoji not in self._emoji_indexes:
             return
 
-        if self.responder is None or reactor == self.responder:
-            # Handle checks and selections from responders
-            if self.get_multiple_selections and reaction.emoji == self._check:
-                self._continue = False
-                return
-            if reaction.emoji in self._reaction_mapping.keys():
-                if not self.get_multiple_selections:
-                    self._continue = False
-                    self._selections = [self._reaction_mapping[reaction.emoji]]  # type: ignore
-                return
+        if not self._can_respond(user_id):
+            # Delete reaction if it was invalid
+            if added:
+                await self._remove_reaction(emoji, user_id)
+            return
 
-        # Delete reaction if it was invalid
-        await reaction.remove(reactor)
+        # Handle checks and selections from responders
+        self._refresh_timeout()
+        if emoji == self._check:
+            if self.get_multiple_selections and added:
+                self._confirmed = True
+                self.stop()
+            return
+        index = self._get_option_index(emoji)
+        if index is None:
+            return
+        if not self.get_multiple_selections:
+            if added:
+                self._selections = [self._options[index]]
+                self.stop()
+        else:
+            # The reaction stays on the message after the page is turned, so
+            # removing it picks or unpicks the option in its place instead
+            self._chosen ^= {index}
+            self.pages[self.page] = self._get_page(self.page, self._get_description())
+            await self._show_page()
 
     def _get_initial_reactions(self) -> list[str]:
         if len(self.pages) > 1:
@@ -446,19 +556,111 @@ class User_Selection_Message(Paged_Message, Generic[_T]):
             ret = []
         if self.get_multiple_selections:
             ret.append(self._check)
-        ret += list(self._reaction_mapping.keys())[:10]
+        if self._option_emojis is not None:
+            self._option_reactions = self._get_page_emojis()
+            ret += self._option_reactions
+        else:
+            ret += list(self._emoji_indexes)[: len(self._options)]
         return ret
 
+    def _get_page_emojis(self) -> list[str]:
+        """Returns the emojis of the options on the current page. Only used
+        when emojis were given for the options.
+        """
+        return [
+            self._option_emojis[i]  # type: ignore
+            for i in self._get_page_indexes(self.page or 0)
+        ]
+
+    async def _show_page(self) -> None:
+        await super()._show_page()
+        if self._option_emojis is not None:
+            await self._update_option_reactions()
+
+    async def _update_option_reactions(self) -> None:
+        """Changes the option reactions to the emojis of the options on the
+        current page, which are different on every page when emojis were given
+        for the options. Like page edits, changes requested while the
+        reactions are being changed are handled together once they are done.
+        """
+        self._reactions_stale = True
+        if self._updating_reactions:
+            return
+
+        self._updating_reactions = True
+        try:
+            while self.msg is not None and self._continue and self._reactions_stale:
+                self._reactions_stale = False
+                wanted = self._get_page_emojis()
+                # Keep the reactions in the same order as the options by only
+                # replacing the ones after the first that differs
+                same = 0
+                while (
+                    same < min(len(wanted), len(self._option_reactions))
+                    and wanted[same] == self._option_reactions[same]
+                ):
+                    same += 1
+                while len(self._option_reactions) > same:
+                    emoji = self._option_reactions.pop()
+                    await self.msg.remove_reaction(emoji, client.user)
+                for emoji in wanted[same:]:
+                    await self.msg.add_reaction(emoji)
+                    self._option_reactions.append(emoji)
+        except discord.HTTPException as e:
+            log.warning(f"Could not change option reactions: {fmt.format_error(e)}")
+        finally:
+            self._updating_reactions = False
+
+    async def _start(self, timeout: float):
+        await super()._start(timeout)
+        if self._continue and self.searchable and self.msg is not None:
+            _searchable.setdefault(self.msg.channel.id, []).append(self)
+
+    def stop(self) -> None:
+        super().stop()
+        if self.msg is not None:
+            searchable = _searchable.get(self.msg.channel.id)
+            if searchable is not None and self in searchable:
+                searchable.remove(self)
+                if not searchable:
+                    del _searchable[self.msg.channel.id]
+
     async def _cleanup(self):
-        await self._update_msg()
         if self.get_multiple_selections:
-            await self._find_all_selections()
+            # If `responder` made valid selections but timed out without
+            # confirming their choices with a check, raise an error
+            if not self._confirmed:
+                await self.delete()
+                raise errors.UserTimeoutError()
+            # Selections are kept track of as reactions are added, so the
+            # message's reactions never have to be fetched
+            self._selections = [self._options[i] for i in sorted(self._chosen)]
         if self.auto_delete_msg:
             await self.delete()
         if not self.get_multiple_selections and not self._selections:
             raise errors.UserTimeoutError()
 
 
+async def on_message(msg: discord.Message) -> bool:
+    """Searches the options of the newest selection message in `msg`'s
+    channel that `msg`'s author is choosing from, using `msg`'s text. Returns
+    whether or not `msg` was used as a search. Should be called for every
+    message sent.
+    """
+    searchable = _searchable.get(msg.channel.id)
+    if not searchable:
+        return False
+    for selection_msg in reversed(searchable):
+        if selection_msg.responder.id == msg.author.id:
+            await selection_msg.search(msg.content)
+            try:
+                await msg.delete()
+            except discord.HTTPException:
+                pass
+            return True
+    return False
+
+
 async def selections(
     channel: discord.abc.Messageable,
     options: Union[Mapping[str, _T], Sequence[_T]],
@@ -468,6 +670,7 @@ async def selections(
     description: Optional[str] = None,
     auto_delete_msg: bool = True,
     timeout: Optional[float] = None,
+    search_text_generator: Optional[Callable[[_T], str]] = None,
 ) -> list[_T]:
     """Sends a message to `channel` prompting `responder` to choose multiple
     selections from `options` using reactions. Returns a list of the selected
@@ -482,6 +685,7 @@ async def selections(
         description=description,
         get_multiple_selections=True,
         auto_delete_msg=auto_delete_msg,
+        search_text_generator=search_text_generator,
     )
     if timeout is not None:
         await selection_embed.send(channel, timeout=timeout)
@@ -500,6 +704,7 @@ async def selection(
     description: Optional[str] = None,
     auto_delete_msg: bool = True,
     timeout: Optional[float] = None,
+    search_text_generator: Optional[Callable[[_T], str]] = None,
 ) -> _T:
     """Sends a message to `channel` prompting `responder` to choose a
     selection from `options` using reactions. Returns a the selected option,
@@ -514,6 +719,7 @@ async def selection(
         description=description,
         get_multiple_selections=False,
         auto_delete_msg=auto_delete_msg,
+        search_text_generator=search_text_generator,
     )
     if timeout is not None:
         await selection_embed.send(channel, timeout=timeout)
@@ -0,0 +1,186 @@
+import discord
+from collections import Counter
+from typing import Iterable
+
+
+class Guild_Stats:
+    """Counts of a guild's members, roles and channels that are kept up to
+    date from gateway events instead of being recounted from the guild's
+    caches every time they are needed.
+
+    Attributes
+    ------------
+    role_members: Counter[int]
+    Role id to how many members have the role. The default role is left out
+    since every member has it.
+
+    channel_types: Counter[discord.ChannelType]
+    How many channels of each type the guild has.
+
+    bots: int
+    How many members are bots.
+
+    humans: int
+    How many members are not bots.
+
+    chunked: bool
+    Whether every member of the guild was cached when the counts were
+    taken. Counts taken before then only include cached members.
+
+    counted: set[int]
+    The ids of the members included in the counts. Without every member
+    cached, discord.py can cache a member without dispatching an event for
+    it, so updates and removals of members that were never counted are
+    ignored instead of being subtracted.
+    """
+
+    def __init__(self, guild: discord.Guild):
+        self.role_members: Counter[int] = Counter({r.id: 0 for r in guild.roles})
+        self.role_members.pop(guild.id, None)
+        self.channel_types: Counter[discord.ChannelType] = Counter(
+            c.type for c in guild.channels
+        )
+        self.bots = 0
+        self.humans = 0
+        self.chunked = guild.chunked
+        self.counted: set[int] = set()
+        # Counting every member once here is what lets later lookups skip
+        # the O(members) scan discord.py does for `role.members`
+        for member in guild.members:
+            self.add_member(member)
+
+    def _add_roles(self, roles: Iterable[discord.Role], amount: int) -> None:
+        for role in roles:
+            if not role.is_default():
+                self.role_members[role.id] += amount
+
+    def add_member(self, member: discord.Member) -> None:
+        if member.id in self.counted:
+            return
+        self.counted.add(member.id)
+        if member.bot:
+            self.bots += 1
+        else:
+            self.humans += 1
+        self._add_roles(member.roles, 1)
+
+    def remove_member(self, member: discord.Member) -> None:
+        if member.id not in self.counted:
+            return
+        self.counted.remove(member.id)
+        if member.bot:
+            self.bots -= 1
+        else:
+            self.humans -= 1
+        self._add_roles(member.roles, -1)
+
+    def update_member(self, before: discord.Member, after: discord.Member) -> None:
+        # A member cached without an event is counted with their new roles
+        if before.id not in self.counted:
+            self.add_member(after)
+            return
+        if before.roles == after.roles:
+            return
+        before_roles = set(before.roles)
+        after_roles = set(after.roles)
+        self._add_roles(before_roles - after_roles, -1)
+        self._add_roles(after_roles - before_roles, 1)
+
+    @property
+    def member_count(self) -> int:
+        return self.bots + self.humans
+
+    @property
+    def channel_count(self) -> int:
+        return sum(self.channel_types.values())
+
+    @property
+    def text_channel_count(self) -> int:
+        """How many text channels the guild has, counting news channels like
+        `guild.text_channels` does.
+        """
+        return (
+            self.channel_types[discord.ChannelType.text]
+            + self.channel_types[discord.ChannelType.news]
+        )
+
+    def get_role_count(self, role: discord.Role) -> int:
+        """Returns how many members have `role`."""
+        if role.is_default():
+            return self.member_count
+        return self.role_members[role.id]
+
+
+# Guild id to the guild's stats. Guilds are only counted once their stats
+# are first needed.
+_guilds: dict[int, Guild_Stats] = {}
+
+
+def get_stats(guild: discord.Guild) -> Guild_Stats:
+    """Returns the stats of `guild`, counting them if they haven't been
+    counted yet or if the guild's members were cached since they were.
+    """
+    stats = _guilds.get(guild.id)
+    if stats is None or (guild.chunked and not stats.chunked):
+        stats = _guilds[guild.id] = Guild_Stats(guild)
+    return stats
+
+
+def remove_guild(guild_id: int) -> None:
+    """Drops the stats kept for the guild with the id `guild_id`."""
+    _guilds.pop(guild_id, None)
+
+
+# The functions below should be called from the client's events. They only
+# update guilds that have already been counted.
+
+
+def member_join(member: discord.Member) -> None:
+    stats = _guilds.get(member.guild.id)
+    if stats is not None:
+        stats.add_member(member)
+
+
+def member_remove(member: discord.Member) -> None:
+    stats = _guilds.get(member.guild.id)
+    if stats is not None:
+        stats.remove_member(member)
+
+
+def member_update(before: discord.Member, after: discord.Member) -> None:
+    stats = _guilds.get(after.guild.id)
+    if stats is not None:
+        stats.update_member(before, after)
+
+
+def role_create(role: discord.Role) -> None:
+    stats = _guilds.get(role.guild.id)
+    if stats is not None:
+        stats.role_members[role.id] = 0
+
+
+def role_delete(role: discord.Role) -> None:
+    stats = _guilds.get(role.guild.id)
+    if stats is not None:
+        stats.role_members.pop(role.id, None)
+
+
+def channel_create(channel: discord.abc.GuildChannel) -> None:
+    stats = _guilds.get(channel.guild.id)
+    if stats is not None:
+        stats.channel_types[channel.type] += 1
+
+
+def channel_delete(channel: discord.abc.GuildChannel) -> None:
+    stats = _guilds.get(channel.guild.id)
+    if stats is not None:
+        stats.channel_types[channel.type] -= 1
+
+
+def channel_update(
+    before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+) -> None:
+    # Text channels can be turned into news channels and back
+    if before.type != after.type:
+        channel_delete(before)
+        channel_create(after)
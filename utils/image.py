@@ -0,0 +1,255 @@
+import discord
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from core import config
+from . import image_worker, tasks
+
+log = logging.getLogger("image")
+
+# Pillow is optional. Without it images can still be shown through Discord's
+# CDN, but not combined.
+has_pillow = image_worker.has_pillow
+
+# Sizes Discord's CDN can resize images to
+cdn_sizes = tuple(2 ** i for i in range(4, 13))
+# Formats images can be converted to
+formats = ("png", "jpg", "webp")
+
+cache_dir = Path("data/cache/images")
+# How many bytes of images are kept in memory
+max_memory_cache_bytes = int(config.get("image_memory_cache_mb", 32)) * 1024 * 1024
+# How many bytes of images are kept on disk
+max_disk_cache_bytes = int(config.get("image_disk_cache_mb", 256)) * 1024 * 1024
+# How many images are downloaded at the same time
+max_concurrent_fetches = 4
+# How many processes images are processed in
+image_workers = int(config.get("image_workers", 2))
+
+
+class _Byte_LRU:
+    """A least recently used cache of bytes bounded by their total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._items.get(key)
+        if data is not None:
+            self._items.move_to_end(key)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+_memory_cache = _Byte_LRU(max_memory_cache_bytes)
+# Cache key to the size of its file in `cache_dir`, least recently used
+# first. Loaded from `cache_dir` the first time it is needed.
+_disk_files: Optional[OrderedDict[str, int]] = None
+_disk_size = 0
+# Disk reads and writes are done in other threads
+_disk_lock = threading.Lock()
+# Cache key to the download of the image, so that an image requested again
+# while it is being downloaded is only downloaded once
+_fetching: dict[str, "asyncio.Future[bytes]"] = {}
+_fetch_slots: Optional[asyncio.Semaphore] = None
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_key(*parts) -> str:
+    return hashlib.sha1("\n".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _load_disk_files() -> OrderedDict[str, int]:
+    global _disk_files, _disk_size
+    if _disk_files is None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        files = sorted(cache_dir.iterdir(), key=lambda f: f.stat().st_mtime)
+        _disk_files = OrderedDict((f.name, f.stat().st_size) for f in files)
+        _disk_size = sum(_disk_files.values())
+    return _disk_files
+
+
+def _read_disk(key: str) -> Optional[bytes]:
+    with _disk_lock:
+        disk_files = _load_disk_files()
+        if key not in disk_files:
+            return None
+        path = cache_dir / key
+        try:
+            data = path.read_bytes()
+            # Newer modification times are kept longer after a restart
+            os.utime(path)
+        except OSError:
+            return None
+        disk_files.move_to_end(key)
+        return data
+
+
+def _write_disk(key: str, data: bytes) -> None:
+    global _disk_size
+    if len(data) > max_disk_cache_bytes:
+        return
+    with _disk_lock:
+        disk_files = _load_disk_files()
+        try:
+            (cache_dir / key).write_bytes(data)
+        except OSError as e:
+            log.warning(f"Could not cache image {key}: {e}")
+            return
+        _disk_size += len(data) - disk_files.pop(key, 0)
+        disk_files[key] = len(data)
+        while _disk_size > max_disk_cache_bytes:
+            evicted, size = disk_files.popitem(last=False)
+            _disk_size -= size
+            try:
+                (cache_dir / evicted).unlink()
+            except OSError:
+                pass
+
+
+def _get_fetch_slots() -> asyncio.Semaphore:
+    # Created on first use so that it belongs to the client's event loop
+    global _fetch_slots
+    if _fetch_slots is None:
+        _fetch_slots = asyncio.Semaphore(max_concurrent_fetches)
+    return _fetch_slots
+
+
+async def _cached(key: str, make) -> bytes:
+    """Returns the bytes cached for `key`, checking memory and then disk,
+    or makes them by awaiting `make()` and caches them.
+    """
+    data = _memory_cache.get(key)
+    if data is not None:
+        return data
+    if key in _fetching:
+        return await asyncio.shield(_fetching[key])
+
+    loop = asyncio.get_event_loop()
+    future = _fetching[key] = loop.create_future()
+    try:
+        # Disk work is done off the event loop
+        data = await loop.run_in_executor(None, _read_disk, key)
+        if data is None:
+            data = await make()
+            loop.run_in_executor(None, _write_disk, key, data)
+        _memory_cache.put(key, data)
+        future.set_result(data)
+        return data
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Only callers waiting on the same image see the exception
+        future.exception()
+        raise
+    finally:
+        del _fetching[key]
+
+
+async def fetch(asset: discord.Asset) -> bytes:
+    """Returns the image at `asset`. Images are cached by their url, which
+    includes the hash of the image, so a changed avatar or emoji is fetched
+    again.
+    """
+
+    async def download() -> bytes:
+        async with _get_fetch_slots():
+            return await asset.read()
+
+    return await _cached(_get_key("asset", str(asset)), download)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Workers are always spawned instead of forked, since forking copies
+        # the client, the database connection and the event loop's threads.
+        # Spawned workers import main.py again, which only sets up the bot
+        # when it is the process running the bot, and then only import
+        # `image_worker`.
+        _pool = ProcessPoolExecutor(
+            max_workers=image_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def combine(
+    assets: list[discord.Asset], height: int, image_format: str = "png"
+) -> bytes:
+    """Returns the images at `assets` side by side as one image of the format
+    `image_format`, each resized to `height` pixels tall. Images are
+    downloaded at the same time and combined in a separate process so that
+    decoding them never blocks the event loop. Requires Pillow.
+    """
+    if not has_pillow:
+        raise RuntimeError("Combining images requires Pillow")
+
+    async def make() -> bytes:
+        images = await asyncio.gather(*(fetch(a) for a in assets))
+        return await asyncio.get_event_loop().run_in_executor(
+            _get_pool(), image_worker.combine, images, height, image_format
+        )
+
+    return await _cached(
+        _get_key("combined", height, image_format, *(str(a) for a in assets)), make
+    )
+
+
+def shutdown() -> None:
+    """Stops the image worker processes."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
+
+
+tasks.add_shutdown_hook(shutdown)
+
+
+# Guild id to the guild's emojis by name, built the first time an emoji is
+# looked up by name in the guild
+_emoji_names: dict[int, dict[str, discord.Emoji]] = {}
+
+
+def get_emoji(guild: discord.Guild, name: str) -> Optional[discord.Emoji]:
+    """Returns the emoji in `guild` named `name`, or `None` if there isn't
+    one.
+    """
+    names = _emoji_names.get(guild.id)
+    if names is None:
+        names = _emoji_names[guild.id] = {}
+        # Keep the first emoji with each name like `discord.utils.get` does
+        for emoji in reversed(guild.emojis):
+            names[emoji.name] = emoji
+    return names.get(name)
+
+
+def emojis_update(guild: discord.Guild) -> None:
+    """Forgets the emoji names of `guild`. Should be called whenever a
+    guild's emojis change.
+    """
+    _emoji_names.pop(guild.id, None)
@@ -0,0 +1,38 @@
+import io
+
+# Runs in the image worker processes, so only imports what image processing
+# needs instead of the bot's modules
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+has_pillow = Image is not None
+
+
+def combine(images: list[bytes], height: int, image_format: str) -> bytes:
+    """Returns `images` resized to `height` pixels tall and placed side by
+    side, saved as `image_format`.
+    """
+    resampling = getattr(Image, "Resampling", Image)
+    tiles = []
+    for data in images:
+        with Image.open(io.BytesIO(data)) as tile:
+            tile = tile.convert("RGBA")
+            width = max(round(tile.width * height / tile.height), 1)
+            tiles.append(tile.resize((width, height), resampling.LANCZOS))
+
+    combined = Image.new("RGBA", (sum(t.width for t in tiles), height))
+    x = 0
+    for tile in tiles:
+        combined.paste(tile, (x, 0))
+        x += tile.width
+    if image_format == "jpg":
+        # JPEGs have no transparency
+        background = Image.new("RGB", combined.size, (255, 255, 255))
+        background.paste(combined, mask=combined.getchannel("A"))
+        combined = background
+
+    output = io.BytesIO()
+    combined.save(output, format="jpeg" if image_format == "jpg" else image_format)
+    return output.getvalue()
@@ -0,0 +1,378 @@
+import bisect
+import datetime
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Index files are kept in this folder inside the logs folder, with the same
+# name as the log they index plus `index_suffix`
+index_dir_name = "index"
+index_suffix = ".idx"
+# How many indexes of logs that are no longer being written to are kept in
+# memory
+max_cached_indexes = 8
+
+# The ids `fmt.get_user_log` writes for users, guilds and channels
+_re_id = re.compile(r"\[(\d{15,21})\]")
+# The start of every record written with the log format set in `core`
+_re_record_start = re.compile(
+    rb"(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3}):([A-Z]+):([^:]*): "
+)
+_log_name_format = "%Y-%m-%d %H.%M.%S"
+_command_logger_prefix = "commands."
+
+
+class Index_Entry:
+    """Where one log record is in its log file and what it is about.
+
+    Attributes
+    ------------
+    created: float
+    The POSIX timestamp the record was logged at.
+
+    level: int
+    The record's level, like `logging.INFO`.
+
+    command: str
+    The name of the command that logged the record, or an empty string if it
+    wasn't logged by a command.
+
+    ids: tuple[int, ...]
+    The ids of the users, guilds and channels in the record's first line.
+
+    offset: int
+    Where the record starts in its log file in bytes.
+
+    length: int
+    How long the record is in bytes.
+    """
+
+    __slots__ = ("created", "level", "command", "ids", "offset", "length")
+
+    def __init__(
+        self,
+        created: float,
+        level: int,
+        command: str,
+        ids: tuple[int, ...],
+        offset: int,
+        length: int,
+    ):
+        self.created = created
+        self.level = level
+        self.command = command
+        self.ids = ids
+        self.offset = offset
+        self.length = length
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+    def to_line(self) -> str:
+        return (
+            f"{self.created:.3f}\t{self.level}\t{self.command}\t"
+            + ",".join(str(i) for i in self.ids)
+            + f"\t{self.offset}\t{self.length}\n"
+        )
+
+    @staticmethod
+    def from_line(line: str) -> "Index_Entry":
+        created, level, command, ids, offset, length = line.rstrip("\n").split("\t")
+        return Index_Entry(
+            float(created),
+            int(level),
+            command,
+            tuple(int(i) for i in ids.split(",")) if ids else (),
+            int(offset),
+            int(length),
+        )
+
+
+def _get_command(logger_name: str) -> str:
+    if logger_name.startswith(_command_logger_prefix):
+        return logger_name[len(_command_logger_prefix) :]
+    return ""
+
+
+def _get_ids(message: str) -> tuple[int, ...]:
+    return tuple(int(i) for i in _re_id.findall(message.split("\n", 1)[0]))
+
+
+def get_index_path(log_path: Path) -> Path:
+    return log_path.parent / index_dir_name / (log_path.name + index_suffix)
+
+
+class Indexed_File_Handler(logging.FileHandler):
+    """A `logging.FileHandler` that also writes an index of where every
+    record is in the log and what it is about, so that logs can be searched
+    without reading them whole.
+    """
+
+    def __init__(self, filename: Path, mode: str = "a"):
+        super().__init__(filename, mode, encoding="utf-8")
+        self.index_path = get_index_path(Path(self.baseFilename))
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._index = self.index_path.open(mode, encoding="utf-8")
+        _handlers[Path(self.baseFilename)] = self
+
+    def _open(self):
+        # Newlines aren't translated so that the bytes written for a record
+        # are exactly its encoded text
+        stream = open(
+            self.baseFilename,
+            self.mode,
+            encoding=self.encoding,
+            errors=self.errors,
+            newline="",
+        )
+        # Where the next record starts in bytes. Kept track of instead of
+        # asking the stream, since the positions of text streams aren't byte
+        # offsets.
+        self._position = os.path.getsize(self.baseFilename)
+        return stream
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            text = self.format(record) + self.terminator
+            length = len(text.encode(self.encoding, self.errors or "strict"))
+            self.stream.write(text)
+            self.stream.flush()
+            entry = Index_Entry(
+                record.created,
+                record.levelno,
+                _get_command(record.name),
+                _get_ids(record.getMessage()),
+                self._position,
+                length,
+            )
+            self._position += length
+            self._index.write(entry.to_line())
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            super().flush()
+            if not self._index.closed:
+                self._index.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            _handlers.pop(Path(self.baseFilename), None)
+            self._index.close()
+            super().close()
+        finally:
+            self.release()
+
+
+# Log path to the handler writing to it
+_handlers: dict[Path, Indexed_File_Handler] = {}
+
+
+class Log_Index:
+    """The index of one log file, ordered by when records were logged."""
+
+    def __init__(self, entries: list[Index_Entry]):
+        self.entries = entries
+        self.times = [e.created for e in entries]
+
+
+def _read_index_file(index_path: Path) -> list[Index_Entry]:
+    if not index_path.exists():
+        return []
+    entries = []
+    with index_path.open("r", encoding="utf-8") as index_file:
+        for line in index_file:
+            # The last line may still be being written
+            if line.endswith("\n"):
+                entries.append(Index_Entry.from_line(line))
+    return entries
+
+
+def _scan_log(log_path: Path, start: int) -> list[Index_Entry]:
+    """Indexes the records in the log file at `log_path` from byte `start`
+    onwards by reading it. Used for logs that were written without an index
+    or whose index is missing its last records.
+    """
+    entries = []
+    current: Optional[Index_Entry] = None
+    position = start
+    with log_path.open("rb") as log_file:
+        log_file.seek(start)
+        for line in log_file:
+            m = _re_record_start.match(line)
+            if m is not None:
+                if current is not None:
+                    entries.append(current)
+                asctime, msecs, level_name, logger_name = m.groups()
+                created = datetime.datetime.strptime(
+                    asctime.decode(), "%Y-%m-%d %H:%M:%S"
+                ).timestamp() + int(msecs) / 1000
+                level = logging.getLevelName(level_name.decode())
+                current = Index_Entry(
+                    created,
+                    level if isinstance(level, int) else logging.NOTSET,
+                    _get_command(logger_name.decode()),
+                    _get_ids(line[m.end() :].decode("utf-8", "replace")),
+                    position,
+                    0,
+                )
+            position += len(line)
+            if current is not None:
+                current.length = position - current.offset
+    if current is not None:
+        entries.append(current)
+    return entries
+
+
+_cache: OrderedDict[Path, tuple[int, Log_Index]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_index(log_path: Path) -> Log_Index:
+    """Returns the index of the log file at `log_path`, indexing any records
+    that are not indexed yet and saving them to the log's index file.
+    """
+    handler = _handlers.get(Path(os.path.abspath(log_path)))
+    if handler is not None:
+        # The handler indexes every record it writes
+        handler.flush()
+        return Log_Index(_read_index_file(handler.index_path))
+
+    size = log_path.stat().st_size
+    with _cache_lock:
+        cached = _cache.get(log_path)
+        if cached is not None and cached[0] == size:
+            _cache.move_to_end(log_path)
+            return cached[1]
+
+    index_path = get_index_path(log_path)
+    entries = _read_index_file(index_path)
+    covered = entries[-1].end if entries else 0
+    if covered < size:
+        new_entries = _scan_log(log_path, covered)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        with index_path.open("a", encoding="utf-8") as index_file:
+            index_file.writelines(e.to_line() for e in new_entries)
+        entries += new_entries
+
+    index = Log_Index(entries)
+    with _cache_lock:
+        _cache[log_path] = (size, index)
+        _cache.move_to_end(log_path)
+        while len(_cache) > max_cached_indexes:
+            _cache.popitem(last=False)
+    return index
+
+
+class Log_Query:
+    """Which log records to search for. Records must match every filter that
+    is not `None`.
+
+    Attributes
+    ------------
+    since: Optional[datetime.datetime]
+    The earliest time records can be logged at.
+
+    until: Optional[datetime.datetime]
+    The latest time records can be logged at.
+
+    ids: list[int]
+    Ids of users, guilds or channels that records must mention.
+
+    command: Optional[str]
+    The name of the command that must have logged the records.
+
+    level: int
+    The lowest level records can have.
+
+    text: Optional[str]
+    Text that records must contain, ignoring case.
+    """
+
+    def __init__(self):
+        self.since: Optional[datetime.datetime] = None
+        self.until: Optional[datetime.datetime] = None
+        self.ids: list[int] = []
+        self.command: Optional[str] = None
+        self.level = logging.NOTSET
+        self.text: Optional[str] = None
+
+    def matches_entry(self, entry: Index_Entry) -> bool:
+        return (
+            entry.level >= self.level
+            and (self.command is None or entry.command == self.command)
+            and all(i in entry.ids for i in self.ids)
+        )
+
+    def matches_text(self, text: str) -> bool:
+        return self.text is None or self.text.casefold() in text.casefold()
+
+
+def _split_log_name(log_path: Path) -> tuple[Optional[datetime.datetime], str]:
+    """Returns when the log at `log_path` was started and the rest of its
+    name, which tells apart logs of processes started at the same time, like
+    "shards 0-3".
+    """
+    date, _, rest = log_path.stem.partition(" ")
+    time, _, process = rest.partition(" ")
+    try:
+        start = datetime.datetime.strptime(f"{date} {time}", _log_name_format)
+    except ValueError:
+        return None, log_path.stem
+    return start, process
+
+
+def get_log_files(log_dir: Path) -> list[Path]:
+    """Returns the log files in `log_dir`, newest first."""
+    return sorted(log_dir.glob("*.log"), key=lambda f: f.name, reverse=True)
+
+
+def search(query: Log_Query, log_dir: Path) -> Iterator[tuple[Index_Entry, str]]:
+    """Yields every record in the logs in `log_dir` that matches `query` along
+    with its text, newest first. Only the records the index says can match
+    are read from the logs.
+    """
+    since = query.since.timestamp() if query.since is not None else None
+    until = query.until.timestamp() if query.until is not None else None
+    # Every log file ends where the next newer one of the same process
+    # starts, so files that start after `until` or end before `since` are
+    # skipped without being indexed
+    ends: dict[str, Optional[datetime.datetime]] = {}
+    for log_path in get_log_files(log_dir):
+        start, process = _split_log_name(log_path)
+        log_end = ends.get(process)
+        ends[process] = start
+        if query.since is not None and log_end is not None and log_end < query.since:
+            continue
+        if query.until is not None and start is not None and start > query.until:
+            continue
+
+        index = load_index(log_path)
+        lo = bisect.bisect_left(index.times, since) if since is not None else 0
+        hi = (
+            bisect.bisect_right(index.times, until)
+            if until is not None
+            else len(index.entries)
+        )
+        with log_path.open("rb") as log_file:
+            for entry in reversed(index.entries[lo:hi]):
+                if not query.matches_entry(entry):
+                    continue
+                log_file.seek(entry.offset)
+                text = log_file.read(entry.length).decode("utf-8", "replace")
+                if query.matches_text(text):
+                    yield entry, text
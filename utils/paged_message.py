@@ -1,13 +1,30 @@
 import discord
 import asyncio
+import logging
+import time
 
 from typing import Callable, Iterable, Optional, TypeVar, Union
 
-from . import fmt
+from . import fmt, tasks
 from core import client
 
 _T = TypeVar("_T")
 
+log = logging.getLogger("paged_message")
+
+# The longest time in seconds the sweeper waits before checking for paged
+# messages that have timed out
+sweep_interval = 5
+
+# Message id to the paged message using it, for every paged message whose
+# pages can still be turned. Reaction events are passed to paged messages
+# through this instead of every paged message waiting on its own
+# `client.wait_for`.
+_active: dict[int, "Paged_Message"] = {}
+# The one task that stops paged messages once they time out, or `None` if no
+# paged messages are active
+_sweeper: Optional["asyncio.Future[None]"] = None
+
 
 def get_paged_footer(
     pg: int,
@@ -66,6 +83,15 @@ class Paged_Message:
     msg: Optional[discord.Message]
     responder: Optional[Union[discord.User, discord.Member]]
     _continue: bool = False
+    # Set once the pages can no longer be turned
+    _finished: Optional["asyncio.Future[None]"] = None
+    _timeout: float = 0
+    # The `time.monotonic()` time when the pages can no longer be turned
+    _expires_at: float = 0
+    # Whether or not the message is being edited to show the current page
+    _editing: bool = False
+    # Whether or not the message needs to be edited to show the current page
+    _stale: bool = False
 
     _larrow = "⬅️"
     _rarrow = "➡️"
@@ -135,13 +161,35 @@ class Paged_Message:
                 if blocking:
                     await self._main_loop(timeout)
                 else:
-                    asyncio.ensure_future(self._main_loop(timeout))
+                    # The sweeper stops the message once it times out, so
+                    # nothing has to wait for it until then
+                    await self._start(timeout)
+                    self._finished.add_done_callback(
+                        lambda _: tasks.spawn(
+                            self._logged_cleanup(),
+                            "Paged message cleanup",
+                            group="paged_message",
+                        )
+                    )
             else:
                 self._continue = False
 
     async def delete(self) -> None:
         if self.msg is not None:
-            await self.msg.delete()
+            try:
+                await self.msg.delete()
+            except discord.NotFound:
+                pass
+
+    def stop(self) -> None:
+        """Stops the pages from being turned any more, as if the message had
+        timed out.
+        """
+        if self.msg is not None and _active.get(self.msg.id) is self:
+            del _active[self.msg.id]
+        self._continue = False
+        if self._finished is not None and not self._finished.done():
+            self._finished.set_result(None)
 
     # TODO: Split method to support generators
     @staticmethod
@@ -304,69 +352,66 @@ class Paged_Message:
 
         return embeds
 
-    async def _update_msg(self):
-        """Re-fetches the sent message in order to get an updated list of its
-        reactions and to ensure that it still exists.
+    def _can_respond(self, user_id: int) -> bool:
+        """Returns whether or not the user with the id `user_id` can use the
+        message's reactions.
         """
+        return self.responder is None or user_id == self.responder.id
+
+    def _refresh_timeout(self) -> None:
+        self._expires_at = time.monotonic() + self._timeout
+
+    async def _remove_reaction(self, emoji: str, user_id: int) -> None:
         if self.msg is not None:
             try:
-                self.msg = await self.msg.channel.fetch_message(self.msg.id)
+                await self.msg.remove_reaction(emoji, discord.Object(user_id))
             except discord.HTTPException:
-                self.msg = None
-
-    def _reaction_check(
-        self,
-        reaction: discord.Reaction,
-        reactor: Union[discord.User, discord.Member],
-    ) -> bool:
-        """Returns whether or not the embed handles a reaction."""
-        return (
-            reaction.message == self.msg
-            and reaction.emoji in (self._larrow, self._rarrow)
-            and reactor != client.user
-        )
+                pass
 
-    async def _await_reaction(
-        self, timeout: Optional[float]
-    ) -> tuple[discord.Reaction, Union[discord.User, discord.Member]]:
-        return await client.wait_for(
-            "reaction_add",
-            check=self._reaction_check,
-            timeout=timeout,
-        )
+    async def _handle_reaction(self, emoji: str, user_id: int, added: bool) -> None:
+        """Handles reactions for turning pages. Adding and removing an arrow
+        both turn the page, so arrows never have to be removed to be used
+        again.
+        """
+        if emoji not in (self._larrow, self._rarrow):
+            return
+        if not self._can_respond(user_id):
+            # Remove reactions from users who can't turn the page
+            if added:
+                await self._remove_reaction(emoji, user_id)
+            return
+        await self._turn_page(-1 if emoji == self._larrow else 1)
 
-    async def _handle_reaction(
-        self,
-        reaction: discord.Reaction,
-        reactor: Union[discord.User, discord.Member],
-    ) -> None:
-        """Handles reactions for turning pages."""
+    async def _turn_page(self, amount: int) -> None:
+        """Turns the page `amount` pages forward, looping around at either
+        end.
+        """
+        self._refresh_timeout()
+        if self.page is None:
+            self.page = 0
+        self.page = (self.page + amount) % len(self.pages)
+        await self._show_page()
 
-        if self.msg is None:
+    async def _show_page(self) -> None:
+        """Edits the message to show the current page. Calls made while an
+        edit is in progress are handled by one more edit once it's done, so
+        pages turned quickly are shown with as few edits as possible.
+        """
+        self._stale = True
+        if self._editing:
             return
-        if self.responder is None or reactor == self.responder:
-            # Make sure that the reactor is someone who can turn
-            # the page.
-            if self.page is None:
-                self.page = 0
-
-            if reaction.emoji == self._larrow:
-                # Turn page left
-                self.page -= 1
-                if self.page < 0:
-                    # Loop to the last page
-                    self.page = len(self.pages) - 1
-                await self.msg.edit(embed=self.pages[self.page])
-            else:
-                # Turn page right
-                self.page += 1
-                if self.page >= len(self.pages):
-                    # Loop to the first page
-                    self.page = 0
-                await self.msg.edit(embed=self.pages[self.page])
 
-        # Delete reaction whether page turn was successful or not
-        await reaction.remove(reactor)
+        self._editing = True
+        try:
+            while self.msg is not None and self._continue and self._stale:
+                self._stale = False
+                await self.msg.edit(embed=self.pages[self.page])
+        except discord.NotFound:
+            _message_deleted(self)
+        except discord.HTTPException as e:
+            log.warning(f"Could not turn page: {fmt.format_error(e)}")
+        finally:
+            self._editing = False
 
     def _get_initial_reactions(self) -> list[str]:
         """Returns the reactions that the bot should add to the message
@@ -376,8 +421,8 @@ class Paged_Message:
 
     async def _setup(self):
         # Add reactions for user selection in non-blocking future so that the
-        # bot can begin waiting for and handling reactions without waiting for
-        # every reaction to be added.
+        # bot can begin handling reactions without waiting for every reaction
+        # to be added.
         async def add_reaction(emoji: str):
             if self.msg is not None and self._continue:
                 await self.msg.add_reaction(emoji)
@@ -390,42 +435,110 @@ class Paged_Message:
             except discord.HTTPException:
                 return
 
-        asyncio.ensure_future(add_reactions(self._get_initial_reactions()))
+        tasks.spawn(
+            add_reactions(self._get_initial_reactions()),
+            "Paged message reactions",
+            group="paged_message",
+        )
 
     async def _cleanup(self):
         # After timing out waiting for a page to be cycled remove reactions,
         # update the message's embed and return.
-
-        # Make sure the message still exists.
-        await self._update_msg()
-        if self.msg is not None:
-            # Remove arrow reactions
-            for arrow in (self._larrow, self._rarrow):
-                try:
-                    await self.msg.clear_reaction(arrow)
-                except discord.HTTPException:
-                    pass
-
-            if self._embed_editor is not None and self.page is not None:
-                new_embed = self._embed_editor(self.pages[self.page], self)
-                if new_embed is not None:
-                    await self.msg.edit(embed=new_embed)
-
-    async def _main_loop(self, timeout: float):
-        # Handles turning the multi page embed's pages with reactions.
+        if self.msg is None:
+            return
+        # Remove arrow reactions
+        for arrow in (self._larrow, self._rarrow):
+            try:
+                await self.msg.clear_reaction(arrow)
+            except discord.NotFound:
+                # The message was deleted
+                self.msg = None
+                return
+            except discord.HTTPException:
+                pass
+
+        if self._embed_editor is not None and self.page is not None:
+            new_embed = self._embed_editor(self.pages[self.page], self)
+            if new_embed is not None:
+                await self.msg.edit(embed=new_embed)
+
+    async def _logged_cleanup(self):
+        try:
+            await self._cleanup()
+        except Exception as e:
+            log.warning(f"Could not clean up paged message: {fmt.format_error(e)}")
+
+    async def _start(self, timeout: float):
+        """Lets the message's pages be turned until `timeout` seconds pass
+        without them being turned.
+        """
+        global _sweeper
         self.page = 0
-
+        self._timeout = timeout
+        self._refresh_timeout()
+        self._finished = asyncio.get_event_loop().create_future()
         if self.msg is None:
+            self.stop()
             return
 
+        _active[self.msg.id] = self
+        if _sweeper is None:
+            _sweeper = tasks.spawn(
+                _sweep(),
+                "Paged message sweeper",
+                group="paged_message",
+                cancel_on_shutdown=True,
+            )
         await self._setup()
-        # Keep turning pages until the function times out waiting for a
-        # page to be cycled or an exception is thrown.
-        while self._continue:
-            try:
-                reaction, reactor = await self._await_reaction(timeout)
-                await self._handle_reaction(reaction, reactor)
-            except asyncio.TimeoutError:
-                self._continue = False
 
+    async def _main_loop(self, timeout: float):
+        # Waits for the multi page embed to time out or be stopped, and then
+        # cleans it up.
+        await self._start(timeout)
+        await self._finished
         await self._cleanup()
+
+
+async def _sweep():
+    """Stops every active paged message once it times out. Runs until there
+    are no active paged messages left.
+    """
+    global _sweeper
+    try:
+        while _active:
+            now = time.monotonic()
+            for paged_msg in [m for m in _active.values() if m._expires_at <= now]:
+                paged_msg.stop()
+            if _active:
+                next_expiry = min(m._expires_at for m in _active.values())
+                await asyncio.sleep(min(max(next_expiry - now, 0), sweep_interval))
+    finally:
+        _sweeper = None
+
+
+def _message_deleted(paged_msg: Paged_Message) -> None:
+    if paged_msg.msg is not None:
+        _active.pop(paged_msg.msg.id, None)
+    paged_msg.msg = None
+    paged_msg.stop()
+
+
+async def on_raw_reaction(
+    payload: discord.RawReactionActionEvent, added: bool
+) -> None:
+    """Passes a reaction to the paged message it was added to or removed
+    from, if there is one. Should be called for every reaction added or
+    removed.
+    """
+    paged_msg = _active.get(payload.message_id)
+    if paged_msg is not None and payload.user_id != client.user.id:
+        await paged_msg._handle_reaction(str(payload.emoji), payload.user_id, added)
+
+
+def on_raw_message_delete(message_id: int) -> None:
+    """Stops the paged message using the message with the id `message_id`, if
+    there is one. Should be called for every message deleted.
+    """
+    paged_msg = _active.get(message_id)
+    if paged_msg is not None:
+        _message_deleted(paged_msg)
@@ -1,20 +1,128 @@
+import calendar
 import datetime
+import functools
 import re
+from typing import Iterator, Optional, Union
 
-_re_arg_splitter = re.compile(
-    #       Match text in quotes as a single group
-    #       V                          Match any number of double backslashes so that \" is a valid quote escape but \\" isn't.
-    #       V                          V          Match \" within quotes
-    #       V                          V          V        Match content within quotes
-    #       V                          V          V        V          Match closing quote
-    #       V                          V          V        V          V               Match unquoted content
-    #       V                          V          V        V          V               V           End match with the end of the
-    #       V                          V          V        V          V               V           string, a comma with any amount
-    #       V                          V          V        V          V               V           of whitespace, or whitespace.
-    #       V                          V          V        V          V               V           V
-    r'\s*(?:(?:\"(?P<quoted_text>(?:(?:(?:\\\\)*)|(?:\\\")|(?:[^"]))*)\")|(?:(?P<text>[^\s,，]+)))(?P<tail>$|(?:\s*[,，]\s*)|(?:\s+))'
-)
-_re_remove_escaped_quote = re.compile(r'((?:[^\\]|^)(?:\\\\)*)\\"')
+# Characters that separate comma separated arguments
+_commas = ",，"
+
+
+def _is_tail_start(args: str, i: int) -> bool:
+    """Returns whether or not an argument can end right before index `i`."""
+    return i == len(args) or args[i].isspace() or args[i] in _commas
+
+
+def _tokenize(args: str) -> Iterator[tuple[str, Optional[str], Optional[str], str]]:
+    """Lazily yields every argument in `args` in a single pass as a tuple of
+    the argument's raw text including the whitespace before it and the
+    separator after it, its unquoted text or `None`, its quoted text or
+    `None`, and the separator that ends it.
+
+    Quoted text is closed by a quote followed by a separator. A quote after
+    an even number of backslashes closes it as soon as it can, while a quote
+    escaped by an odd number only closes it if no later quote can. A quote
+    with no backslashes before it ends the search for a closing quote. If
+    there is no closing quote, the opening quote is read as part of unquoted
+    text instead. Commas that do not end an argument are skipped.
+    """
+    length = len(args)
+    i = 0
+    while i < length:
+        start = i
+        while i < length and args[i].isspace():
+            i += 1
+        if i == length:
+            return
+        if args[i] in _commas:
+            i += 1
+            continue
+
+        text = None
+        quoted_text = None
+        end = i
+        if args[i] == '"':
+            closing_quote = None
+            # How many backslashes come right before index j
+            backslashes = 0
+            j = i + 1
+            while j < length:
+                if args[j] == "\\":
+                    backslashes += 1
+                    j += 1
+                    continue
+                if args[j] == '"':
+                    if not backslashes:
+                        # An unescaped quote always ends quoted text
+                        if _is_tail_start(args, j + 1):
+                            closing_quote = j
+                        break
+                    elif _is_tail_start(args, j + 1):
+                        closing_quote = j
+                        # A quote after an even number of backslashes ends
+                        # quoted text if it can, while a quote after an odd
+                        # number is only used if nothing later can be
+                        if backslashes % 2 == 0:
+                            break
+                backslashes = 0
+                j += 1
+            if closing_quote is not None:
+                quoted_text = args[i + 1 : closing_quote]
+                end = closing_quote + 1
+        if quoted_text is None:
+            end = i
+            while not _is_tail_start(args, end):
+                end += 1
+            text = args[i:end]
+
+        # Arguments end with the end of the string, a comma with any amount
+        # of whitespace around it, or whitespace. A newline at the very end
+        # counts as the end of the string.
+        tail_end = end
+        if end < length and not (end == length - 1 and args[end] == "\n"):
+            while tail_end < length and args[tail_end].isspace():
+                tail_end += 1
+            if tail_end < length and args[tail_end] in _commas:
+                tail_end += 1
+                while tail_end < length and args[tail_end].isspace():
+                    tail_end += 1
+        yield args[start:tail_end], text, quoted_text, args[end:tail_end]
+        i = tail_end
+
+
+def _unescape(arg: str) -> str:
+    """Replaces \\" with " and \\\\ with \\ in `arg`. A quote is only
+    unescaped by an odd number of backslashes that do not directly follow
+    another unescaped quote.
+    """
+    if "\\" not in arg:
+        return arg
+    parts = []
+    # The index of the last quote that was unescaped
+    unescaped_quote = -2
+    length = len(arg)
+    i = 0
+    while i < length:
+        if arg[i] != "\\":
+            parts.append(arg[i])
+            i += 1
+            continue
+        run_start = i
+        while i < length and arg[i] == "\\":
+            i += 1
+        run_len = i - run_start
+        if (
+            run_len % 2
+            and i < length
+            and arg[i] == '"'
+            and run_start - 1 != unescaped_quote
+        ):
+            parts.append("\\" * (run_len // 2) + '"')
+            unescaped_quote = i
+            i += 1
+        else:
+            parts.append("\\" * ((run_len + 1) // 2))
+    return "".join(parts)
 
 
 def split_args(args: str, treat_comma_as_space: bool = False) -> list[str]:
@@ -44,125 +152,221 @@ def split_args(args: str, treat_comma_as_space: bool = False) -> list[str]:
         # Single escaped backslash
         split_args('A "B\\"C" D', False) == ['A', 'B"C', 'D']
     """
-    comma_separated = False
-
-    # Get matches
-    matches = []
-    for m in _re_arg_splitter.finditer(args):
-        matches.append(m)
-        comma_separated = comma_separated or (
-            not treat_comma_as_space
-            and m.group("tail") != ""
-            and not m.group("tail").isspace()  # Checks for comma
-        )
+    tokens = list(_tokenize(args))
+    comma_separated = not treat_comma_as_space and any(
+        tail and not tail.isspace() for _, _, _, tail in tokens
+    )
 
-    # Matches can contain their arg in the groups "text" or "quoted_text"
     if not comma_separated:
-        ret = [
-            m.group("text") if m.group("text") is not None else m.group("quoted_text")
-            for m in matches
-        ]
+        ret = [text if text is not None else quoted for _, text, quoted, _ in tokens]
     else:
-        # If args are comma separated, group all matches in between commas
-        # into a single string.
+        # If args are comma separated, group all arguments in between commas
+        # into a single string. Only the last argument of each group has its
+        # quotes and separators removed.
         ret = []
-
-        # A list of matches that appear together before a comma
-        combine: list[re.Match] = []
-        for match in matches:
-            if match.group("tail") and not match.group("tail").isspace():
-                # If match ends with a comma, combine it with previous matches
-                # without commas into one single arg.
-
-                if match.group("text"):
-                    ret.append(
-                        "".join(m.group(0) for m in combine) + match.group("text")
-                    )
-                elif not combine:
-                    # If the match contains text in quotes and there are no
-                    # previous matches to combine it with, add only the text
-                    # inside of the quotes to the list of arguments.
-                    ret.append(match.group("quoted_text"))
-                else:
-                    ret.append(
-                        "".join(m.group(0) for m in combine)
-                        + match.group("quoted_text")
-                    )
+        # The raw text of arguments that appear together before a comma
+        combine: list[str] = []
+        for raw, text, quoted, tail in tokens:
+            if tail and not tail.isspace():
+                ret.append("".join(combine) + (text if text is not None else quoted))
                 combine = []
             else:
-                combine.append(match)
+                combine.append(raw)
         if combine:
-            if len(combine) == 1 and combine[0].group("quoted_text") is not None:
-                # If there is only one match that contains text in quotes add
-                # only the text inside of the quotes to the list of arguments.
-                last_arg = combine[0].group("quoted_text")
-            else:
-                # Otherwise, combine all remaining matches into one argument
-                last_arg = "".join(m.group(0) for m in combine[:-1])
-                # Exclude the tail of the last match
-                last_match = combine[-1]
-                last_arg += (
-                    last_match.group("text")
-                    if last_match.group("text") is not None
-                    else last_match.group("quoted_text")
-                )
-            ret.append(last_arg)
+            _, text, quoted, _ = tokens[-1]
+            ret.append("".join(combine[:-1]) + (text if text is not None else quoted))
 
     # Replace \" with " and \\ with \
-    ret = [_re_remove_escaped_quote.sub(r'\1"', s).replace("\\\\", "\\") for s in ret]
+    return [_unescape(s) for s in ret]
+
+
+# Dates, times and durations are all read with the patterns below, which are
+# combined into one grammar by `str_to_datetime`. The `{0}` in each pattern is
+# replaced with a suffix so that the same pattern can be used more than once
+# in the grammar with unique group names.
+
+_time_pattern = r"(?P<hour{0}>\d{{1,2}})(?::(?P<minute{0}>\d{{2}}))?\s*(?P<period{0}>[ap]m)?"
+
+_month_names = {
+    name.casefold(): i
+    for i in range(1, 13)
+    for name in (calendar.month_abbr[i], calendar.month_name[i])
+}
+_weekday_names = {
+    name.casefold(): i
+    for i in range(7)
+    for name in (calendar.day_abbr[i], calendar.day_name[i])
+}
+_relative_days = {"yesterday": -1, "today": 0, "tomorrow": 1}
+
+
+def _names_pattern(names) -> str:
+    # Longer names go first so that full names are not cut short by their
+    # abbreviations
+    return "|".join(sorted(names, key=len, reverse=True))
+
+
+_date_pattern = (
+    # A day relative to today
+    r"(?P<relative_day{0}>" + _names_pattern(_relative_days) + ")"
+    # A day of the week, optionally after "next"
+    + r"|(?:(?P<next{0}>next)\s+)?(?P<weekday{0}>"
+    + _names_pattern(_weekday_names)
+    + ")"
+    # month/day/year or month/day
+    + r"|(?P<month{0}>\d{{1,2}})/(?P<day{0}>\d{{1,2}})(?:/(?P<year{0}>\d{{4}}|\d{{2}}))?"
+    # Written month then day and possibly year
+    + r"|(?P<month_name{0}>"
+    + _names_pattern(_month_names)
+    + r")\s+(?P<name_day{0}>\d{{1,2}})(?:\s*,?\s*(?P<name_year{0}>\d{{4}}|\d{{2}}))?"
+)
 
-    return ret
+_duration_pattern = r"(?:(?P<weeks{0}>\d+)\s*w(?:eeks?)?)?\s*(?:(?P<days{0}>\d+)\s*d(?:ays?)?)?\s*(?:(?P<hours{0}>\d+)\s*h(?:ours?)?)?\s*(?:(?P<minutes{0}>\d+)\s*m(?:inutes?)?)?"
+
+re_time = re.compile(_time_pattern.format(""), re.IGNORECASE)
+_re_date = re.compile(f"(?:{_date_pattern.format('')})", re.IGNORECASE)
+re_duration = re.compile(_duration_pattern.format("") + "$", re.IGNORECASE)
+# A duration from now, a date with an optional time, or a time with an
+# optional date
+_re_datetime = re.compile(
+    r"(?P<from_now>in)\s+(?=\d)" + _duration_pattern.format("")
+    + f"|(?:{_date_pattern.format('_1')})(?:\\s+(?:at\\s+)?{_time_pattern.format('_1')})?"
+    + f"|{_time_pattern.format('_2')}(?:\\s+(?:on\\s+)?(?:{_date_pattern.format('_2')}))?",
+    re.IGNORECASE,
+)
 
+# How many recently parsed strings of each kind are remembered
+_parse_cache_size = 256
 
-re_time = re.compile(
-    r"(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<period>[ap]m)?", re.IGNORECASE
-)
+# Parsed dates are kept as one of:
+#   ("absolute", year or None, month, day)
+#   ("relative", days from today)
+#   ("weekday", weekday, whether or not today is skipped)
+# since they can only be turned into dates once today's date is known.
+_Date_Parts = tuple
+# Hours and minutes
+_Time_Parts = tuple[int, int]
 
 
-def str_to_time(s: str) -> datetime.time:
-    """Return s as a timezone naive time, or raise an exception on failure.
-    Only handles hours and minutes. Does not handle seconds.
+def _get_year(year: str) -> int:
+    """Returns the year `year` stands for. Two digit years are read the same
+    way as by `datetime.strptime`.
     """
-    m = re_time.fullmatch(s.strip())
-    if m is None:
-        raise ValueError(f'Could not parse"{s}" as time.')
+    if len(year) == 2:
+        return int(year) + (2000 if int(year) < 69 else 1900)
+    return int(year)
 
-    minute = int(m.group("minute")) if m.group("minute") else 0
 
-    hour = int(m.group("hour"))
-    if m.group("period") is not None:
-        is_am = m.group("period").casefold() == "am"
-        if is_am:
+def _date_parts_from_match(m: re.Match, suffix: str = "") -> Optional[_Date_Parts]:
+    """Returns the date matched by `_date_pattern` in `m`, or `None` if it is
+    not a real month and day.
+    """
+    group = lambda name: m.group(name + suffix)
+    if group("relative_day") is not None:
+        return ("relative", _relative_days[group("relative_day").casefold()])
+    if group("weekday") is not None:
+        return (
+            "weekday",
+            _weekday_names[group("weekday").casefold()],
+            group("next") is not None,
+        )
+    if group("month") is not None:
+        month, day, year = int(group("month")), int(group("day")), group("year")
+    else:
+        month = _month_names[group("month_name").casefold()]
+        day, year = int(group("name_day")), group("name_year")
+    if not 1 <= month <= 12 or day < 1:
+        return None
+    if year is None:
+        # The year is picked later, so only rule out days no year has
+        if day > calendar.monthrange(2000, month)[1]:
+            return None
+        return ("absolute", None, month, day)
+    year = _get_year(year)
+    if day > calendar.monthrange(year, month)[1]:
+        return None
+    return ("absolute", year, month, day)
+
+
+def _time_parts_from_match(m: re.Match, suffix: str = "") -> Optional[_Time_Parts]:
+    """Returns the hour and minute matched by `_time_pattern` in `m`, or
+    `None` if they are not a real time.
+    """
+    hour = int(m.group("hour" + suffix))
+    minute = int(m.group("minute" + suffix) or 0)
+    period = m.group("period" + suffix)
+    if period is not None:
+        if period.casefold() == "am":
             # Handle AM times
             if hour == 12:
                 # Change 12am to midnight
                 hour = 0
             elif hour > 12:
-                raise ValueError(f"Can not have an AM time after 12.")
-        else:
+                return None
+        elif hour < 12:
             # Handle PM times
-            if hour < 12:
-                hour += 12
-
-    return datetime.time(hour, minute)
+            hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    return (hour, minute)
+
+
+def _duration_from_match(m: re.Match, suffix: str = "") -> datetime.timedelta:
+    return datetime.timedelta(
+        **{
+            unit: int(m.group(unit + suffix) or 0)
+            for unit in ("weeks", "days", "hours", "minutes")
+        }
+    )
+
+
+def _resolve_date(
+    parts: _Date_Parts, today: datetime.date, require_year: bool = False
+) -> Optional[datetime.date]:
+    """Returns the date `parts` stands for as of `today`, or `None` if it does
+    not stand for one.
+    """
+    if parts[0] == "relative":
+        return today + datetime.timedelta(days=parts[1])
+    if parts[0] == "weekday":
+        _, weekday, skip_today = parts
+        days = (weekday - today.weekday()) % 7
+        if days == 0 and skip_today:
+            days = 7
+        return today + datetime.timedelta(days=days)
+
+    _, year, month, day = parts
+    if year is not None:
+        return datetime.date(year, month, day)
+    if require_year:
+        return None
+    # Dates without years are the next time the month and day come around
+    year = today.year if (month, day) >= (today.month, today.day) else today.year + 1
+    if day > calendar.monthrange(year, month)[1]:
+        return None
+    return datetime.date(year, month, day)
+
+
+@functools.lru_cache(maxsize=_parse_cache_size)
+def _parse_time(s: str) -> Optional[_Time_Parts]:
+    m = re_time.fullmatch(s.strip())
+    return _time_parts_from_match(m) if m is not None else None
 
 
-_re_month_name_date = re.compile(
-    r"(?P<month>[a-z]{3,9})\s+(?P<day>\d{1,2})(?:(?:(?:\s*,\s*)|(?:\s*))(?P<year>(?:\d{4})|(?:\d{2}))$)?",
-    re.IGNORECASE,
-)
+def str_to_time(s: str) -> datetime.time:
+    """Return s as a timezone naive time, or raise an exception on failure.
+    Only handles hours and minutes. Does not handle seconds.
+    """
+    parts = _parse_time(s)
+    if parts is None:
+        raise ValueError(f'Could not parse"{s}" as time.')
+    return datetime.time(*parts)
 
 
-def _auto_set_date_year(d: datetime.date) -> datetime.date:
-    """For dates without years, changes the year from the default of 1900 to
-    the current year or next year, depending on whether the month and day have
-    passed the current year or not.
-    """
-    today = datetime.date.today()
-    d = d.replace(year=today.year)
-    if d < today:
-        d = d.replace(year=d.year + 1)
-    return d
+@functools.lru_cache(maxsize=_parse_cache_size)
+def _parse_date(s: str) -> Optional[_Date_Parts]:
+    m = _re_date.fullmatch(s.strip())
+    return _date_parts_from_match(m) if m is not None else None
 
 
 def str_to_date(s: str, require_year: bool = False) -> datetime.date:
@@ -183,60 +387,114 @@ def str_to_date(s: str, require_year: bool = False) -> datetime.date:
       Sep 31 2021
       Sep 31, 2021
 
+    Days relative to today are also valid, like `today`, `tomorrow`,
+    `friday` (today if it is Friday) and `next friday` (never today).
+
     If `require_year` is `False`, then the year can be omitted. If the current
     date is before the month and day given, then the year will be set to the
     current year. Otherwise, the year will be set to the next year.
     """
-    s = s.strip()
-    # Try to parse date as month/day/year
-    for format_code in ("%m/%d/%y", "%m/%d/%Y"):
-        try:
-            return datetime.datetime.strptime(s, format_code).date()
-        except Exception:
-            pass
-    if not require_year:
-        # Try to parse date as month/day
-        try:
-            return _auto_set_date_year(datetime.datetime.strptime(s, "%m/%d").date())
-        except Exception:
-            pass
-    # Try to parse date as written month then day and possibly year
-    m = _re_month_name_date.fullmatch(s)
-    if m:
-        if m.group("year"):
-            parse_date = f"{m.group('year')} {m.group('month')} {m.group('day')}"
-            # Try to parse date
-            year_fmt = "%y" if len(m.group("year")) == 2 else "%Y"
-            for month_fmt in ("%b", "%B"):
-                format_code = f"{year_fmt} {month_fmt} %d"
-                try:
-                    return datetime.datetime.strptime(parse_date, format_code).date()
-                except Exception:
-                    pass
-        elif not require_year:
-            parse_date = f"{m.group('month')} {m.group('day')}"
-            today = datetime.date.today()
-
-            for month_fmt in ("%b", "%B"):
-                try:
-                    format_code = f"{month_fmt} %d"
-                    return _auto_set_date_year(
-                        datetime.datetime.strptime(s, format_code).date()
-                    )
-                except Exception:
-                    pass
-    raise ValueError(f'Could not parse "{s}" as date.')
-
-
-re_duration = re.compile(r"(?:(?P<weeks>\d+)\s*w(?:eeks?)?)?\s*(?:(?P<days>\d+)\s*d(?:ays?)?)?\s*(?:(?P<hours>\d+)\s*h(?:ours?)?)?\s*(?:(?P<minutes>\d+)\s*m(?:inutes?)?)?$", re.IGNORECASE)
+    parts = _parse_date(s)
+    date = (
+        _resolve_date(parts, datetime.date.today(), require_year)
+        if parts is not None
+        else None
+    )
+    if date is None:
+        raise ValueError(f'Could not parse "{s.strip()}" as date.')
+    return date
+
+
+@functools.lru_cache(maxsize=_parse_cache_size)
+def _parse_timedelta(s: str) -> Optional[datetime.timedelta]:
+    m = re_duration.fullmatch(s.strip())
+    return _duration_from_match(m) if m is not None else None
 
 
 def str_to_timedelta(s: str) -> datetime.timedelta:
-    m = re_duration.fullmatch(s.strip())
-    if m is None:
+    duration = _parse_timedelta(s)
+    if duration is None:
         raise ValueError(f'Could not parse "{s}" as datetime.')
+    return duration
+
+
+@functools.lru_cache(maxsize=_parse_cache_size)
+def _parse_datetime(
+    s: str,
+) -> Optional[
+    Union[
+        tuple[str, datetime.timedelta],
+        tuple[str, Optional[_Date_Parts], Optional[_Time_Parts]],
+    ]
+]:
+    m = _re_datetime.fullmatch(s.strip())
+    if m is None:
+        return None
+    if m.group("from_now") is not None:
+        return ("in", _duration_from_match(m))
+
+    suffix = "_1" if m.group("hour_2") is None else "_2"
+    date = None
+    time = None
+    if (
+        m.group("relative_day" + suffix) is not None
+        or m.group("weekday" + suffix) is not None
+        or m.group("month" + suffix) is not None
+        or m.group("month_name" + suffix) is not None
+    ):
+        date = _date_parts_from_match(m, suffix)
+        if date is None:
+            return None
+    if m.group("hour" + suffix) is not None:
+        time = _time_parts_from_match(m, suffix)
+        if time is None:
+            return None
+    return ("at", date, time)
+
+
+def str_to_datetime(
+    s: str, now: Optional[datetime.datetime] = None
+) -> datetime.datetime:
+    """Return s as a timezone naive datetime, or raise a `ValueError` on
+    failure. Understands anything `str_to_date` and `str_to_time` do, either
+    alone or together, and durations from now.
+
+    Examples of valid formats:
+      tomorrow 5pm
+      friday at 17:30
+      next monday
+      9/30/21 9:00 am
+      5pm on Sep 30
+      5pm (today, or tomorrow if 5pm has passed)
+      in 2h 30m
+
+    Dates without a time are at midnight.
+
+    Parameters
+    -----------
+    s: str
+    The string to parse.
 
-    match = m.groupdict(default=0)
-    for k, v in match.items():
-        match[k] = int(v)
-    return datetime.timedelta(**match)
+    now: Optional[datetime.datetime]
+    The time that relative dates and durations are from. If `None`, the
+    current local time is used.
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    parsed = _parse_datetime(s)
+    if parsed is not None:
+        if parsed[0] == "in":
+            return now + parsed[1]
+        _, date_parts, time_parts = parsed
+        time = datetime.time(*time_parts) if time_parts is not None else datetime.time()
+        if date_parts is not None:
+            date = _resolve_date(date_parts, now.date())
+            if date is not None:
+                return datetime.datetime.combine(date, time)
+        else:
+            # Times without a date are the next time that time comes around
+            dt = datetime.datetime.combine(now.date(), time)
+            if dt < now:
+                dt += datetime.timedelta(days=1)
+            return dt
+    raise ValueError(f'Could not parse "{s.strip()}" as date and time.')
@@ -0,0 +1,187 @@
+import discord
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Optional
+
+from core import config
+
+# How many of the latest messages are kept for each channel, and for all of
+# the channels in a guild together. Once a guild has too many messages, the
+# oldest messages of its least recently active channel are dropped first.
+max_messages_per_channel = int(config.get("recent_messages_per_channel", 200))
+max_messages_per_guild = int(config.get("recent_messages_per_guild", 2000))
+
+
+class Recent_Message:
+    """The parts of a message kept in memory. Whole `discord.Message` objects
+    are not kept since they hold on to their author, channel, embeds and
+    more.
+    """
+
+    __slots__ = ("id", "author_id", "channel_id", "content", "created_at")
+
+    def __init__(self, msg: discord.Message):
+        self.id: int = msg.id
+        self.author_id: int = msg.author.id
+        self.channel_id: int = msg.channel.id
+        self.content: str = msg.content
+        self.created_at: datetime = msg.created_at
+
+
+class _Channel_Messages:
+    """The latest messages in a channel, oldest first, indexed by author."""
+
+    def __init__(self):
+        self.messages: deque[Recent_Message] = deque()
+        self.by_author: dict[int, deque[Recent_Message]] = {}
+        # Whether older messages were read from the channel's history. Before
+        # then, messages sent before the bot started are missing.
+        self.seeded = False
+
+    def append(self, message: Recent_Message) -> None:
+        self.messages.append(message)
+        self.by_author.setdefault(message.author_id, deque()).append(message)
+
+    def prepend(self, message: Recent_Message) -> None:
+        self.messages.appendleft(message)
+        self.by_author.setdefault(message.author_id, deque()).appendleft(message)
+
+    def pop_oldest(self) -> None:
+        message = self.messages.popleft()
+        # Messages are in the same order in both, so the author's oldest
+        # message is always the one being removed
+        author_messages = self.by_author[message.author_id]
+        author_messages.popleft()
+        if not author_messages:
+            del self.by_author[message.author_id]
+
+
+class _Guild_Messages:
+    """The latest messages in every channel of a guild, with the least
+    recently active channel first.
+    """
+
+    def __init__(self):
+        self.channels: OrderedDict[int, _Channel_Messages] = OrderedDict()
+        self.count = 0
+
+    def get_channel(self, channel_id: int) -> _Channel_Messages:
+        channel_messages = self.channels.get(channel_id)
+        if channel_messages is None:
+            channel_messages = self.channels[channel_id] = _Channel_Messages()
+        return channel_messages
+
+    def trim(self, channel_messages: _Channel_Messages) -> None:
+        """Drops messages from `channel_messages` until it is within
+        `max_messages_per_channel`, then from the least recently active
+        channels until the guild is within `max_messages_per_guild`.
+        """
+        while len(channel_messages.messages) > max_messages_per_channel:
+            channel_messages.pop_oldest()
+            self.count -= 1
+        while self.count > max_messages_per_guild:
+            channel_id, oldest_channel = next(iter(self.channels.items()))
+            oldest_channel.pop_oldest()
+            self.count -= 1
+            if not oldest_channel.messages:
+                del self.channels[channel_id]
+
+
+# Guild id to the guild's recent messages
+_guilds: dict[int, _Guild_Messages] = {}
+
+
+def add(msg: discord.Message) -> None:
+    """Keeps `msg` as one of its channel's recent messages. Should be called
+    for every message the bot receives. Messages outside of guilds and
+    messages from bots are ignored.
+    """
+    if msg.guild is None or msg.author.bot:
+        return
+    guild_messages = _guilds.get(msg.guild.id)
+    if guild_messages is None:
+        guild_messages = _guilds[msg.guild.id] = _Guild_Messages()
+    channel_messages = guild_messages.get_channel(msg.channel.id)
+    guild_messages.channels.move_to_end(msg.channel.id)
+    channel_messages.append(Recent_Message(msg))
+    guild_messages.count += 1
+    guild_messages.trim(channel_messages)
+
+
+def remove_guild(guild_id: int) -> None:
+    """Drops every recent message kept for the guild with the id `guild_id`."""
+    _guilds.pop(guild_id, None)
+
+
+async def _seed(channel: discord.TextChannel, guild_messages: _Guild_Messages):
+    """Reads the messages sent in `channel` before the bot started keeping
+    its recent messages.
+    """
+    channel_messages = guild_messages.get_channel(channel.id)
+    channel_messages.seeded = True
+    before = channel_messages.messages[0] if channel_messages.messages else None
+    missing = max_messages_per_channel - len(channel_messages.messages)
+    if missing <= 0:
+        return
+    before_object = discord.Object(before.id) if before is not None else None
+    try:
+        async for msg in channel.history(limit=missing, before=before_object):
+            if msg.author.bot:
+                continue
+            channel_messages.prepend(Recent_Message(msg))
+            guild_messages.count += 1
+    except discord.HTTPException:
+        # Without permission to read the history, only new messages are kept
+        pass
+    guild_messages.trim(channel_messages)
+
+
+async def member_messages(
+    channel: discord.TextChannel, member: discord.abc.User, limit: int = 5
+) -> list[Recent_Message]:
+    """Returns up to `limit` of `member`'s latest messages in `channel`,
+    oldest first. The channel's history is only read the first time messages
+    are needed from it, afterwards this only looks at messages in memory.
+    """
+    guild_messages = _guilds.get(channel.guild.id)
+    if guild_messages is None:
+        guild_messages = _guilds[channel.guild.id] = _Guild_Messages()
+    channel_messages = guild_messages.channels.get(channel.id)
+    if channel_messages is None or not channel_messages.seeded:
+        author_messages = (
+            channel_messages.by_author.get(member.id, ())
+            if channel_messages is not None
+            else ()
+        )
+        if len(author_messages) < limit:
+            await _seed(channel, guild_messages)
+            channel_messages = guild_messages.channels.get(channel.id)
+            if channel_messages is None:
+                return []
+    return list(channel_messages.by_author.get(member.id, ()))[-limit:]
+
+
+def member_messages_in_guild(
+    guild: discord.Guild, member: discord.abc.User, limit: int = 5
+) -> list[Recent_Message]:
+    """Returns up to `limit` of `member`'s latest messages in any channel of
+    `guild`, oldest first. Only messages in memory are included.
+    """
+    guild_messages = _guilds.get(guild.id)
+    if guild_messages is None:
+        return []
+    messages: list[Recent_Message] = []
+    for channel_messages in guild_messages.channels.values():
+        messages.extend(list(channel_messages.by_author.get(member.id, ()))[-limit:])
+    messages.sort(key=lambda m: m.created_at)
+    return messages[-limit:]
+
+
+def get_message_count(guild_id: Optional[int] = None) -> int:
+    """Returns how many messages are kept for the guild with the id
+    `guild_id`, or for every guild if it is `None`.
+    """
+    if guild_id is not None:
+        guild_messages = _guilds.get(guild_id)
+        return guild_messages.count if guild_messages is not None else 0
+    return sum(g.count for g in _guilds.values())
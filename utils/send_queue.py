@@ -0,0 +1,240 @@
+import discord
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Optional
+
+from . import tasks
+
+log = logging.getLogger("send_queue")
+
+# The longest message Discord allows
+max_message_len = 2000
+# How many messages are sent at the same time across every channel. Waiting
+# channels get to send in the order they started waiting, so one busy channel
+# can't hold up the others.
+max_concurrent_sends = 5
+# Messages that wait longer than this many seconds to be sent are logged
+slow_send_threshold = 5
+
+
+class Queue_Stats:
+    """How long messages waited in the send queue.
+
+    Attributes
+    ------------
+    queued: int
+    How many messages were queued.
+
+    sent: int
+    How many messages were actually sent. Less than `queued` when messages
+    were merged.
+
+    total_latency: float
+    The total number of seconds queued messages waited before being sent.
+
+    max_latency: float
+    The longest number of seconds a queued message waited before being sent.
+    """
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def average_latency(self) -> float:
+        return self.total_latency / self.queued if self.queued else 0.0
+
+
+stats = Queue_Stats()
+
+
+class _Outgoing:
+    """A message waiting to be sent."""
+
+    __slots__ = ("content", "embed", "kwargs", "merge", "future", "queued_at")
+
+    def __init__(
+        self,
+        content: Optional[str],
+        embed: Optional[discord.Embed],
+        kwargs: dict[str, Any],
+        merge: bool,
+    ):
+        self.content = content
+        self.embed = embed
+        self.kwargs = kwargs
+        self.merge = merge
+        self.future: asyncio.Future[discord.Message] = (
+            asyncio.get_event_loop().create_future()
+        )
+        self.queued_at = time.monotonic()
+
+    @property
+    def is_text(self) -> bool:
+        """Whether or not this is only text that can be merged with other
+        text.
+        """
+        return (
+            self.merge
+            and self.content is not None
+            and self.embed is None
+            and not self.kwargs
+        )
+
+    @property
+    def is_embed(self) -> bool:
+        """Whether or not this is only an embed that can be added to a text
+        message.
+        """
+        return (
+            self.merge
+            and self.content is None
+            and self.embed is not None
+            and not self.kwargs
+        )
+
+
+# Channel id to the messages waiting to be sent to the channel
+_queues: dict[int, deque[_Outgoing]] = {}
+_send_slots: Optional[asyncio.Semaphore] = None
+
+
+def _get_send_slots() -> asyncio.Semaphore:
+    # Created on first use so that it belongs to the client's event loop
+    global _send_slots
+    if _send_slots is None:
+        _send_slots = asyncio.Semaphore(max_concurrent_sends)
+    return _send_slots
+
+
+def _take_batch(queue: deque[_Outgoing]) -> list[_Outgoing]:
+    """Removes the next message to send from `queue` along with every message
+    right after it that can be sent as part of the same message.
+    """
+    batch = [queue.popleft()]
+    if batch[0].is_text:
+        length = len(batch[0].content)
+        while (
+            queue
+            and queue[0].is_text
+            and length + 1 + len(queue[0].content) <= max_message_len
+        ):
+            length += 1 + len(queue[0].content)
+            batch.append(queue.popleft())
+        # An embed is shown below a message's text, so one can be added to
+        # the end of the merged text without changing the order
+        if queue and queue[0].is_embed:
+            batch.append(queue.popleft())
+    return batch
+
+
+async def _send_batch(channel: discord.abc.Messageable, batch: list[_Outgoing]):
+    first = batch[0]
+    if len(batch) == 1:
+        content, embed = first.content, first.embed
+    else:
+        content = "\n".join(o.content for o in batch if o.content is not None)
+        embed = batch[-1].embed
+    try:
+        async with _get_send_slots():
+            message = await channel.send(content, embed=embed, **first.kwargs)
+    except Exception as e:
+        for outgoing in batch:
+            if not outgoing.future.done():
+                outgoing.future.set_exception(e)
+        return
+
+    now = time.monotonic()
+    stats.sent += 1
+    for outgoing in batch:
+        latency = now - outgoing.queued_at
+        stats.total_latency += latency
+        stats.max_latency = max(stats.max_latency, latency)
+        if latency > slow_send_threshold:
+            log.warning(
+                f"A message to channel {channel.id} waited {latency:.1f}s to be sent"
+            )
+        if not outgoing.future.done():
+            outgoing.future.set_result(message)
+
+
+async def _drain(channel: discord.abc.Messageable, key: int):
+    queue = _queues[key]
+    try:
+        while queue:
+            await _send_batch(channel, _take_batch(queue))
+    finally:
+        del _queues[key]
+
+
+def send(
+    channel: discord.abc.Messageable,
+    content: Optional[str] = None,
+    *,
+    embed: Optional[discord.Embed] = None,
+    merge: bool = True,
+    **kwargs,
+) -> "asyncio.Future[discord.Message]":
+    """Queues a message to be sent to `channel` after every message already
+    queued for it. Plain text messages queued one after another are merged
+    into as few messages as possible, and an embed queued right after text
+    is sent with the text. Returns a future for the sent message, which is
+    shared by every message merged into it.
+
+    Parameters
+    -----------
+    channel: discord.abc.Messageable
+    Where to send the message.
+
+    content: Optional[str]
+    The text of the message.
+
+    embed: Optional[discord.Embed]
+    The embed of the message.
+
+    merge: bool
+    Whether or not the message can be merged with other messages. Should be
+    `False` for messages that will be edited or deleted.
+
+    **kwargs
+    Any other arguments for `channel.send`. Messages with other arguments
+    are never merged.
+    """
+    outgoing = _Outgoing(
+        str(content) if content is not None else None, embed, kwargs, merge
+    )
+    if outgoing.content is not None and len(outgoing.content) > max_message_len:
+        # Let Discord reject it on its own without merging anything into it
+        outgoing.merge = False
+    stats.queued += 1
+
+    key = channel.id
+    queue = _queues.get(key)
+    if queue is None:
+        queue = _queues[key] = deque()
+        queue.append(outgoing)
+        tasks.spawn(_drain(channel, key), f"Send queue for {key}", group="send_queue")
+    else:
+        queue.append(outgoing)
+    return outgoing.future
+
+
+def _log_exception(future: "asyncio.Future[discord.Message]"):
+    if not future.cancelled() and future.exception() is not None:
+        log.warning(f"Could not send a queued message: {future.exception()}")
+
+
+def post(
+    channel: discord.abc.Messageable,
+    content: Optional[str] = None,
+    *,
+    embed: Optional[discord.Embed] = None,
+    **kwargs,
+) -> None:
+    """Queues a message like `send` for callers that don't need to wait for
+    it to be sent. Errors sending the message are logged.
+    """
+    send(channel, content, embed=embed, **kwargs).add_done_callback(_log_exception)
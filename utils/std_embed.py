@@ -1,6 +1,12 @@
 import discord
+import asyncio
 import datetime
-from typing import Optional, Union
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Union
+
+from core import config
+from . import tasks
 
 
 class Colors:
@@ -11,6 +17,43 @@ class Colors:
     ERROR = discord.Color.red()
 
 
+# How many authors' footers and avatar urls are kept
+max_cached_authors = 1000
+
+# Identical errors sent to the same channel within this many seconds of each
+# other are only sent once
+error_coalesce_seconds = float(config.get("error_coalesce_seconds", 5))
+
+
+class _Author_Parts:
+    """The parts of an embed that only depend on its author."""
+
+    __slots__ = ("footer", "name", "icon_url")
+
+    def __init__(self, author: Union[discord.User, discord.Member]):
+        self.footer = f"Requested by {author}"
+        self.name = author.name
+        self.icon_url = str(author.avatar_url_as(format="png"))
+
+
+# (author id, author's avatar hash, author's name and discriminator) to the
+# author's embed parts, least recently used first. The name and avatar are
+# part of the key so that authors who change them get new parts.
+_author_parts: OrderedDict[tuple[int, Optional[str], str], _Author_Parts] = OrderedDict()
+
+
+def _get_author_parts(author: Union[discord.User, discord.Member]) -> _Author_Parts:
+    key = (author.id, author.avatar, str(author))
+    parts = _author_parts.get(key)
+    if parts is None:
+        parts = _author_parts[key] = _Author_Parts(author)
+        if len(_author_parts) > max_cached_authors:
+            _author_parts.popitem(last=False)
+    else:
+        _author_parts.move_to_end(key)
+    return parts
+
+
 def _get_embed(
     *,
     color: Union[discord.Color, int],
@@ -20,29 +63,42 @@ def _get_embed(
     url: Optional[str],
     timestamp: Optional[datetime.datetime],
 ) -> discord.Embed:
-    ret = discord.Embed(color=color)
+    # The embed is built from its JSON payload, which skips the checks and
+    # proxy objects the embed's setters go through
+    payload: dict[str, Any] = {
+        "type": "rich",
+        "color": color.value if isinstance(color, discord.Color) else color,
+    }
 
     if author is not None:
-        ret.set_footer(text=f"Requested by {author}")
-        if title:
-            ret.set_author(name=title, icon_url=author.avatar_url_as(format="png"))
-        else:
-            ret.set_author(
-                name=author.name, icon_url=author.avatar_url_as(format="png")
-            )
+        parts = _get_author_parts(author)
+        payload["footer"] = {"text": parts.footer}
+        payload["author"] = {
+            "name": title if title else parts.name,
+            "icon_url": parts.icon_url,
+        }
     elif title is not None:
-        ret.title = title
+        payload["title"] = title
 
     if description is not None:
-        ret.description = description
+        payload["description"] = description
     if url is not None:
-        ret.url = url
+        payload["url"] = url
+
+    ret = discord.Embed.from_dict(payload)
     if timestamp is not None:
         ret.timestamp = timestamp
-
     return ret
 
 
+# (channel id, title, description, url, author id) to when an error was last
+# sent with them and the task sending it, oldest first
+_recent_errors: OrderedDict[
+    tuple[int, Optional[str], Optional[str], Optional[str], Optional[int]],
+    tuple[float, "asyncio.Task[discord.Message]"],
+] = OrderedDict()
+
+
 def get_info(
     *,
     title: Optional[str] = None,
@@ -222,12 +278,52 @@ async def send_error(
     timestamp: Optional[datetime.datetime] = None,
     author: Optional[Union[discord.User, discord.Member]] = None,
 ) -> discord.Message:
-    return await channel.send(
-        embed=get_error(
-            title=title,
-            description=description,
-            url=url,
-            timestamp=timestamp,
-            author=author,
+    """Sends an error embed to `channel`. If the same error was sent to the
+    same channel less than `error_coalesce_seconds` ago, the message already
+    sent is returned instead of sending the error again.
+    """
+    now = time.monotonic()
+    # Forget errors that are too old to be coalesced with
+    while _recent_errors:
+        sent_at, _ = next(iter(_recent_errors.values()))
+        if now - sent_at < error_coalesce_seconds:
+            break
+        _recent_errors.popitem(last=False)
+
+    channel_id = getattr(channel, "id", None)
+    key = None
+    if channel_id is not None and timestamp is None:
+        key = (
+            channel_id,
+            title,
+            description,
+            url,
+            author.id if author is not None else None,
         )
+        if key in _recent_errors:
+            _, sending = _recent_errors[key]
+            # Wait for the first error to be sent if it is still being sent
+            return await asyncio.shield(sending)
+
+    sending = tasks.spawn(
+        channel.send(
+            embed=get_error(
+                title=title,
+                description=description,
+                url=url,
+                timestamp=timestamp,
+                author=author,
+            )
+        ),
+        f"Error message to {channel_id}",
+        group="std_embed",
     )
+    if key is not None:
+        _recent_errors[key] = (now, sending)
+    try:
+        return await asyncio.shield(sending)
+    except Exception:
+        # Let the next identical error try to send again
+        if key is not None and _recent_errors.get(key, (None, None))[1] is sending:
+            del _recent_errors[key]
+        raise
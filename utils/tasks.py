@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Optional
+
+from . import fmt
+
+log = logging.getLogger("tasks")
+
+# How long in seconds `shutdown` lets tasks finish before cancelling them
+shutdown_timeout = 10
+# The group of tasks spawned without one
+default_group = "misc"
+
+
+class Task_Info:
+    """A background task started through the supervisor.
+
+    Attributes
+    ------------
+    name: str
+    What the task does, shown by the tasks command.
+
+    group: str
+    The group the task belongs to. Tasks are counted and limited by group.
+
+    started_at: float
+    The `time.monotonic()` time the task was started.
+
+    restarts: int
+    How many times the task was restarted after failing.
+
+    cancel_on_shutdown: bool
+    Whether or not the task is cancelled as soon as the bot shuts down
+    instead of being given time to finish.
+
+    task: asyncio.Task
+    The task itself.
+    """
+
+    __slots__ = ("name", "group", "started_at", "restarts", "cancel_on_shutdown", "task")
+
+    def __init__(self, name: str, group: str, cancel_on_shutdown: bool):
+        self.name = name
+        self.group = group
+        self.started_at = time.monotonic()
+        self.restarts = 0
+        self.cancel_on_shutdown = cancel_on_shutdown
+        self.task: "asyncio.Task[Any]"
+
+    @property
+    def age(self) -> float:
+        """How many seconds ago the task was started."""
+        return time.monotonic() - self.started_at
+
+
+# Every task that is still running
+_tasks: dict["asyncio.Task[Any]", Task_Info] = {}
+# Group to how many of the group's tasks can run at the same time
+_limits: dict[str, int] = {}
+# Created on first use so that they belong to the client's event loop
+_semaphores: dict[str, asyncio.Semaphore] = {}
+# Group to how many of the group's tasks have failed
+failures: Counter[str] = Counter()
+_shutdown_hooks: list[Callable[[], Optional[Awaitable[Any]]]] = []
+_closing = False
+
+
+def set_limit(group: str, limit: int) -> None:
+    """Makes at most `limit` tasks of `group` run at the same time. Tasks
+    started past the limit wait for others in the group to finish. Should be
+    called before any tasks of the group are started.
+    """
+    _limits[group] = limit
+    _semaphores.pop(group, None)
+
+
+def _get_semaphore(group: str) -> Optional[asyncio.Semaphore]:
+    if group not in _limits:
+        return None
+    if group not in _semaphores:
+        _semaphores[group] = asyncio.Semaphore(_limits[group])
+    return _semaphores[group]
+
+
+async def _run(
+    info: Task_Info,
+    make_coro: Callable[[], Awaitable[Any]],
+    restart_delay: Optional[float],
+    max_restarts: Optional[int],
+) -> Any:
+    while True:
+        try:
+            semaphore = _get_semaphore(info.group)
+            if semaphore is None:
+                return await make_coro()
+            async with semaphore:
+                return await make_coro()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures[info.group] += 1
+            log.error(f'Task "{info.name}" failed: {fmt.format_error(e)}')
+            if (
+                restart_delay is None
+                or _closing
+                or (max_restarts is not None and info.restarts >= max_restarts)
+            ):
+                raise
+        info.restarts += 1
+        log.info(f'Restarting task "{info.name}" in {restart_delay}s')
+        await asyncio.sleep(restart_delay)
+
+
+def _task_done(task: "asyncio.Task[Any]") -> None:
+    _tasks.pop(task, None)
+    # Failures were already logged, so they don't need to be awaited to be
+    # seen
+    if not task.cancelled():
+        task.exception()
+
+
+def _start(
+    name: str,
+    group: str,
+    make_coro: Callable[[], Awaitable[Any]],
+    restart_delay: Optional[float],
+    max_restarts: Optional[int],
+    cancel_on_shutdown: bool,
+) -> "asyncio.Task[Any]":
+    info = Task_Info(name, group, cancel_on_shutdown)
+    info.task = asyncio.ensure_future(
+        _run(info, make_coro, restart_delay, max_restarts)
+    )
+    _tasks[info.task] = info
+    info.task.add_done_callback(_task_done)
+    return info.task
+
+
+def spawn(
+    coro: Awaitable[Any],
+    name: str,
+    *,
+    group: str = default_group,
+    cancel_on_shutdown: bool = False,
+) -> "asyncio.Task[Any]":
+    """Runs `coro` in the background and returns its task. Exceptions it
+    raises are logged, and it is cancelled when the bot shuts down if it
+    hasn't finished by then.
+
+    Parameters
+    -----------
+    coro: Awaitable[Any]
+    The coroutine to run.
+
+    name: str
+    What the coroutine does, shown by the tasks command.
+
+    group: str
+    The group the task belongs to. See `set_limit`.
+
+    cancel_on_shutdown: bool
+    Whether or not to cancel the task as soon as the bot shuts down instead
+    of waiting for it to finish. Should be `True` for tasks that wait a long
+    time, like ones that sleep until something is due.
+    """
+    task = _start(name, group, lambda: coro, None, None, cancel_on_shutdown)
+    if asyncio.iscoroutine(coro):
+        # A task cancelled before it starts never runs `coro`, which has to be
+        # closed so that it isn't reported as never awaited
+        task.add_done_callback(lambda _: coro.close())
+    return task
+
+
+def spawn_service(
+    make_coro: Callable[[], Awaitable[Any]],
+    name: str,
+    *,
+    group: str = default_group,
+    restart_delay: float = 5,
+    max_restarts: Optional[int] = None,
+) -> "asyncio.Task[Any]":
+    """Runs the coroutine returned by `make_coro` in the background, and runs
+    a new one from `make_coro` whenever it raises an exception. Returns the
+    task running the coroutines, which is cancelled as soon as the bot shuts
+    down.
+
+    Parameters
+    -----------
+    make_coro: Callable[[], Awaitable[Any]]
+    A function that returns a new coroutine to run each time it is called.
+
+    name: str
+    What the coroutine does, shown by the tasks command.
+
+    group: str
+    The group the task belongs to. See `set_limit`.
+
+    restart_delay: float
+    How many seconds to wait before restarting the coroutine after it
+    fails.
+
+    max_restarts: Optional[int]
+    How many times the coroutine can be restarted before its failures are
+    given up on, or `None` for no limit.
+    """
+    return _start(name, group, make_coro, restart_delay, max_restarts, True)
+
+
+def add_shutdown_hook(hook: Callable[[], Optional[Awaitable[Any]]]) -> None:
+    """Makes `hook` be called when the bot shuts down, before background
+    tasks are cancelled. `hook` can be a function or a coroutine function.
+    """
+    _shutdown_hooks.append(hook)
+
+
+async def shutdown(timeout: float = shutdown_timeout) -> None:
+    """Runs every shutdown hook and cancels the tasks that are cancelled on
+    shutdown, then waits up to `timeout` seconds for the other background
+    tasks to finish before cancelling the rest.
+    """
+    global _closing
+    _closing = True
+    for hook in _shutdown_hooks:
+        try:
+            result = hook()
+            if result is not None:
+                await result
+        except Exception as e:
+            log.error(f"Shutdown hook failed: {fmt.format_error(e)}")
+
+    cancelled = [t for t, info in _tasks.items() if info.cancel_on_shutdown]
+    for task in cancelled:
+        task.cancel()
+    waiting = [t for t, info in _tasks.items() if not info.cancel_on_shutdown]
+    pending: set["asyncio.Task[Any]"] = set()
+    if waiting:
+        _, pending = await asyncio.wait(waiting, timeout=timeout)
+        for task in pending:
+            log.info(f'Cancelling task "{_tasks[task].name}" at shutdown')
+            task.cancel()
+    if cancelled or pending:
+        await asyncio.gather(*cancelled, *pending, return_exceptions=True)
+
+
+def get_tasks() -> list[Task_Info]:
+    """Returns every background task that is still running, oldest first."""
+    return sorted(_tasks.values(), key=lambda t: t.started_at)
+
+
+def get_memory_usage() -> Optional[int]:
+    """Returns how many bytes of memory the bot's process is using, or `None`
+    if it can't be found on this system.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # The most memory the process has used. Measured in bytes on macOS and
+    # kilobytes everywhere else.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024